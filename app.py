@@ -1,20 +1,36 @@
 # ====== app.py ======
 from flask import Flask, render_template, request, redirect, url_for, session, jsonify, Response
 from models import db, Order, PhoneNumber, Status, OrderHistory, Worker, Supplier, Product, Purchase, Transport, Debt, User, SystemSettings, WorkerHistory
-from models import ExpenseCategory, Expense, ProductPriceHistory, ExpenseReceipt  # النماذج الجديدة
-from models import TransportCategory, TransportSubType, TransportReceipt
+from models import ExpenseCategory, Expense, ProductPriceHistory, ExpenseReceipt, ExpenseRollup  # النماذج الجديدة
+from models import TransportCategory, TransportSubType, TransportReceipt, WorkerAttendance, PayrollPeriod
 from datetime import datetime, timezone, timedelta
 import os
-from sqlalchemy.orm import joinedload
+import click
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
 from werkzeug.utils import secure_filename
 import base64
-from io import BytesIO
-from PIL import Image
+from database import init_database
+from write_queue import write_queue
+from metrics import request_metrics
+from lazyload_guard import lazyload_guard
+from bootstrap import init_db, seed_defaults, register_commands
+from pagination import paginate_keyset
+from debt_sync import reconcile_debts, sync_source_debt
+from expense_rollup import rebuild_rollups, verify_rollups
+from product_search import autocomplete, search_names, recent_prices, rebuild_search_index, AUTOCOMPLETE_LIMIT
+from supplier_prices import compare_suppliers, rebuild_supplier_prices, verify_supplier_prices, RECENT_PRICES
+from exports import expenses_export, orders_export, debts_export, transport_export, export_response, EXPORT_FORMATS
+from attendance_sync import upsert_punches, MAX_PUNCHES_PER_BATCH
+from payroll import rebuild_balances, verify_balances, worker_period, snapshot_payroll, run_payroll, LATE_HOUR_PENALTY
+from change_log import latest_seq, parse_since, changes_since, sync_etag, not_modified, sync_response
+from stats_engine import dashboard_stats, stats_context, verify_stats
+from attachments import release_blob, send_receipt, receipt_version, migrate_receipt_blobs
+from receipt_pool import receipt_pool, queue_receipt, IngestQueueFull, busy_response, process_stale_receipts, build_missing_variants
 
 app = Flask(__name__)
 app.secret_key = "secretkey123"
 
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///data.db"
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 # إعدادات تحميل الملفات للفواتير
 UPLOAD_FOLDER = 'uploads/receipts'
@@ -26,169 +42,62 @@ app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
 # ==================== 🔄 APIs للتكامل مع تطبيق العمال ====================
 
-@app.route('/api/workers/login', methods=['POST'])
-def api_worker_login():
-    """API لتسجيل دخول العمال من التطبيق"""
+@app.route('/api/workers/<int:worker_id>/attendance', methods=['POST'])
+def api_record_attendance(worker_id):
+    """API لتسجيل حضور العامل من التطبيق (تسجيل واحد يُدمج في حضور اليوم)"""
     if request.headers.get('Authorization') != 'Bearer worker_app':
         return jsonify({'error': 'غير مصرح'}), 401
     
     try:
         data = request.get_json()
-        username = data.get('username')
-        password = data.get('password')
-        
-        # البحث عن العامل (باستخدام الهاتف كاسم مستخدم)
-        worker = Worker.query.filter_by(phone=username, is_active=True).first()
-        
-        if worker:
-            # في الإصدار النهائي، استخدم تشفير كلمات المرور
-            if password == "worker123":  # كلمة مرور افتراضية - تغييرها في الإنتاج
-                return jsonify({
-                    'success': True,
-                    'id': worker.id,
-                    'name': worker.name,
-                    'phone': worker.phone,
-                    'role': 'worker'
-                }), 200
-            else:
-                return jsonify({'success': False, 'error': 'كلمة المرور غير صحيحة'}), 401
-        else:
-            return jsonify({'success': False, 'error': 'العامل غير موجود'}), 404
-            
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/api/workers/<int:worker_id>/assigned-orders')
-def api_worker_orders(worker_id):
-    """API لجلب الطلبيات المعينة للعامل"""
-    if request.headers.get('Authorization') != 'Bearer worker_app':
-        return jsonify({'error': 'غير مصرح'}), 401
-    
-    try:
-        # في هذا المثال، سنفترض وجود حقل assigned_worker_id في الطلبيات
-        # تحتاج لإضافة هذا الحقل في قاعدة البيانات
-        orders = Order.query.filter_by(assigned_worker_id=worker_id).all()
-        
-        orders_list = []
-        for order in orders:
-            # معلومات أساسية عن الطلبية
-            order_info = {
-                'id': order.id,
-                'customer_name': order.name,
-                'product': order.product,
-                'address': order.wilaya,
-                'phone': order.phones[0].number if order.phones else '',
-                'assigned_date': order.created_at.strftime('%Y-%m-%d'),
-                'expected_completion_date': (order.created_at + timedelta(days=7)).strftime('%Y-%m-%d'),
-                'duration_days': 7,
-                'status': 'in_progress'
-            }
-            orders_list.append(order_info)
         
-        return jsonify({'success': True, 'orders': orders_list}), 200
-        
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/api/workers/<int:worker_id>/salary-info')
-def api_worker_salary(worker_id):
-    """API لجلب معلومات الراتب للعامل"""
-    if request.headers.get('Authorization') != 'Bearer worker_app':
-        return jsonify({'error': 'غير مصرح'}), 401
-    
-    try:
-        worker = Worker.query.get_or_404(worker_id)
+        # تسجيلات الحضور تصل دفعات من التطبيق، فتُجمع مع غيرها في commit واحد
+        result = write_queue.run(lambda db_session: upsert_punches(db_session, worker_id, [data]))[0]
+        if result['status'] == 'error':
+            return jsonify({'success': False, 'error': result['error']}), 400
         
-        salary_info = {
+        return jsonify({
             'success': True,
-            'current_salary': worker.total_salary,
-            'base_salary': worker.monthly_salary,
-            'bonuses': worker.incentives + worker.outside_work_bonus,
-            'deductions': worker.advances,
-            'net_salary': worker.total_salary,
-            'work_days': 22,  # سيتم حسابه بشكل دقيق
-            'absence_days': worker.absences,
-            'vacation_days': 0,
-            'next_salary_date': (datetime.now(timezone.utc) + timedelta(days=5)).strftime('%Y-%m-%d')
-        }
-        
-        return jsonify(salary_info), 200
-        
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/api/orders/<int:order_id>/status', methods=['PUT'])
-def api_update_order_status(order_id):
-    """API لتحديث حالة الطلبية من قبل العامل"""
-    if request.headers.get('Authorization') != 'Bearer worker_app':
-        return jsonify({'error': 'غير مصرح'}), 401
-    
-    try:
-        data = request.get_json()
-        status = data.get('status')
-        worker_id = data.get('worker_id')
-        
-        order = Order.query.get_or_404(order_id)
-        
-        # تحديث حالة الطلبية
-        if status == 'completed':
-            order.status_id = 2  # حالة مكتملة
-        elif status == 'in_progress':
-            order.status_id = 1  # حالة قيد التنفيذ
-        
-        # تسجيل في السجل
-        history = OrderHistory(
-            order_id=order.id,
-            change_type="تحديث حالة من التطبيق",
-            details=f"تم تحديث حالة الطلبية إلى {status} بواسطة العامل #{worker_id}"
-        )
-        db.session.add(history)
-        db.session.commit()
-        
-        # إرسال إشعار للإدارة
-        send_admin_notification(
-            title="تحديث حالة طلبية",
-            message=f"العامل #{worker_id} قام بتحديث حالة الطلبية #{order_id} إلى {status}",
-            notification_type="order_update"
-        )
-        
-        return jsonify({'success': True, 'message': 'تم تحديث حالة الطلبية'}), 200
+            'message': 'تم تسجيل الحضور',
+            'status': result['status'],
+            'attendance_id': result['attendance_id']
+        }), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/workers/<int:worker_id>/attendance', methods=['POST'])
-def api_record_attendance(worker_id):
-    """API لتسجيل حضور العامل من التطبيق"""
+@app.route('/api/workers/<int:worker_id>/attendance/batch', methods=['POST'])
+def api_record_attendance_batch(worker_id):
+    """API لرفع تسجيلات الحضور المجمعة دون اتصال في طلب ومعاملة واحدة
+
+    الجسم: {"punches": [{"idempotency_key": "...", "date": "YYYY-MM-DD", ...}, ...]}
+    """
     if request.headers.get('Authorization') != 'Bearer worker_app':
         return jsonify({'error': 'غير مصرح'}), 401
     
+    data = request.get_json(silent=True)
+    punches = data.get('punches') if isinstance(data, dict) else data
+    if not isinstance(punches, list) or not punches:
+        return jsonify({'success': False, 'error': 'قائمة التسجيلات مطلوبة'}), 400
+    if len(punches) > MAX_PUNCHES_PER_BATCH:
+        return jsonify({'success': False, 'error': f'الحد الأقصى {MAX_PUNCHES_PER_BATCH} تسجيل في الطلب'}), 413
+    if db.session.get(Worker, worker_id) is None:
+        return jsonify({'success': False, 'error': 'العامل غير موجود'}), 404
+    
     try:
-        data = request.get_json()
-        
-        # هنا يمكنك تسجيل الحضور في قاعدة البيانات الرئيسية
-        # هذا مثال لتسجيل الحضور
-        attendance_record = WorkerAttendance(
-            worker_id=worker_id,
-            check_in_morning=data.get('check_in_morning'),
-            check_out_morning=data.get('check_out_morning'),
-            check_in_afternoon=data.get('check_in_afternoon'),
-            check_out_afternoon=data.get('check_out_afternoon'),
-            total_hours=data.get('total_hours', 0),
-            absence_hours=data.get('absence_hours', 0),
-            location_verified=data.get('location_verified', False),
-            date=datetime.strptime(data.get('date'), '%Y-%m-%d').date()
-        )
-        
-        db.session.add(attendance_record)
-        db.session.commit()
-        
-        return jsonify({'success': True, 'message': 'تم تسجيل الحضور'}), 200
-        
+        results = write_queue.run(lambda db_session: upsert_punches(db_session, worker_id, punches))
+    except IntegrityError:
+        # دفعة أخرى لنفس العامل واليوم حُفظت في نفس اللحظة، وإعادة الإرسال آمنة
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'تعارض مع رفع آخر، أعد المحاولة'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
+    
+    summary = {status: sum(1 for result in results if result['status'] == status)
+               for status in ('created', 'updated', 'duplicate', 'error')}
+    return jsonify({'success': True, 'results': results, **summary}), 200
 
 def send_admin_notification(title, message, notification_type="info"):
     """إرسال إشعار للمسؤولين"""
@@ -196,26 +105,6 @@ def send_admin_notification(title, message, notification_type="info"):
     # يمكن استخدام WebSockets أو قاعدة بيانات الإشعارات
     print(f"إشعار للمسؤولين: {title} - {message}")
 
-# نموذج جدول حضور العمال (يضاف إلى models.py)
-class WorkerAttendance(db.Model):
-    __tablename__ = 'worker_attendance'
-    __table_args__ = {'extend_existing': True}
-    id = db.Column(db.Integer, primary_key=True)
-    worker_id = db.Column(db.Integer, db.ForeignKey('worker.id'))
-    date = db.Column(db.Date, default=datetime.now(timezone.utc).date())
-    check_in_morning = db.Column(db.DateTime)
-    check_out_morning = db.Column(db.DateTime)
-    check_in_afternoon = db.Column(db.DateTime)
-    check_out_afternoon = db.Column(db.DateTime)
-    total_hours = db.Column(db.Float, default=0.0)
-    absence_hours = db.Column(db.Float, default=0.0)
-    location_verified = db.Column(db.Boolean, default=False)
-    notes = db.Column(db.Text)
-    
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    worker = db.relationship('Worker', backref='attendance_records')
-
 # إنشاء المجلد إذا لم يكن موجوداً
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
@@ -223,22 +112,23 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def compress_image(image_data, max_size=(1200, 1200), quality=85):
-    """ضغط الصورة للحفاظ على المساحة"""
-    try:
-        image = Image.open(BytesIO(image_data))
-        
-        # تغيير الحجم إذا كان كبيراً
-        image.thumbnail(max_size, Image.Resampling.LANCZOS)
-        
-        # حفظ بصيغة مضغوطة
-        output = BytesIO()
-        image.save(output, format='JPEG', quality=quality, optimize=True)
-        return output.getvalue()
-    except Exception as e:
-        print(f"خطأ في ضغط الصورة: {e}")
-        return image_data
-db.init_app(app)
+def create_app():
+    """تهيئة الإضافات وأوامر CLI للتطبيق
+
+    لا يتصل بقاعدة البيانات: إنشاء الجداول والترحيلات والبيانات الافتراضية
+    تتم صراحة عبر `flask db init` (أو عند تشغيل python app.py).
+    استدعاؤه أكثر من مرة يرجع نفس التطبيق دون تسجيل الخطافات مرة أخرى.
+    """
+    if 'sqlalchemy' not in app.extensions:
+        init_database(app)
+        receipt_pool.init_app(app)
+        write_queue.init_app(app)
+        request_metrics.init_app(app)
+        lazyload_guard.init_app(app)
+        register_commands(app)
+    return app
+
+create_app()
 
 # ========================
 # 🔐 قسم المصادقة
@@ -282,22 +172,51 @@ def dashboard():
     if "user" not in session:
         return redirect(url_for("login"))
     
-    total_orders = Order.query.count()
-    total_workers = Worker.query.count()
-    total_debts = Debt.query.filter_by(status="unpaid").count()
-    total_expenses = Expense.query.count()  # إضافة المصاريف للإحصائيات
+    counts = dashboard_stats()
     
     return render_template("dashboard.html", 
                          user=session["user"],
-                         total_orders=total_orders,
-                         total_workers=total_workers,
-                         total_debts=total_debts,
-                         total_expenses=total_expenses)  # تغيير total_purchases إلى total_expensestal_expenses
+                         **counts._asdict())
 
 # ========================
 # ⚡ قسم الطلبيات
 # ========================
 
+def _int_arg(args, name):
+    """رقم من معاملات التصفية، أو None إذا غاب أو كان غير صالح فيُتجاهل الشرط"""
+    value = args.get(name, '')
+    if value in ('', 'all'):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+def _date_arg(args, name):
+    """تاريخ YYYY-MM-DD من معاملات التصفية، أو None إذا غاب أو كان غير صالح"""
+    try:
+        return datetime.strptime(args[name], "%Y-%m-%d") if args.get(name) else None
+    except ValueError:
+        return None
+
+def _order_filters(args):
+    """شروط تصفية الطلبيات من معاملات الطلب (صفحة الطلبيات وتصديرها)"""
+    filters = []
+    if args.get('show_paid', 'false').lower() != 'true':
+        filters.append(Order.is_paid == False)
+    status_id = _int_arg(args, 'status')
+    if status_id is not None:
+        filters.append(Order.status_id == status_id)
+    wilaya = args.get('wilaya', '').strip()
+    if wilaya:
+        filters.append(Order.wilaya == wilaya)
+    date_from, date_to = _date_arg(args, 'date_from'), _date_arg(args, 'date_to')
+    if date_from:
+        filters.append(Order.created_at >= date_from)
+    if date_to:
+        filters.append(Order.created_at < date_to + timedelta(days=1))
+    return filters
+
 @app.route("/orders")
 def orders():
     """صفحة إدارة الطلبيات"""
@@ -305,20 +224,42 @@ def orders():
         return redirect(url_for("login"))
     
     show_paid = request.args.get('show_paid', 'false').lower() == 'true'
+    status_id = request.args.get('status', '')
+    wilaya = request.args.get('wilaya', '').strip()
+    date_from = request.args.get('date_from', '')
+    date_to = request.args.get('date_to', '')
     
-    if show_paid:
-        orders = Order.query.options(joinedload(Order.phones)).order_by(Order.created_at.desc()).all()
-    else:
-        orders = Order.query.options(joinedload(Order.phones)).filter(Order.is_paid == False).order_by(Order.created_at.desc()).all()
+    # الحالة تُجلب في نفس الاستعلام والهواتف باستعلام واحد للصفحة كلها
+    query = Order.query.options(joinedload(Order.status), selectinload(Order.phones)).filter(
+        *_order_filters(request.args)
+    )
+    
+    page = paginate_keyset(query, Order,
+                           after=request.args.get('after'),
+                           before=request.args.get('before'))
     
     statuses = Status.query.all()
     products = Product.query.all()
     
+    filters = {
+        'show_paid': 'true' if show_paid else 'false',
+        'status': status_id,
+        'wilaya': wilaya,
+        'date_from': date_from,
+        'date_to': date_to
+    }
+    
     return render_template("orders.html", 
-                         orders=orders, 
+                         orders=page.items, 
+                         page=page,
+                         filters={k: v for k, v in filters.items() if v},
                          statuses=statuses, 
                          products=products,
-                         show_paid=show_paid)
+                         show_paid=show_paid,
+                         status_id=status_id,
+                         wilaya=wilaya,
+                         date_from=date_from,
+                         date_to=date_to)
 
 @app.route("/orders/add", methods=["POST"])
 def add_order():
@@ -335,22 +276,24 @@ def add_order():
     phones_raw = request.form.get("phones", "")
     status_id = request.form.get("status") or None
 
-    order = Order(
-        name=name, wilaya=wilaya, product=product, paid=paid, total=total, note=note,
-        status_id=int(status_id) if status_id else None,
-        is_paid=(paid >= total)
-    )
-    db.session.add(order)
-    db.session.commit()
-
     phone_list = [p.strip() for p in phones_raw.split(",") if p.strip()]
-    for idx, p in enumerate(phone_list):
-        pn = PhoneNumber(order_id=order.id, number=p, is_primary=(idx==0))
-        db.session.add(pn)
-    db.session.commit()
+    user = session.get('user')
+
+    def create_order(db_session):
+        # الطلبية وأرقامها وسجلها في معاملة واحدة
+        order = Order(
+            name=name, wilaya=wilaya, product=product, paid=paid, total=total, note=note,
+            status_id=int(status_id) if status_id else None,
+            is_paid=(paid >= total)
+        )
+        for idx, p in enumerate(phone_list):
+            order.phones.append(PhoneNumber(number=p, is_primary=(idx==0)))
+        order.history.append(OrderHistory(change_type="إنشاء الطلب", details=f"إنشاء الطلب بواسطة {user}"))
+        db_session.add(order)
+        db_session.flush()
+        return order.id
 
-    db.session.add(OrderHistory(order_id=order.id, change_type="إنشاء الطلب", details=f"إنشاء الطلب بواسطة {session.get('user')}"))
-    db.session.commit()
+    write_queue.run(create_order)
 
     return redirect(url_for("orders"))
 
@@ -369,7 +312,8 @@ def edit_order(id):
         'paid': order.paid,
         'total': order.total,
         'note': order.note,
-        'status_id': order.status_id
+        'status_id': order.status_id,
+        'phones': [phone.number for phone in order.phones]
     }
     
     order.name = request.form.get("name")
@@ -399,12 +343,12 @@ def edit_order(id):
         new_status_name = new_status.name if new_status else "بدون"
         changes.append(f"تغيير الحالة: {old_status_name} → {new_status_name}")
     
-    PhoneNumber.query.filter_by(order_id=order.id).delete()
     phones_raw = request.form.get("phones", "")
     phone_list = [p.strip() for p in phones_raw.split(",") if p.strip()]
-    for idx, p in enumerate(phone_list):
-        pn = PhoneNumber(order_id=order.id, number=p, is_primary=(idx==0))
-        db.session.add(pn)
+    if phone_list != old_data['phones']:
+        # عبر العلاقة (وليس حذفاً جماعياً) حتى يسجل change_log تعديل الطلبية
+        order.phones = [PhoneNumber(number=p, is_primary=(idx==0)) for idx, p in enumerate(phone_list)]
+        changes.append(f"تغيير الهواتف: {', '.join(old_data['phones']) or 'بدون'} → {', '.join(phone_list) or 'بدون'}")
     
     if changes:
         change_details = " | ".join(changes)
@@ -514,8 +458,11 @@ def workers():
     
     workers = Worker.query.order_by(Worker.created_at.desc()).all()
     
-    total_salaries = sum(worker.total_salary for worker in workers)
-    total_advances = sum(worker.advances for worker in workers)
+    # الإجماليات باستعلام تجميعي واحد (معادلة الراتب كـ hybrid في SQL)
+    total_salaries, total_advances = db.session.query(
+        db.func.coalesce(db.func.sum(Worker.total_salary), 0.0),
+        db.func.coalesce(db.func.sum(Worker.advances), 0.0)
+    ).one()
     
     active_workers = [worker for worker in workers if worker.is_active]
     frozen_workers = [worker for worker in workers if not worker.is_active]
@@ -675,6 +622,107 @@ def record_worker_advance(id):
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)})
 
+@app.route("/workers/record_outside_work/<int:id>", methods=["POST"])
+def record_worker_outside_work(id):
+    """تسجيل أيام عمل خارجي مع مكافأتها"""
+    if "user" not in session:
+        return jsonify({"success": False, "error": "غير مصرح"})
+    
+    try:
+        worker = Worker.query.get_or_404(id)
+        days = int(request.form.get("days") or 0)
+        bonus_per_day = float(request.form.get("bonus_per_day") or 0)
+        notes = request.form.get("notes", "")
+        bonus = days * bonus_per_day
+        
+        worker.outside_work_days += days
+        worker.outside_work_bonus += bonus
+        
+        history = WorkerHistory(
+            worker_id=worker.id,
+            change_type="عمل خارجي",
+            details=f"تسجيل {days} يوم عمل خارجي ({bonus_per_day} دج لليوم). {notes}",
+            amount=bonus
+        )
+        db.session.add(history)
+        
+        db.session.commit()
+        
+        return jsonify({
+            "success": True, 
+            "message": f"تم تسجيل {days} يوم عمل خارجي بمكافأة {bonus} دج",
+            "new_outside_work_days": worker.outside_work_days,
+            "new_outside_work_bonus": worker.outside_work_bonus
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route("/workers/record_incentive/<int:id>", methods=["POST"])
+def record_worker_incentive(id):
+    """تسجيل تحفيز للعامل"""
+    if "user" not in session:
+        return jsonify({"success": False, "error": "غير مصرح"})
+    
+    try:
+        worker = Worker.query.get_or_404(id)
+        amount = float(request.form.get("amount") or 0)
+        notes = request.form.get("notes", "")
+        
+        worker.incentives += amount
+        
+        history = WorkerHistory(
+            worker_id=worker.id,
+            change_type="تحفيز",
+            details=f"تسجيل تحفيز. {notes}",
+            amount=amount
+        )
+        db.session.add(history)
+        
+        db.session.commit()
+        
+        return jsonify({
+            "success": True, 
+            "message": f"تم تسجيل تحفيز بمبلغ {amount} دج",
+            "new_incentives": worker.incentives
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route("/workers/record_late_hours/<int:id>", methods=["POST"])
+def record_worker_late_hours(id):
+    """تسجيل ساعات تأخر للعامل"""
+    if "user" not in session:
+        return jsonify({"success": False, "error": "غير مصرح"})
+    
+    try:
+        worker = Worker.query.get_or_404(id)
+        hours = float(request.form.get("hours") or 0)
+        deduction_amount = hours * LATE_HOUR_PENALTY
+        
+        worker.late_hours = (worker.late_hours or 0) + hours
+        
+        history = WorkerHistory(
+            worker_id=worker.id,
+            change_type="تأخر",
+            details=f"تسجيل {hours} ساعة تأخر",
+            amount=-deduction_amount
+        )
+        db.session.add(history)
+        
+        db.session.commit()
+        
+        return jsonify({
+            "success": True, 
+            "message": f"تم تسجيل {hours} ساعة تأخر",
+            "new_late_hours": worker.late_hours,
+            "deduction": deduction_amount
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e)})
+
 @app.route("/workers/pay_salary/<int:id>", methods=["POST"])
 def pay_worker_salary(id):
     """دفع راتب العامل"""
@@ -706,7 +754,10 @@ def pay_worker_salary(id):
             'total_salary': worker.total_salary
         }
         
-        worker.start_date = datetime.now(timezone.utc).date()
+        today = datetime.now(timezone.utc).date()
+        db.session.add(PayrollPeriod(worker_id=worker.id, paid_amount=amount, **worker_period(worker, today)))
+        
+        worker.start_date = today
         worker.absences = 0
         worker.outside_work_days = 0
         worker.outside_work_bonus = 0
@@ -741,10 +792,157 @@ def pay_worker_salary(id):
         print(f"❌ خطأ في دفع الراتب: {str(e)}")
         return jsonify({"success": False, "error": str(e)})
 
+def _payroll_period_end(value):
+    """نهاية فترة الدفعة: اليوم افتراضياً، ولا تكون في المستقبل"""
+    today = datetime.now(timezone.utc).date()
+    if not value:
+        return today
+    period_end = datetime.strptime(value, "%Y-%m-%d").date()
+    if period_end > today:
+        raise ValueError("نهاية الفترة لا يمكن أن تكون في المستقبل")
+    return period_end
+
+def _payroll_worker_ids(values):
+    return [int(value) for value in values] if values else None
+
+@app.route("/workers/payroll/preview")
+def payroll_preview():
+    """معاينة دفعة الرواتب: مستحق كل عامل نشط عند نهاية الفترة"""
+    if "user" not in session:
+        return jsonify({"success": False, "error": "غير مصرح"})
+    
+    try:
+        period_end = _payroll_period_end(request.args.get("period_end"))
+        worker_ids = _payroll_worker_ids(request.args.getlist("worker_ids"))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    rows = snapshot_payroll(db.session, period_end, worker_ids)
+    payable = [row for row in rows if row["net"] > 0]
+    return jsonify({
+        "success": True,
+        "period_end": period_end.strftime('%Y-%m-%d'),
+        "workers": [{**row, "period_start": row["period_start"].strftime('%Y-%m-%d'),
+                     "period_end": row["period_end"].strftime('%Y-%m-%d')} for row in rows],
+        "worker_count": len(payable),
+        "total_net": round(sum(row["net"] for row in payable), 2)
+    })
+
+@app.route("/workers/payroll/run", methods=["POST"])
+def payroll_run():
+    """دفع رواتب كل العمال النشطين (أو المحددين) في معاملة واحدة"""
+    if "user" not in session:
+        return jsonify({"success": False, "error": "غير مصرح"})
+    
+    try:
+        period_end = _payroll_period_end(request.form.get("period_end"))
+        worker_ids = _payroll_worker_ids(request.form.getlist("worker_ids"))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    payment_method = request.form.get("payment_method", "نقدي")
+    notes = request.form.get("notes", "")
+    created_by = session.get("user")
+    
+    try:
+        result = write_queue.run(lambda db_session: run_payroll(
+            db_session, period_end, worker_ids, payment_method, notes, created_by
+        ))
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ خطأ في دفعة الرواتب: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+    
+    if result["run_id"] is None:
+        return jsonify({"success": False, "error": "لا يوجد عمال لهم مستحقات في هذه الفترة"})
+    
+    return jsonify({
+        "success": True,
+        "message": f"تم دفع رواتب {result['worker_count']} عامل بمجموع {result['total_net']:.2f} دج",
+        **result
+    })
+
+@app.route("/workers/payroll/periods")
+def payroll_periods():
+    """فترات الرواتب المدفوعة مع مجاميعها (حسب العامل أو الدفعة أو التاريخ)"""
+    if "user" not in session:
+        return jsonify({"success": False, "error": "غير مصرح"})
+    
+    filters = []
+    try:
+        if request.args.get("worker_id"):
+            filters.append(PayrollPeriod.worker_id == int(request.args["worker_id"]))
+        if request.args.get("run_id"):
+            filters.append(PayrollPeriod.run_id == int(request.args["run_id"]))
+        if request.args.get("date_from"):
+            filters.append(PayrollPeriod.period_end >= datetime.strptime(request.args["date_from"], "%Y-%m-%d").date())
+        if request.args.get("date_to"):
+            filters.append(PayrollPeriod.period_end <= datetime.strptime(request.args["date_to"], "%Y-%m-%d").date())
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    periods = (PayrollPeriod.query.options(joinedload(PayrollPeriod.worker))
+               .filter(*filters)
+               .order_by(PayrollPeriod.period_end.desc(), PayrollPeriod.id.desc())
+               .all())
+    totals = db.session.query(
+        db.func.coalesce(db.func.sum(PayrollPeriod.base), 0),
+        db.func.coalesce(db.func.sum(PayrollPeriod.bonuses), 0),
+        db.func.coalesce(db.func.sum(PayrollPeriod.deductions), 0),
+        db.func.coalesce(db.func.sum(PayrollPeriod.net), 0),
+        db.func.coalesce(db.func.sum(PayrollPeriod.paid_amount), 0)
+    ).filter(*filters).one()
+    
+    return jsonify({
+        "success": True,
+        "periods": [{
+            "id": period.id,
+            "run_id": period.run_id,
+            "worker_id": period.worker_id,
+            "worker_name": period.worker.name if period.worker else None,
+            "period_start": period.period_start.strftime('%Y-%m-%d'),
+            "period_end": period.period_end.strftime('%Y-%m-%d'),
+            "days_worked": period.days_worked,
+            "base": period.base,
+            "bonuses": period.bonuses,
+            "deductions": period.deductions,
+            "net": period.net,
+            "paid_amount": period.paid_amount
+        } for period in periods],
+        "totals": dict(zip(("base", "bonuses", "deductions", "net", "paid_amount"),
+                           (round(total, 2) for total in totals)))
+    })
+
 # ========================
 # 💰 قسم المصاريف والمشتريات (المحسّن)
 # ========================
 
+def _expense_filters(args):
+    """شروط تصفية المصاريف من معاملات الطلب (صفحة المصاريف وتصديرها)"""
+    filters = []
+    expense_type = args.get('type', 'all')
+    if expense_type == 'paid':
+        filters.append(Expense.payment_status == 'paid')
+    elif expense_type == 'unpaid':
+        filters.append(Expense.payment_status == 'unpaid')
+    elif expense_type == 'owner':
+        filters.append(Expense.purchased_by == 'owner')
+    elif expense_type == 'partner':
+        filters.append(Expense.purchased_by == 'partner')
+    elif expense_type == 'worker':
+        filters.append(Expense.purchased_by == 'worker')
+    
+    category_id = _int_arg(args, 'category')
+    if category_id is not None:
+        filters.append(Expense.category_id == category_id)
+    
+    # purchase_date عمود تاريخ: المقارنة بقيمة date تستعمل الفهرس وتشمل يوم date_to كاملاً
+    date_from, date_to = _date_arg(args, 'date_from'), _date_arg(args, 'date_to')
+    if date_from:
+        filters.append(Expense.purchase_date >= date_from.date())
+    if date_to:
+        filters.append(Expense.purchase_date <= date_to.date())
+    return filters
+
 @app.route("/expenses")
 def expenses():
     """صفحة إدارة المصاريف والمشتريات - المحسنة"""
@@ -756,37 +954,57 @@ def expenses():
     date_from = request.args.get('date_from', '')
     date_to = request.args.get('date_to', '')
     
-    query = Expense.query
-    
-    if expense_type == 'paid':
-        query = query.filter(Expense.payment_status == 'paid')
-    elif expense_type == 'unpaid':
-        query = query.filter(Expense.payment_status == 'unpaid')
-    elif expense_type == 'owner':
-        query = query.filter(Expense.purchased_by == 'owner')
-    elif expense_type == 'partner':
-        query = query.filter(Expense.purchased_by == 'partner')
-    elif expense_type == 'worker':
-        query = query.filter(Expense.purchased_by == 'worker')
-    
-    if category_id and category_id != 'all':
-        query = query.filter(Expense.category_id == int(category_id))
+    filters = _expense_filters(request.args)
+    
+    # صفحة واحدة فقط مع التصنيف والمورد في نفس الاستعلام
+    query = Expense.query.options(
+        joinedload(Expense.category),
+        joinedload(Expense.supplier)
+    ).filter(*filters)
+    page = paginate_keyset(query, Expense,
+                           after=request.args.get('after'),
+                           before=request.args.get('before'))
+    expenses_list = page.items
+    
+    # الإجماليات على كل النتائج المصفاة باستعلام تجميعي واحد
+    total_count, total_amount, paid_amount, unpaid_amount = db.session.query(
+        db.func.count(Expense.id),
+        db.func.coalesce(db.func.sum(Expense.total_amount), 0.0),
+        db.func.coalesce(db.func.sum(db.case((Expense.payment_status == 'paid', Expense.total_amount), else_=0.0)), 0.0),
+        db.func.coalesce(db.func.sum(db.case((Expense.payment_status == 'unpaid', Expense.total_amount), else_=0.0)), 0.0)
+    ).filter(*filters).one()
+    
+    # عدد الفواتير لكل مصروف في الصفحة، والمدفوع من دينه التلقائي (المدفوع ليس عموداً
+    # في المصروف)، من استعلام واحد
+    receipt_counts, paid_amounts = {}, {}
+    if expenses_list:
+        for expense_id, receipts, paid in db.session.query(
+            Expense.id,
+            db.select(db.func.count(ExpenseReceipt.id))
+            .where(ExpenseReceipt.expense_id == Expense.id).scalar_subquery(),
+            db.select(Debt.paid_amount)
+            .where(Debt.source_type == 'expense', Debt.source_id == Expense.id).scalar_subquery()
+        ).filter(Expense.id.in_([e.id for e in expenses_list])):
+            receipt_counts[expense_id] = receipts
+            paid_amounts[expense_id] = paid or 0.0
     
-    if date_from:
-        query = query.filter(Expense.purchase_date >= datetime.strptime(date_from, "%Y-%m-%d"))
-    if date_to:
-        query = query.filter(Expense.purchase_date <= datetime.strptime(date_to, "%Y-%m-%d"))
-    
-    expenses_list = query.order_by(Expense.created_at.desc()).all()
     categories = ExpenseCategory.query.all()
     suppliers = Supplier.query.all()
     
-    total_amount = sum(expense.total_amount for expense in expenses_list)
-    paid_amount = sum(expense.total_amount for expense in expenses_list if expense.payment_status == 'paid')
-    unpaid_amount = sum(expense.total_amount for expense in expenses_list if expense.payment_status == 'unpaid')
+    page_filters = {
+        'type': expense_type,
+        'category': category_id,
+        'date_from': date_from,
+        'date_to': date_to
+    }
     
     return render_template("expenses.html", 
                          expenses=expenses_list,
+                         page=page,
+                         filters={k: v for k, v in page_filters.items() if v},
+                         receipt_counts=receipt_counts,
+                         paid_amounts=paid_amounts,
+                         total_count=total_count,
                          categories=categories,
                          suppliers=suppliers,
                          expense_type=expense_type,
@@ -836,6 +1054,8 @@ def add_expense():
         )
         db.session.add(expense)
         db.session.flush()  # هذا مهم للحصول على expense.id قبل الـ commit
+        # الدين التلقائي للمصروف غير المدفوع، بالمبلغ المدفوع من النموذج (ليس عموداً في المصروف)
+        sync_source_debt(db.session.connection(), 'expense', expense.id, paid_amount)
         
         # حفظ في سجل الأسعار إذا طلب المستخدم ذلك
         if request.form.get("save_to_price_history") == "yes":
@@ -848,26 +1068,6 @@ def add_expense():
             )
             db.session.add(price_history)
         
-        # 🆕 إذا كان المصروف غير مدفوع أو مدفوع جزئياً، إنشاء دين تلقائياً
-        if payment_status in ['unpaid', 'partial']:
-            remaining_amount = total_amount - paid_amount
-            
-            debt = Debt(
-                name=expense.supplier.name if expense.supplier else "مورد",
-                phone=expense.supplier.phone if expense.supplier else "",
-                address=expense.supplier.address if expense.supplier else "",
-                debt_amount=total_amount,
-                paid_amount=paid_amount,
-                start_date=expense.purchase_date,
-                status="unpaid",
-                source_type='expense',
-                source_id=expense.id,
-                description=f"{expense.description} - {expense.category.name if expense.category else 'عام'}",
-                recorded_by=session["user"]
-            )
-            db.session.add(debt)
-            print(f"✅ تم إنشاء دين تلقائي للمصروف #{expense.id}")
-        
         # حفظ الفاتورة إذا كانت موجودة
         if 'receipt' in request.files:
             file = request.files['receipt']
@@ -875,8 +1075,6 @@ def add_expense():
                 # حفظ الفاتورة
                 file_data = file.read()
                 if file_data:
-                    compressed_data = compress_image(file_data)
-                    
                     timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
                     file_extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else 'jpg'
                     filename = f"receipt_{expense.id}_{timestamp}.{file_extension}"
@@ -885,18 +1083,19 @@ def add_expense():
                         expense_id=expense.id,
                         filename=filename,
                         original_filename=file.filename,
-                        file_size=len(compressed_data),
                         mime_type=file.mimetype,
-                        image_data=compressed_data,
                         captured_by=session["user"]
                     )
-                    db.session.add(receipt)
+                    queue_receipt(receipt, file_data)
         
         db.session.commit()
         print(f"✅ تم إضافة المصروف #{expense.id} بحالة دفع: {payment_status}")
         
         return redirect(url_for('expenses'))
         
+    except IngestQueueFull:
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         db.session.rollback()
         print(f"❌ خطأ في إضافة المصروف: {str(e)}")
@@ -913,9 +1112,9 @@ def get_price_history():
     if not product_name:
         return jsonify({"error": "اسم المنتج مطلوب"})
     
-    price_history = ProductPriceHistory.query.filter(
-        ProductPriceHistory.product_name.ilike(f"%{product_name}%")
-    ).order_by(ProductPriceHistory.purchase_date.desc()).limit(10).all()
+    # الأسماء المطابقة من فهرس البحث ثم آخر 10 أسعار لها (بدلاً من ilike على كل السجل)
+    names = [match["name"] for match in search_names(product_name) if match["price_count"]]
+    price_history = recent_prices(names, limit=10)
     
     result = []
     for item in price_history:
@@ -968,26 +1167,8 @@ def quick_add_expense():
         )
         db.session.add(expense)
         db.session.flush()  # هذا مهم للحصول على expense.id قبل الـ commit
-        
-        # 🆕 إذا كان المصروف غير مدفوع أو مدفوع جزئياً، إنشاء دين تلقائياً
-        if payment_status in ['unpaid', 'partial']:
-            remaining_amount = total_amount - paid_amount
-            
-            debt = Debt(
-                name=expense.supplier.name if expense.supplier else "مورد",
-                phone=expense.supplier.phone if expense.supplier else "",
-                address=expense.supplier.address if expense.supplier else "",
-                debt_amount=total_amount,
-                paid_amount=paid_amount,
-                start_date=expense.purchase_date,
-                status="unpaid",
-                source_type='expense',
-                source_id=expense.id,
-                description=f"{expense.description} - {expense.category.name if expense.category else 'عام'}",
-                recorded_by=session["user"]
-            )
-            db.session.add(debt)
-            print(f"✅ تم إنشاء دين تلقائي للمصروف السريع #{expense.id}")
+        # الدين التلقائي للمصروف غير المدفوع، بالمبلغ المدفوع من النموذج (ليس عموداً في المصروف)
+        sync_source_debt(db.session.connection(), 'expense', expense.id, paid_amount)
         
         # حفظ الفاتورة إذا كانت موجودة
         if 'receipt' in request.files:
@@ -996,8 +1177,6 @@ def quick_add_expense():
                 # حفظ الفاتورة
                 file_data = file.read()
                 if file_data:
-                    compressed_data = compress_image(file_data)
-                    
                     timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
                     file_extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else 'jpg'
                     filename = f"receipt_{expense.id}_{timestamp}.{file_extension}"
@@ -1006,18 +1185,19 @@ def quick_add_expense():
                         expense_id=expense.id,
                         filename=filename,
                         original_filename=file.filename,
-                        file_size=len(compressed_data),
                         mime_type=file.mimetype,
-                        image_data=compressed_data,
                         captured_by=session["user"]
                     )
-                    db.session.add(receipt)
+                    queue_receipt(receipt, file_data)
         
         db.session.commit()
         print(f"✅ تم إضافة المصروف السريع #{expense.id} بحالة دفع: {payment_status}")
         
         return redirect(url_for('expenses'))
         
+    except IngestQueueFull:
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         db.session.rollback()
         print(f"❌ خطأ في الإضافة السريعة: {str(e)}")
@@ -1029,20 +1209,21 @@ def expenses_statistics():
     if "user" not in session:
         return jsonify({"error": "غير مصرح"})
     
+    # من جدول المجاميع فقط (expense_rollup): بضع صفوف لكل شهر مهما كبر سجل المصاريف
     categories_stats = db.session.query(
         ExpenseCategory.name,
-        db.func.sum(Expense.total_amount).label('total')
-    ).join(Expense).group_by(ExpenseCategory.name).all()
+        db.func.round(db.func.sum(ExpenseRollup.total), 2).label('total')
+    ).join(ExpenseRollup, ExpenseRollup.category_id == ExpenseCategory.id).group_by(ExpenseCategory.name).all()
     
     monthly_stats = db.session.query(
-        db.func.strftime('%Y-%m', Expense.purchase_date).label('month'),
-        db.func.sum(Expense.total_amount).label('total')
-    ).group_by('month').order_by('month').all()
+        db.func.nullif(ExpenseRollup.month, '').label('month'),
+        db.func.round(db.func.sum(ExpenseRollup.total), 2).label('total')
+    ).group_by(ExpenseRollup.month).order_by(ExpenseRollup.month).all()
     
     suppliers_stats = db.session.query(
         Supplier.name,
-        db.func.sum(Expense.total_amount).label('total')
-    ).join(Expense).group_by(Supplier.name).all()
+        db.func.round(db.func.sum(ExpenseRollup.total), 2).label('total')
+    ).join(ExpenseRollup, ExpenseRollup.supplier_id == Supplier.id).group_by(Supplier.name).all()
     
     return jsonify({
         "success": True,
@@ -1103,6 +1284,8 @@ def get_expense_receipts(expense_id):
                 "original_filename": receipt.original_filename,
                 "file_size": receipt.file_size,
                 "mime_type": receipt.mime_type,
+                "processing_status": receipt.processing_status,
+                "version": receipt_version(receipt),
                 "captured_at": receipt.captured_at.strftime("%Y-%m-%d %H:%M"),
                 "captured_by": receipt.captured_by
             })
@@ -1133,9 +1316,6 @@ def upload_expense_receipt(expense_id):
             # قراءة بيانات الملف
             file_data = file.read()
             
-            # ضغط الصورة
-            compressed_data = compress_image(file_data)
-            
             # إنشاء اسم فريد للملف
             timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
             file_extension = file.filename.rsplit('.', 1)[1].lower()
@@ -1146,12 +1326,10 @@ def upload_expense_receipt(expense_id):
                 expense_id=expense_id,
                 filename=filename,
                 original_filename=file.filename,
-                file_size=len(compressed_data),
                 mime_type=file.mimetype,
-                image_data=compressed_data,
                 captured_by=session["user"]
             )
-            db.session.add(receipt)
+            queue_receipt(receipt, file_data)
             db.session.commit()
             
             return jsonify({
@@ -1162,6 +1340,9 @@ def upload_expense_receipt(expense_id):
         else:
             return jsonify({"success": False, "error": "نوع الملف غير مسموح"})
             
+    except IngestQueueFull:
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)})
@@ -1188,9 +1369,6 @@ def capture_expense_receipt(expense_id):
         else:
             image_data = base64.b64decode(image_data_url)
         
-        # ضغط الصورة
-        compressed_data = compress_image(image_data)
-        
         # إنشاء اسم فريد
         timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
         filename = f"receipt_{expense_id}_{timestamp}.jpg"
@@ -1200,12 +1378,10 @@ def capture_expense_receipt(expense_id):
             expense_id=expense_id,
             filename=filename,
             original_filename=f"كاميرا_{timestamp}.jpg",
-            file_size=len(compressed_data),
             mime_type="image/jpeg",
-            image_data=compressed_data,
             captured_by=session["user"]
         )
-        db.session.add(receipt)
+        queue_receipt(receipt, image_data)
         db.session.commit()
         
         return jsonify({
@@ -1214,6 +1390,9 @@ def capture_expense_receipt(expense_id):
             "receipt_id": receipt.id
         })
         
+    except IngestQueueFull:
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)})
@@ -1235,8 +1414,6 @@ def capture_upload_expense_receipt(expense_id):
             # حفظ الفاتورة
             file_data = file.read()
             if file_data:
-                compressed_data = compress_image(file_data)
-                
                 timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
                 filename = f"receipt_{expense.id}_{timestamp}.jpg"
                 
@@ -1244,12 +1421,10 @@ def capture_upload_expense_receipt(expense_id):
                     expense_id=expense.id,
                     filename=filename,
                     original_filename=f"كاميرا_{timestamp}.jpg",
-                    file_size=len(compressed_data),
                     mime_type="image/jpeg",
-                    image_data=compressed_data,
                     captured_by=session["user"]
                 )
-                db.session.add(receipt)
+                queue_receipt(receipt, file_data)
                 db.session.commit()
                 
                 return jsonify({
@@ -1260,6 +1435,9 @@ def capture_upload_expense_receipt(expense_id):
         
         return jsonify({"success": False, "error": "لم يتم حفظ الصورة"})
         
+    except IngestQueueFull:
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)})
@@ -1273,8 +1451,8 @@ def get_receipt_image(receipt_id):
     try:
         receipt = ExpenseReceipt.query.get_or_404(receipt_id)
         
-        # إرجاع الصورة كاستجابة
-        return Response(receipt.image_data, mimetype=receipt.mime_type)
+        # إرجاع الصورة من مخزن الفواتير (?size=thumb للنسخة المصغرة)
+        return send_receipt(receipt, request.args.get('size', 'full'))
         
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
@@ -1289,6 +1467,7 @@ def delete_receipt(receipt_id):
         receipt = ExpenseReceipt.query.get_or_404(receipt_id)
         db.session.delete(receipt)
         db.session.commit()
+        release_blob(receipt.content_hash)
         
         return jsonify({"success": True, "message": "تم حذف الفاتورة بنجاح"})
         
@@ -1296,7 +1475,31 @@ def delete_receipt(receipt_id):
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)})
     
-    # ========================
+@app.cli.command("migrate-receipts")
+@click.option("--batch-size", default=50, help="عدد الصور في كل دفعة")
+@click.option("--vacuum", is_flag=True, help="تنفيذ VACUUM بعد النقل لاسترجاع المساحة")
+def migrate_receipts_command(batch_size, vacuum):
+    """نقل صور الفواتير من قاعدة البيانات إلى مخزن الملفات"""
+    moved = migrate_receipt_blobs(batch_size=batch_size)
+    print(f"✅ تم نقل الفواتير: {moved}")
+    if vacuum:
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+        print("✅ تم ضغط قاعدة البيانات")
+
+@app.cli.command("process-receipts")
+def process_receipts_command():
+    """ضغط الفواتير التي بقيت بحالة 'processing' بعد توقف الخادم"""
+    processed = process_stale_receipts()
+    print(f"✅ تمت معالجة الفواتير العالقة: {processed}")
+
+@app.cli.command("build-thumbnails")
+def build_thumbnails_command():
+    """توليد النسخ المصغرة للفواتير القديمة التي لا تملكها"""
+    built = build_missing_variants()
+    print(f"✅ تم توليد النسخ المصغرة: {built}")
+
+# ========================
 # 📦 واجهات برمجة التطبيقات للمنتجات
 # ========================
 
@@ -1316,6 +1519,37 @@ def get_category_products():
     result = [{"id": p.id, "name": p.name} for p in products]
     return jsonify({"success": True, "products": result})
 
+@app.route("/api/products/search")
+def search_products():
+    """الإكمال التلقائي لأسماء المنتجات مع آخر سعر لكل مورد"""
+    if "user" not in session:
+        return jsonify({"error": "غير مصرح"})
+    
+    query = request.args.get('q', '')
+    try:
+        category_id = int(request.args['category_id']) if request.args.get('category_id', 'all') != 'all' else None
+        limit = int(request.args.get('limit', AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        return jsonify({"success": False, "error": "معاملات غير صالحة"}), 400
+    
+    return jsonify({"success": True, "products": autocomplete(query, category_id, limit)})
+
+@app.route("/api/products/prices")
+def compare_product_prices():
+    """مقارنة أسعار الموردين لمنتج: أفضل سعر حالي، آخر الأسعار والاتجاه لكل مورد"""
+    if "user" not in session:
+        return jsonify({"error": "غير مصرح"})
+    
+    product_name = request.args.get('product_name', '').strip()
+    if not product_name:
+        return jsonify({"success": False, "error": "اسم المنتج مطلوب"}), 400
+    try:
+        recent = int(request.args.get('recent', RECENT_PRICES))
+    except ValueError:
+        return jsonify({"success": False, "error": "معاملات غير صالحة"}), 400
+    
+    return jsonify({"success": True, **compare_suppliers(product_name, recent)})
+
 @app.route("/api/products/add", methods=["POST"])
 def add_product():
     """إضافة منتج جديد"""
@@ -1483,19 +1717,7 @@ def add_purchase():
         db.session.add(purchase)
         db.session.commit()
         
-        # فقط إذا كان هناك مورد وكانت العملية غير مدفوعة، نضيف دين
-        if purchase.status == "unpaid" and supplier_id:
-            supplier = Supplier.query.get(purchase.supplier_id)
-            if supplier:  # تأكد من وجود المورد
-                debt = Debt(
-                    name=supplier.name,
-                    phone=supplier.phone,
-                    address=supplier.address,
-                    debt_amount=purchase.total_price,
-                    paid_amount=0.0
-                )
-                db.session.add(debt)
-                db.session.commit()
+        # الدين على المورد يُنشأ تلقائياً عند حفظ المشتريات غير المدفوعة (debt_sync)
         
         return redirect(url_for("purchases", type=purchase.type))
         
@@ -1534,6 +1756,26 @@ def delete_purchase(id):
 # 🚚 قسم النقل المحسّن
 # ========================
 
+def _transport_filters(args):
+    """شروط تصفية النقل من معاملات الطلب (صفحة النقل وتصديرها)"""
+    filters = []
+    transport_type = args.get('type', 'inside')
+    if transport_type == 'inside':
+        filters.append(Transport.type == 'inside')
+    elif transport_type == 'outside':
+        filters.append(Transport.type == 'outside')
+    
+    category_id = _int_arg(args, 'category')
+    if category_id is not None:
+        filters.append(Transport.category_id == category_id)
+    
+    date_from, date_to = _date_arg(args, 'date_from'), _date_arg(args, 'date_to')
+    if date_from:
+        filters.append(Transport.transport_date >= date_from.date())
+    if date_to:
+        filters.append(Transport.transport_date <= date_to.date())
+    return filters
+
 @app.route("/transport")
 def transport():
     """صفحة النقل المحسّنة - محدثة"""
@@ -1545,35 +1787,51 @@ def transport():
     date_from = request.args.get('date_from', '')
     date_to = request.args.get('date_to', '')
     
+    filters = _transport_filters(request.args)
+    
+    # صفحة واحدة فقط مع التصنيف والنوع الفرعي في نفس الاستعلام (بدون صور الفواتير)
     query = Transport.query.options(
         joinedload(Transport.category),
-        joinedload(Transport.sub_type),
-        joinedload(Transport.receipts)
-    )
-    
-    if transport_type == 'inside':
-        query = query.filter(Transport.type == 'inside')
-    elif transport_type == 'outside':
-        query = query.filter(Transport.type == 'outside')
-    
-    if category_id and category_id != 'all':
-        query = query.filter(Transport.category_id == int(category_id))
+        joinedload(Transport.sub_type)
+    ).filter(*filters)
+    page = paginate_keyset(query, Transport,
+                           after=request.args.get('after'),
+                           before=request.args.get('before'))
+    transports = page.items
+    
+    # الإجماليات على كل النتائج المصفاة باستعلام تجميعي واحد
+    total_count, total_amount, paid_amount, remaining_amount = db.session.query(
+        db.func.count(Transport.id),
+        db.func.coalesce(db.func.sum(Transport.transport_amount), 0.0),
+        db.func.coalesce(db.func.sum(Transport.paid_amount), 0.0),
+        db.func.coalesce(db.func.sum(db.func.round(Transport.transport_amount - Transport.paid_amount, 2)), 0.0)
+    ).filter(*filters).one()
+    
+    # عدد الفواتير لكل نقل في الصفحة من استعلام مجمّع واحد
+    receipt_counts = {}
+    if transports:
+        receipt_counts = dict(db.session.query(
+            TransportReceipt.transport_id, db.func.count(TransportReceipt.id)
+        ).filter(
+            TransportReceipt.transport_id.in_([t.id for t in transports])
+        ).group_by(TransportReceipt.transport_id).all())
     
-    if date_from:
-        query = query.filter(Transport.transport_date >= datetime.strptime(date_from, "%Y-%m-%d"))
-    if date_to:
-        query = query.filter(Transport.transport_date <= datetime.strptime(date_to, "%Y-%m-%d"))
-    
-    transports = query.order_by(Transport.created_at.desc()).all()
     categories = TransportCategory.query.all()
     sub_types = TransportSubType.query.all()
     
-    total_amount = sum(transport.transport_amount for transport in transports)
-    paid_amount = sum(transport.paid_amount for transport in transports)
-    remaining_amount = sum(transport.remaining_amount for transport in transports)
+    page_filters = {
+        'type': transport_type,
+        'category': category_id,
+        'date_from': date_from,
+        'date_to': date_to
+    }
     
     return render_template("transport.html", 
                          transports=transports, 
+                         page=page,
+                         filters={k: v for k, v in page_filters.items() if v},
+                         receipt_counts=receipt_counts,
+                         total_count=total_count,
                          transport_type=transport_type,
                          categories=categories,
                          sub_types=sub_types,
@@ -1610,6 +1868,8 @@ def add_transport():
         # الحصول على حالة الدفع والمبلغ المدفوع مع قيم افتراضية
         payment_status = request.form.get("payment_status", "paid")
         paid_amount = float(request.form.get("paid_amount", 0) or 0)
+        if payment_status == "paid":
+            paid_amount = transport_amount
         
         transport = Transport(
             name=request.form.get("name", "نقل شخصي"),
@@ -1632,34 +1892,12 @@ def add_transport():
         db.session.add(transport)
         db.session.flush()
         
-        # 🆕 إذا كان النقل غير مدفوع أو مدفوع جزئياً، إنشاء دين تلقائياً
-        if payment_status in ['unpaid', 'partial']:
-            remaining_amount = transport_amount - paid_amount
-            
-            debt = Debt(
-                name=transport.name,
-                phone=transport.phone,
-                address=transport.address,
-                debt_amount=transport_amount,
-                paid_amount=paid_amount,
-                start_date=transport.transport_date,
-                status="unpaid",
-                source_type='transport',
-                source_id=transport.id,
-                description=f"{transport.purpose} - {transport.destination}",
-                recorded_by=session["user"]
-            )
-            db.session.add(debt)
-            print(f"✅ تم إنشاء دين تلقائي للنقل #{transport.id}")
-        
         # حفظ الفاتورة إذا كانت موجودة
         if 'receipt' in request.files:
             file = request.files['receipt']
             if file and file.filename != '':
                 file_data = file.read()
                 if file_data:
-                    compressed_data = compress_image(file_data)
-                    
                     timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
                     file_extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else 'jpg'
                     filename = f"transport_receipt_{transport.id}_{timestamp}.{file_extension}"
@@ -1668,18 +1906,19 @@ def add_transport():
                         transport_id=transport.id,
                         filename=filename,
                         original_filename=file.filename,
-                        file_size=len(compressed_data),
                         mime_type=file.mimetype,
-                        image_data=compressed_data,
                         captured_by=session["user"]
                     )
-                    db.session.add(receipt)
+                    queue_receipt(receipt, file_data)
         
         db.session.commit()
         print(f"✅ تم إضافة النقل #{transport.id} بحالة دفع: {payment_status}")
         
         return redirect(url_for("transport", type=transport.type))
         
+    except IngestQueueFull:
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         db.session.rollback()
         print(f"❌ خطأ في إضافة النقل: {str(e)}")
@@ -1704,6 +1943,8 @@ def quick_add_transport():
         # الحصول على حالة الدفع والمبلغ المدفوع مع قيم افتراضية
         payment_status = request.form.get("payment_status", "paid")
         paid_amount = float(request.form.get("paid_amount", 0) or 0)
+        if payment_status == "paid":
+            paid_amount = amount
 
         transport = Transport(
             name="نقل سريع",
@@ -1721,34 +1962,12 @@ def quick_add_transport():
         db.session.add(transport)
         db.session.flush()  # للحصول على ID قبل الـ commit
         
-        # 🆕 إذا كان النقل غير مدفوع أو مدفوع جزئياً، إنشاء دين تلقائياً
-        if payment_status in ['unpaid', 'partial']:
-            remaining_amount = amount - paid_amount
-            
-            debt = Debt(
-                name=transport.name,
-                phone=transport.phone,
-                address=transport.address,
-                debt_amount=amount,
-                paid_amount=paid_amount,
-                start_date=transport.transport_date,
-                status="unpaid",
-                source_type='transport',
-                source_id=transport.id,
-                description=f"{transport.purpose} - {transport.destination}",
-                recorded_by=session["user"]
-            )
-            db.session.add(debt)
-            print(f"✅ تم إنشاء دين تلقائي للنقل السريع #{transport.id}")
-        
         # حفظ الفاتورة إذا كانت موجودة
         if 'receipt' in request.files:
             file = request.files['receipt']
             if file and file.filename != '':
                 file_data = file.read()
                 if file_data:
-                    compressed_data = compress_image(file_data)
-                    
                     timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
                     file_extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else 'jpg'
                     filename = f"transport_receipt_{transport.id}_{timestamp}.{file_extension}"
@@ -1757,18 +1976,19 @@ def quick_add_transport():
                         transport_id=transport.id,
                         filename=filename,
                         original_filename=file.filename,
-                        file_size=len(compressed_data),
                         mime_type=file.mimetype,
-                        image_data=compressed_data,
                         captured_by=session["user"]
                     )
-                    db.session.add(receipt)
+                    queue_receipt(receipt, file_data)
         
         db.session.commit()
         print(f"✅ تم إضافة النقل السريع #{transport.id} بحالة دفع: {payment_status}")
         
         return redirect(url_for("transport"))
         
+    except IngestQueueFull:
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         db.session.rollback()
         print(f"❌ خطأ في إضافة النقل السريع: {str(e)}")
@@ -1854,8 +2074,6 @@ def upload_transport_receipt(transport_id):
         
         if file and allowed_file(file.filename):
             file_data = file.read()
-            compressed_data = compress_image(file_data)
-            
             timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
             file_extension = file.filename.rsplit('.', 1)[1].lower()
             filename = f"transport_receipt_{transport_id}_{timestamp}.{file_extension}"
@@ -1864,12 +2082,10 @@ def upload_transport_receipt(transport_id):
                 transport_id=transport_id,
                 filename=filename,
                 original_filename=file.filename,
-                file_size=len(compressed_data),
                 mime_type=file.mimetype,
-                image_data=compressed_data,
                 captured_by=session["user"]  # إضافة اسم المستخدم
             )
-            db.session.add(receipt)
+            queue_receipt(receipt, file_data)
             db.session.commit()
             
             return jsonify({
@@ -1880,6 +2096,9 @@ def upload_transport_receipt(transport_id):
         else:
             return jsonify({"success": False, "error": "نوع الملف غير مسموح"})
             
+    except IngestQueueFull:
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)})
@@ -1892,7 +2111,7 @@ def get_transport_receipt_image(receipt_id):
     
     try:
         receipt = TransportReceipt.query.get_or_404(receipt_id)
-        return Response(receipt.image_data, mimetype=receipt.mime_type)
+        return send_receipt(receipt, request.args.get('size', 'full'))
         
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
@@ -1917,6 +2136,8 @@ def get_transport_receipts(transport_id):
                 "original_filename": receipt.original_filename,
                 "file_size": receipt.file_size,
                 "mime_type": receipt.mime_type,
+                "processing_status": receipt.processing_status,
+                "version": receipt_version(receipt),
                 "captured_at": receipt.captured_at.strftime("%Y-%m-%d %H:%M"),
                 "captured_by": receipt.captured_by
             })
@@ -1936,6 +2157,7 @@ def delete_transport_receipt(receipt_id):
         transport_id = receipt.transport_id
         db.session.delete(receipt)
         db.session.commit()
+        release_blob(receipt.content_hash)
         
         return jsonify({"success": True, "message": "تم حذف الفاتورة بنجاح"})
         
@@ -1966,14 +2188,14 @@ def update_debt_source(debt_id):
         if debt.source_type == 'expense':
             expense = Expense.query.get(debt.source_id)
             if expense:
-                # تحديث المبلغ المدفوع في المصروف
-                expense.paid_amount = debt.paid_amount + payment_amount
+                # المبلغ المدفوع يُحفظ في الدين فقط، والمصروف يحمل حالة الدفع
+                paid_amount = debt.paid_amount + payment_amount
                 
                 # تحديث حالة الدفع بناءً على المبلغ المدفوع
-                if expense.paid_amount >= expense.total_amount:
+                if paid_amount >= expense.total_amount:
                     expense.payment_status = 'paid'
                     print(f"✅ تم تحديث المصروف #{expense.id} إلى حالة: مدفوعة")
-                elif expense.paid_amount > 0:
+                elif paid_amount > 0:
                     expense.payment_status = 'partial'
                     print(f"✅ تم تحديث المصروف #{expense.id} إلى حالة: مدفوع جزئياً")
                 else:
@@ -1985,7 +2207,7 @@ def update_debt_source(debt_id):
                     "success": True, 
                     "message": f"تم تحديث المصروف #{expense.id} بنجاح",
                     "new_status": expense.payment_status,
-                    "paid_amount": expense.paid_amount
+                    "paid_amount": paid_amount
                 })
             else:
                 return jsonify({"success": False, "error": "المصروف المرتبط غير موجود"})
@@ -2014,6 +2236,21 @@ def update_debt_source(debt_id):
         db.session.rollback()
         print(f"❌ خطأ في تحديث المصدر: {str(e)}")
         return jsonify({"success": False, "error": str(e)})
+
+def _debt_filters(args):
+    """شروط تصفية الديون من معاملات الطلب (صفحة الديون وتصديرها)"""
+    filters = []
+    debt_status = args.get('status', 'unpaid')
+    if debt_status == 'unpaid':
+        filters.append(Debt.status == 'unpaid')
+    elif debt_status == 'paid':
+        filters.append(Debt.status == 'paid')
+    
+    source_type = args.get('source', 'all')
+    if source_type != 'all':
+        filters.append(Debt.source_type == source_type)
+    return filters
+
 @app.route("/debts")
 def debts():
     """صفحة الديون المحسنة - النظام الذكي"""
@@ -2023,90 +2260,8 @@ def debts():
     debt_status = request.args.get('status', 'unpaid')
     source_type = request.args.get('source', 'all')
     
-    # جلب الديون اليدوية
-    manual_debts_query = Debt.query.filter(Debt.source_type == 'manual')
-    
-    # جلب الديون التلقائية من المصاريف غير المدفوعة
-    expense_debts = []
-    unpaid_expenses = Expense.query.filter(Expense.payment_status == 'unpaid').all()
-    for expense in unpaid_expenses:
-        # التحقق إذا كان هذا المصروف مضافاً كدين مسبقاً
-        existing_debt = Debt.query.filter_by(source_type='expense', source_id=expense.id).first()
-        if not existing_debt:
-            debt = Debt(
-                name=expense.supplier.name if expense.supplier else "مورد",
-                phone=expense.supplier.phone if expense.supplier else "",
-                address=expense.supplier.address if expense.supplier else "",
-                debt_amount=expense.total_amount,
-                paid_amount=0.0,
-                start_date=expense.purchase_date,
-                status="unpaid",
-                source_type='expense',
-                source_id=expense.id,
-                description=f"{expense.description} - {expense.category.name if expense.category else 'عام'}",
-                recorded_by=expense.recorded_by
-            )
-            expense_debts.append(debt)
-    
-    # جلب الديون التلقائية من المشتريات غير المدفوعة
-    purchase_debts = []
-    unpaid_purchases = Purchase.query.filter(Purchase.status == "unpaid").all()
-    for purchase in unpaid_purchases:
-        existing_debt = Debt.query.filter_by(source_type='purchase', source_id=purchase.id).first()
-        if not existing_debt and purchase.supplier:
-            debt = Debt(
-                name=purchase.supplier.name,
-                phone=purchase.supplier.phone,
-                address=purchase.supplier.address,
-                debt_amount=purchase.total_price,
-                paid_amount=0.0,
-                start_date=purchase.purchase_date,
-                status="unpaid",
-                source_type='purchase',
-                source_id=purchase.id,
-                description=f"{purchase.product.name if purchase.product else 'منتج'} - {purchase.quantity} وحدة",
-                recorded_by="system"
-            )
-            purchase_debts.append(debt)
-    
-    # جلب الديون التلقائية من النقل غير المدفوع
-    transport_debts = []
-    unpaid_transports = Transport.query.filter(Transport.paid_amount < Transport.transport_amount).all()
-    for transport in unpaid_transports:
-        existing_debt = Debt.query.filter_by(source_type='transport', source_id=transport.id).first()
-        if not existing_debt and transport.remaining_amount > 0:
-            debt = Debt(
-                name=transport.name,
-                phone=transport.phone,
-                address=transport.address,
-                debt_amount=transport.remaining_amount,
-                paid_amount=0.0,
-                start_date=transport.transport_date,
-                status="unpaid",
-                source_type='transport',
-                source_id=transport.id,
-                description=f"{transport.purpose} - {transport.destination}",
-                recorded_by=transport.recorded_by
-            )
-            transport_debts.append(debt)
-    
-    # حفظ الديون التلقائية الجديدة في قاعدة البيانات
-    for debt in expense_debts + purchase_debts + transport_debts:
-        db.session.add(debt)
-    
-    if expense_debts or purchase_debts or transport_debts:
-        db.session.commit()
-    
     # بناء الاستعلام النهائي للديون
-    query = Debt.query
-    
-    if debt_status == 'unpaid':
-        query = query.filter(Debt.status == 'unpaid')
-    elif debt_status == 'paid':
-        query = query.filter(Debt.status == 'paid')
-    
-    if source_type != 'all':
-        query = query.filter(Debt.source_type == source_type)
+    query = Debt.query.filter(*_debt_filters(request.args))
     
     debts_list = query.order_by(Debt.created_at.desc()).all()
     
@@ -2134,6 +2289,52 @@ def debts():
                          manual_debts_count=manual_debts_count,
                          now=datetime.now(timezone.utc))
 
+@app.cli.command("reconcile-debts")
+def reconcile_debts_command():
+    """إنشاء الديون التلقائية الناقصة دفعة واحدة (للبيانات القديمة)"""
+    created = reconcile_debts()
+    db.session.commit()
+    print(f"✅ تمت مطابقة الديون: {created}")
+
+@app.cli.command("rebuild-expense-rollups")
+@click.option("--check", is_flag=True, help="المقارنة فقط دون إعادة البناء")
+def rebuild_expense_rollups_command(check):
+    """إعادة بناء مجاميع إحصائيات المصاريف من جدول المصاريف"""
+    mismatches = verify_rollups()
+    for (month, category_id, supplier_id), expected, stored in mismatches:
+        print(f"❌ {month or '-'} تصنيف {category_id} مورد {supplier_id}: المحسوب {expected} ≠ المخزن {stored}")
+    if check:
+        if mismatches:
+            raise SystemExit(1)
+        print("✅ مجاميع المصاريف مطابقة")
+        return
+    rebuilt = rebuild_rollups()
+    db.session.commit()
+    print(f"✅ تمت إعادة بناء {rebuilt} صف من مجاميع المصاريف")
+
+@app.cli.command("rebuild-product-search")
+def rebuild_product_search_command():
+    """إعادة بناء فهرس البحث في أسماء المنتجات من الكتالوج وسجل الأسعار"""
+    built = rebuild_search_index()
+    db.session.commit()
+    print(f"✅ تم فهرسة {built} اسم منتج للبحث")
+
+@app.cli.command("rebuild-supplier-prices")
+@click.option("--check", is_flag=True, help="المقارنة فقط دون إعادة البناء")
+def rebuild_supplier_prices_command(check):
+    """إعادة بناء آخر سعر لكل مورد من سجل الأسعار"""
+    mismatches = verify_supplier_prices()
+    for (product_name, supplier_id), expected, stored in mismatches:
+        print(f"❌ {product_name} مورد {supplier_id}: المحسوب {expected} ≠ المخزن {stored}")
+    if check:
+        if mismatches:
+            raise SystemExit(1)
+        print("✅ أسعار الموردين مطابقة")
+        return
+    rebuilt = rebuild_supplier_prices()
+    db.session.commit()
+    print(f"✅ تمت إعادة بناء {rebuilt} سعر مورد")
+
 @app.route("/debts/add", methods=["POST"])
 def add_debt():
     """إضافة دين يدوي"""
@@ -2221,12 +2422,10 @@ def pay_debt(id):
         expense = Expense.query.get(debt.source_id)
         if expense:
             expense.payment_status = 'paid'
-            expense.paid_amount = expense.total_amount
     elif debt.source_type == 'purchase':
         purchase = Purchase.query.get(debt.source_id)
         if purchase:
             purchase.status = "paid"
-            purchase.paid_amount = purchase.total_price
     
     db.session.commit()
     
@@ -2253,43 +2452,62 @@ def stats():
     if "user" not in session:
         return redirect(url_for("login"))
     
-    total_orders = Order.query.count()
-    paid_orders = Order.query.filter_by(is_paid=True).count()
-    pending_orders = Order.query.filter_by(is_paid=False).count()
-    total_orders_amount = sum(order.total for order in Order.query.all())
-    
-    workers = Worker.query.all()
-    total_workers = len(workers)
-    total_salaries = sum(worker.total_salary for worker in workers)
-    
-    debts = Debt.query.all()
-    total_debts = len(debts)
-    debts_unpaid = Debt.query.filter_by(status="unpaid").count()
-    debts_paid = Debt.query.filter_by(status="paid").count()
-    total_debts_amount = sum(debt.remaining_amount for debt in Debt.query.filter_by(status="unpaid"))
-    debts_paid_amount = sum(debt.debt_amount for debt in Debt.query.filter_by(status="paid"))
-    
-    expenses = Expense.query.all()
-    total_expenses = len(expenses)
-    expenses_amount = sum(expense.total_amount for expense in expenses)
-    
     return render_template("stats.html",
-                         total_orders=total_orders,
-                         paid_orders=paid_orders,
-                         pending_orders=pending_orders,
-                         total_orders_amount=total_orders_amount,
-                         total_workers=total_workers,
-                         total_salaries=total_salaries,
-                         workers=workers,
-                         total_debts=total_debts,
-                         total_debts_amount=total_debts_amount,
-                         debts_unpaid=debts_unpaid,
-                         debts_paid=debts_paid,
-                         debts_paid_amount=debts_paid_amount,
-                         total_expenses=total_expenses,
-                         expenses_amount=expenses_amount,
+                         **stats_context(),
                          now=datetime.now(timezone.utc))
 
+# ========================
+# 📤 التصدير
+# ========================
+
+EXPORTS = {
+    # الاسم: (دالة الشروط، استعلام التصدير، اسم الورقة)
+    'expenses': (_expense_filters, expenses_export, "المصاريف"),
+    'orders': (_order_filters, orders_export, "الطلبيات"),
+    'debts': (_debt_filters, debts_export, "الديون"),
+    'transport': (_transport_filters, transport_export, "النقل"),
+}
+
+@app.route("/export/<name>")
+def export_listing(name):
+    """تصدير صفحة عرض بنفس شروط تصفيتها (format=csv أو xlsx)، متدفقاً دون تحميل الجدول في الذاكرة"""
+    if "user" not in session:
+        return redirect(url_for("login"))
+    
+    export_format = request.args.get('format', 'csv')
+    if name not in EXPORTS or export_format not in EXPORT_FORMATS:
+        return jsonify({"success": False, "error": "تصدير غير مدعوم"}), 400
+    
+    # الشروط غير الصالحة تُتجاهل كما في صفحات العرض، فالتصدير يطابق ما يظهر فيها
+    filters_for, export_query, sheet_name = EXPORTS[name]
+    return export_response(name, sheet_name, export_format, export_query(filters_for(request.args)))
+
+@app.cli.command("verify-stats")
+def verify_stats_command():
+    """مقارنة أرقام الإحصائيات المحسوبة بـ SQL مع الحساب القديم في بايثون"""
+    mismatches = verify_stats()
+    if mismatches:
+        for key, expected, actual in mismatches:
+            print(f"❌ {key}: القديم {expected} ≠ الجديد {actual}")
+        raise SystemExit(1)
+    print("✅ أرقام الإحصائيات مطابقة للحساب القديم")
+
+@app.cli.command("verify-payroll")
+@click.option("--fix", is_flag=True, help="إعادة بناء كل الأرصدة من حقول العمال عند وجود فروقات")
+def verify_payroll_command(fix):
+    """مقارنة الرصيد الجاري لكل عامل مع إعادة حساب الراتب المستحق"""
+    mismatches = verify_balances()
+    for worker_id, name, expected, balance in mismatches:
+        print(f"❌ العامل #{worker_id} {name}: المحسوب {expected} ≠ الرصيد {balance if balance is not None else 'غائب'}")
+    if mismatches and fix:
+        rebuilt = rebuild_balances()
+        db.session.commit()
+        print(f"✅ تمت إعادة بناء {rebuilt} رصيد")
+    elif mismatches:
+        raise SystemExit(1)
+    else:
+        print("✅ أرصدة الرواتب مطابقة لإعادة الحساب")
+
 # ========================
 # ⚙️ قسم الإعدادات
 # ========================
@@ -2427,166 +2645,6 @@ def get_supplier(id):
         "address": supplier.address
     })
 
-# ========================
-# 🗃️ تهيئة القاعدة
-# ========================
-
-with app.app_context():
-    try:
-        # التحقق من وجود الأعمدة الجديدة في جدول الديون وإضافتها إذا كانت مفقودة
-        from sqlalchemy import inspect, text
-        
-        inspector = inspect(db.engine)
-        
-        # التحقق إذا كان جدول الديون موجوداً
-        if 'debt' in inspector.get_table_names():
-            debt_columns = [col['name'] for col in inspector.get_columns('debt')]
-            print(f"🔍 الأعمدة الحالية في جدول الديون: {debt_columns}")
-            
-            # الأعمدة المطلوبة في النموذج الجديد
-            required_columns = ['source_type', 'source_id', 'description', 'recorded_by']
-            missing_columns = [col for col in required_columns if col not in debt_columns]
-            
-            if missing_columns:
-                print(f"🔄 جاري إضافة الأعمدة المفقودة: {missing_columns}")
-                
-                try:
-                    with db.engine.begin() as conn:
-                        for column in missing_columns:
-                            try:
-                                if column == 'source_type':
-                                    conn.execute(text("ALTER TABLE debt ADD COLUMN source_type VARCHAR(50)"))
-                                elif column == 'source_id':
-                                    conn.execute(text("ALTER TABLE debt ADD COLUMN source_id INTEGER"))
-                                elif column == 'description':
-                                    conn.execute(text("ALTER TABLE debt ADD COLUMN description TEXT"))
-                                elif column == 'recorded_by':
-                                    conn.execute(text("ALTER TABLE debt ADD COLUMN recorded_by VARCHAR(50)"))
-                                print(f"✅ تم إضافة العمود: {column}")
-                            except Exception as column_error:
-                                print(f"⚠️ لم يتم إضافة العمود {column}: {column_error}")
-                    
-                    print("✅ تم تحديث جدول الديون بنجاح")
-                    
-                except Exception as alter_error:
-                    print(f"❌ خطأ في تحديث الجدول: {alter_error}")
-            else:
-                print("✅ جدول الديون محدث ومحتوي على جميع الأعمدة المطلوبة")
-        else:
-            print("ℹ️ جدول الديون غير موجود، سيتم إنشاؤه تلقائياً")
-        
-    except Exception as e:
-        print(f"❌ خطأ في التحقق من الجدول: {e}")
-    
-    # إنشاء جميع الجداول (سيتم إنشاء الجداول الجديدة فقط)
-    db.create_all()
-    
-    try:
-        if not SystemSettings.query.first():
-            db.session.add(SystemSettings())
-            print("✅ تم إضافة إعدادات النظام")
-        
-        if not Status.query.first():
-            db.session.add(Status(name="قيد التنفيذ", color="#FFC107"))
-            db.session.add(Status(name="مدفوعة", color="#28A745"))
-            print("✅ تم إضافة الحالات الافتراضية")
-        
-        # تهيئة تصنيفات المصاريف الجديدة
-        if not ExpenseCategory.query.first():
-            categories = [
-                ExpenseCategory(name="مواد بناء", icon="🏗️", color="#EF4444"),
-                ExpenseCategory(name="مواد تلحيم", icon="🔥", color="#3B82F6"),
-                ExpenseCategory(name="محركات ومعدات", icon="⚡", color="#10B981"),
-                ExpenseCategory(name="عتاد الورشة", icon="🔧", color="#F59E0B"),
-                ExpenseCategory(name="مصاريف تركيب", icon="🚚", color="#8B5CF6"),
-                ExpenseCategory(name="مصاريف تشغيل", icon="💼", color="#06B6D4"),
-                ExpenseCategory(name="مصاريف صيانة", icon="🛠️", color="#F97316"),
-                ExpenseCategory(name="مشتريات عمال", icon="👷", color="#84CC16")
-            ]
-            for category in categories:
-                db.session.add(category)
-            print("✅ تم إضافة تصنيفات المصاريف")
-        
-        if not User.query.first():
-            admin_user = User(
-                username="admin",
-                password="+f1234",
-                full_name="مدير النظام",
-                role="admin",
-                is_active=True
-            )
-            db.session.add(admin_user)
-            print("✅ تم إضافة مستخدم المدير")
-        
-        # ✅ تهيئة المنتجات
-        if not Product.query.first():
-            default_products = {
-                "مواد بناء": ["صباغة", "شوفيات", "لصقة كحلة", "مفاتيح", "مفك براغي", "أسمنت", "رمل", "طوب"],
-                "مواد تلحيم": ["ديسك تقطاع صغير", "ديسك مولاج صغير", "ديسك تقطاع متوسط", "ديسك تقطاع كبير", "بقيط 3", "بقيط 2", "TUBE CARE 20 PAR 18", "TUBE CARE 40 PAR 18"],
-                "محركات ومعدات": ["مونتشارج بيترو 500", "مونتشارج بيترو 600", "مونتشارج بيترو 800", "مونتشارج بيترو 1000", "رولو كابل 2×1.5", "رولو 3×1.5", "فانت كورس", "كونطاكتار"],
-                "عتاد الورشة": ["طرونسوناز كبيرة كراون", "بوسطا سودي 250A كراون", "طرونسوناز اطابل كراون", "نيفو لازار", "نيفو المنيوم", "مفكات", "شواكيش"],
-                "مصاريف تركيب": ["اطعام العمال", "حقوق الايواء", "شراء اضطراري عند السفر", "مواصلات", "فنادق"],
-                "مصاريف تشغيل": ["تأمين العمال", "تأمين المسير", "كهرباء", "غاز", "ماء", "كراء", "ضرائب", "اتصالات"],
-                "مصاريف صيانة": ["صيانة السيارة", "صيانة العتاد", "صيانة المباني", "صيانة المعدات"],
-                "مشتريات العمال": ["أدوات وقائية", "ملابس عمل", "مستلزمات شخصية"]
-            }
-            
-            product_count = 0
-            for category in ExpenseCategory.query.all():
-                if category.name in default_products:
-                    for product_name in default_products[category.name]:
-                        product = Product(name=product_name, category_id=category.id)
-                        db.session.add(product)
-                        product_count += 1
-            
-            print(f"✅ تم إضافة {product_count} منتج")
-        
-        # ✅ تهيئة تصنيفات وأنواع النقل
-        if not TransportCategory.query.first():
-            transport_categories = [
-                TransportCategory(name="معاينة مواقع", icon="📍", color="#3B82F6"),
-                TransportCategory(name="تركيب معدات", icon="⚡", color="#10B981"),
-                TransportCategory(name="إصلاح أعطال", icon="🔧", color="#F59E0B"),
-                TransportCategory(name="شراء مواد", icon="🛒", color="#EF4444"),
-                TransportCategory(name="بحث عن منتجات", icon="🔍", color="#8B5CF6"),
-                TransportCategory(name="توصيل سلع", icon="🚚", color="#06B6D4"),
-                TransportCategory(name="اجتماعات عمل", icon="💼", color="#F97316"),
-                TransportCategory(name="تنقلات شخصية", icon="👤", color="#84CC16")
-            ]
-            for category in transport_categories:
-                db.session.add(category)
-            
-            db.session.flush()
-            
-            # إضافة الأنواع الفرعية
-            sub_types_data = {
-                "معاينة مواقع": ["معاينة تركيب مونتشارج", "معاينة موقع عميل", "معاينة موقع جديد"],
-                "تركيب معدات": ["تركيب مونتشارج", "تركيب محركات", "تركيب معدات ورشة"],
-                "إصلاح أعطال": ["إصلاح أخطاء تركيب", "صيانة وقائية", "إصلاح عطل طارئ"],
-                "شراء مواد": ["شراء مواد بناء", "شراء مواد تلحيم", "شراء معدات", "شراء مستلزمات"],
-                "بحث عن منتجات": ["بحث عن سعر", "مقارنة أسعار", "بحث عن مورد جديد"],
-                "توصيل سلع": ["توصيل للعميل", "استلام من المورد", "نقل بين الورش"],
-                "اجتماعات عمل": ["اجتماع مع عميل", "اجتماع مع مورد", "اجتماع مع فريق"],
-                "تنقلات شخصية": ["ذهاب للعمل", "عودة من العمل", "مهمة شخصية"]
-            }
-            
-            sub_type_count = 0
-            for category in transport_categories:
-                if category.name in sub_types_data:
-                    for sub_type_name in sub_types_data[category.name]:
-                        sub_type = TransportSubType(name=sub_type_name, category_id=category.id)
-                        db.session.add(sub_type)
-                        sub_type_count += 1
-            
-            print(f"✅ تم إضافة {len(transport_categories)} تصنيف نقل و {sub_type_count} نوع فرعي")
-        
-        db.session.commit()
-        print("🎉 تم تهيئة قاعدة البيانات بنجاح بالكامل")
-        
-    except Exception as e:
-        db.session.rollback()
-        print(f"❌ خطأ في تهيئة قاعدة البيانات: {e}")
-
 # ==================== 🔄 APIs للتكامل مع تطبيق العمال ====================
 
 @app.route('/api/workers/login', methods=['POST'])
@@ -2621,59 +2679,169 @@ def api_worker_login():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _worker_order_info(order):
+    return {
+        'id': order.id,
+        'customer_name': order.name,
+        'product': order.product,
+        'address': order.wilaya,
+        'phone': order.phones[0].number if order.phones else '',
+        'assigned_date': order.created_at.strftime('%Y-%m-%d'),
+        'expected_completion_date': (order.created_at + timedelta(days=7)).strftime('%Y-%m-%d'),
+        'duration_days': 7,
+        'status': 'in_progress'
+    }
+
 @app.route('/api/workers/<int:worker_id>/assigned-orders')
 def api_worker_orders(worker_id):
-    """API لجلب الطلبيات المعينة للعامل"""
+    """API لجلب الطلبيات المعينة للعامل
+
+    ?since=<seq> يرجع الطلبيات المتغيرة بعد seq فقط مع المحذوفة منها،
+    و If-None-Match يرجع 304 إذا لم يتغير شيء.
+    """
     if request.headers.get('Authorization') != 'Bearer worker_app':
         return jsonify({'error': 'غير مصرح'}), 401
     
     try:
-        # جلب الطلبيات المعينة للعامل
-        orders = Order.query.filter(Order.assigned_worker_id == worker_id).all()
-        
-        orders_list = []
-        for order in orders:
-            order_info = {
-                'id': order.id,
-                'customer_name': order.name,
-                'product': order.product,
-                'address': order.wilaya,
-                'phone': order.phones[0].number if order.phones else '',
-                'assigned_date': order.created_at.strftime('%Y-%m-%d'),
-                'expected_completion_date': (order.created_at + timedelta(days=7)).strftime('%Y-%m-%d'),
-                'duration_days': 7,
-                'status': 'in_progress'
-            }
-            orders_list.append(order_info)
+        since = parse_since()
+    except ValueError:
+        return jsonify({'success': False, 'error': 'قيمة since غير صالحة'}), 400
+    
+    try:
+        # رقم التسلسل يُقرأ قبل البيانات: ما يتغير بينهما يُرسل مرة أخرى في الطلب التالي
+        seq = latest_seq(worker_id)
+        full = since is None or since > seq
+        etag = sync_etag('orders', worker_id, 'full' if full else since, seq)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        # جلب الطلبيات المعينة للعامل مع أرقامها في استعلام واحد
+        query = Order.query.options(selectinload(Order.phones)).filter(Order.assigned_worker_id == worker_id)
+        deleted = []
+        if not full:
+            changes = changes_since(worker_id, since, ['order']).get('order', {})
+            changed_ids = changes.get('upsert', set())
+            deleted = sorted(changes.get('delete', set()))
+            query = query.filter(Order.id.in_(changed_ids)) if changed_ids else None
+        
+        orders_list = [_worker_order_info(order) for order in query.all()] if query is not None else []
+        
+        return sync_response(jsonify({
+            'success': True,
+            'orders': orders_list,
+            'deleted': deleted,
+            'seq': seq,
+            'full': full
+        }), etag)
         
-        return jsonify({'success': True, 'orders': orders_list}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/workers/<int:worker_id>/changes')
+def api_worker_changes(worker_id):
+    """API لمزامنة سجل الطلبيات وسجل العامل وحضوره بالفروقات (?since=<seq>)"""
+    if request.headers.get('Authorization') != 'Bearer worker_app':
+        return jsonify({'error': 'غير مصرح'}), 401
+    
+    try:
+        since = parse_since() or 0
+    except ValueError:
+        return jsonify({'success': False, 'error': 'قيمة since غير صالحة'}), 400
+    
+    try:
+        seq = latest_seq(worker_id)
+        if since > seq:
+            since = 0
+        etag = sync_etag('changes', worker_id, since, seq)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        changes = changes_since(worker_id, since, ['order_history', 'worker_history', 'attendance'])
+        
+        def changed(entity):
+            return changes.get(entity, {}).get('upsert', set())
+        
+        order_history = []
+        if changed('order_history'):
+            order_history = [{
+                'id': record.id,
+                'order_id': record.order_id,
+                'change_type': record.change_type,
+                'details': record.details,
+                'timestamp': record.timestamp.isoformat() if record.timestamp else None
+            } for record in OrderHistory.query.filter(OrderHistory.id.in_(changed('order_history')))]
+        
+        worker_history = []
+        if changed('worker_history'):
+            worker_history = [{
+                'id': record.id,
+                'change_type': record.change_type,
+                'details': record.details,
+                'amount': record.amount,
+                'timestamp': record.timestamp.isoformat() if record.timestamp else None
+            } for record in WorkerHistory.query.filter(
+                WorkerHistory.id.in_(changed('worker_history')), WorkerHistory.worker_id == worker_id)]
+        
+        attendance = []
+        if changed('attendance'):
+            attendance = [{
+                'id': record.id,
+                'date': record.date.isoformat(),
+                'check_in_morning': record.check_in_morning.isoformat() if record.check_in_morning else None,
+                'check_out_morning': record.check_out_morning.isoformat() if record.check_out_morning else None,
+                'check_in_afternoon': record.check_in_afternoon.isoformat() if record.check_in_afternoon else None,
+                'check_out_afternoon': record.check_out_afternoon.isoformat() if record.check_out_afternoon else None,
+                'total_hours': record.total_hours,
+                'absence_hours': record.absence_hours,
+                'location_verified': record.location_verified
+            } for record in WorkerAttendance.query.filter(
+                WorkerAttendance.id.in_(changed('attendance')), WorkerAttendance.worker_id == worker_id)]
+        
+        return sync_response(jsonify({
+            'success': True,
+            'order_history': order_history,
+            'worker_history': worker_history,
+            'attendance': attendance,
+            'deleted': {entity: sorted(ops['delete']) for entity, ops in changes.items() if ops['delete']},
+            'seq': seq
+        }), etag)
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/workers/<int:worker_id>/salary-info')
 def api_worker_salary(worker_id):
-    """API لجلب معلومات الراتب للعامل"""
+    """API لجلب معلومات الراتب للعامل (مع ETag: الراتب يتغير بتغير بيانات العامل أو اليوم)"""
     if request.headers.get('Authorization') != 'Bearer worker_app':
         return jsonify({'error': 'غير مصرح'}), 401
     
     try:
-        worker = Worker.query.get_or_404(worker_id)
+        today = datetime.now(timezone.utc).date()
+        etag = sync_etag('salary', worker_id, latest_seq(worker_id), today.isoformat())
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        worker = Worker.query.options(joinedload(Worker.balance)).get_or_404(worker_id)
+        # الرصيد الجاري المحفوظ، مع إعادة الحساب إذا لم يُبنَ صف العامل بعد
+        current_salary = worker.balance.current_balance if worker.balance else worker.total_salary
         
         salary_info = {
             'success': True,
-            'current_salary': worker.total_salary,
+            'current_salary': current_salary,
             'base_salary': worker.monthly_salary,
             'bonuses': worker.incentives + worker.outside_work_bonus,
             'deductions': worker.advances,
-            'net_salary': worker.total_salary,
+            'net_salary': current_salary,
             'work_days': 22,
             'absence_days': worker.absences,
             'vacation_days': 0,
-            'next_salary_date': (datetime.now(timezone.utc) + timedelta(days=5)).strftime('%Y-%m-%d')
+            'next_salary_date': (today + timedelta(days=5)).strftime('%Y-%m-%d')
         }
         
-        return jsonify(salary_info), 200
+        return sync_response(jsonify(salary_info), etag)
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -2719,4 +2887,8 @@ def api_update_order_status(order_id):
 # ========================
 
 if __name__ == "__main__":
+    # خادم التطوير: تهيئة القاعدة مرة واحدة قبل التشغيل (في الإنتاج: flask db init)
+    with app.app_context():
+        init_db()
+        seed_defaults()
     app.run(debug=True, host="0.0.0.0", port=5000)
\ No newline at end of file
@@ -0,0 +1,174 @@
+# attachments.py
+"""مخزن ملفات الفواتير على القرص حسب بصمة المحتوى (SHA-256)
+
+الملف يُحفظ مرة واحدة في UPLOAD_FOLDER/ab/cd/<sha256> مهما تكرر رفعه،
+وقاعدة البيانات تحتفظ فقط بالبصمة والحجم ونوع الملف. النسخ المصغرة
+تُحفظ بجانبه باسم <sha256>.<الحجم>.<الصيغة>.
+"""
+import glob
+import hashlib
+import os
+import tempfile
+
+from flask import Response, current_app, request, send_file
+from sqlalchemy import select, update
+
+from imaging import THUMBNAIL_SIZES
+from models import db, ExpenseReceipt, TransportReceipt
+
+RECEIPT_MODELS = (ExpenseReceipt, TransportReceipt)
+
+# سنة كاملة: الفواتير لا تتغير بعد رفعها
+RECEIPT_MAX_AGE = 365 * 24 * 3600
+
+
+def storage_root():
+    folder = current_app.config['UPLOAD_FOLDER']
+    return os.path.abspath(os.path.join(current_app.root_path, folder))
+
+
+def blob_path(content_hash):
+    return os.path.join(storage_root(), content_hash[:2], content_hash[2:4], content_hash)
+
+
+def variant_path(content_hash, size, image_format):
+    """مسار نسخة مصغرة مشتقة من الملف (بجانبه في نفس المجلد)"""
+    return f"{blob_path(content_hash)}.{size}.{image_format}"
+
+
+def _write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # الكتابة في ملف مؤقت ثم إعادة التسمية حتى لا يُقرأ ملف ناقص
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def store_blob(data):
+    """حفظ المحتوى وإرجاع بصمته، دون إعادة الكتابة إذا كان موجوداً"""
+    content_hash = hashlib.sha256(data).hexdigest()
+    path = blob_path(content_hash)
+    if not os.path.exists(path):
+        _write_file(path, data)
+    return content_hash
+
+
+def store_variants(content_hash, variants):
+    """حفظ النسخ المصغرة {(الحجم، الصيغة): المحتوى} بجانب الملف"""
+    for (size, image_format), data in variants.items():
+        path = variant_path(content_hash, size, image_format)
+        if not os.path.exists(path):
+            _write_file(path, data)
+
+
+def release_blob(content_hash):
+    """حذف الملف ونسخه المصغرة من القرص إذا لم تعد أي فاتورة تشير إليه"""
+    if not content_hash:
+        return False
+    for model in RECEIPT_MODELS:
+        if db.session.query(model.id).filter(model.content_hash == content_hash).first():
+            return False
+    path = blob_path(content_hash)
+    for stored in [path] + glob.glob(glob.escape(path) + '.*'):
+        if os.path.exists(stored):
+            os.remove(stored)
+    return True
+
+
+def receipt_version(receipt):
+    """نسخة المحتوى التي تُضاف للرابط (?v=)، تتغير إذا تغير الملف"""
+    return receipt.content_hash[:16] if receipt.content_hash else None
+
+
+def _cache_headers(response, immutable):
+    if immutable:
+        # الرابط يحمل بصمة المحتوى فلا يتغير ما يشير إليه أبداً
+        response.cache_control.no_cache = None
+        response.cache_control.private = True
+        response.cache_control.max_age = RECEIPT_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        # إعادة التحقق في كل مرة، والرد 304 إذا لم يتغير ETag
+        response.cache_control.no_cache = True
+    return response
+
+
+def send_receipt(receipt, size='full'):
+    """إرسال صورة الفاتورة من المخزن، أو من قاعدة البيانات للفواتير التي لم تُنقل بعد
+
+    size: 'thumb' أو 'medium' أو 'full'. تُرسل نسخة WebP إذا قبلها المتصفح
+    (ترويسة Accept)، ويُرسل الملف الكامل إذا لم تتوفر النسخة المطلوبة بعد.
+    ETag هو بصمة المحتوى، مع دعم If-None-Match (304) و Range (206).
+    """
+    if not receipt.content_hash:
+        data = receipt.image_data or b''
+        response = Response(data, mimetype=receipt.mime_type)
+        response.set_etag(hashlib.sha256(data).hexdigest())
+        # Range لا يُعالج دون الطول الكامل
+        response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+        return _cache_headers(response, immutable=False)
+
+    if size not in THUMBNAIL_SIZES:
+        size = 'full'
+    formats = ['jpeg']
+    if request.accept_mimetypes.best_match(['image/jpeg', 'image/webp']) == 'image/webp':
+        formats.insert(0, 'webp')
+
+    path, mimetype, etag = blob_path(receipt.content_hash), receipt.mime_type, receipt.content_hash
+    exact = False
+    for image_format in formats:
+        if size == 'full' and image_format == 'jpeg':
+            exact = image_format == formats[0]
+            break
+        candidate = variant_path(receipt.content_hash, size, image_format)
+        if os.path.exists(candidate):
+            path, mimetype = candidate, f'image/{image_format}'
+            etag = f"{receipt.content_hash}.{size}.{image_format}"
+            exact = image_format == formats[0]
+            break
+
+    response = send_file(path, mimetype=mimetype, etag=etag, conditional=True)
+    response.vary.add('Accept')
+
+    # لا نثبت في الذاكرة المؤقتة إلا النسخة المطلوبة نفسها من فاتورة جاهزة، وبرابط يحمل نسختها
+    immutable = (exact and receipt.processing_status == 'ready'
+                 and request.args.get('v') == receipt_version(receipt))
+    return _cache_headers(response, immutable)
+
+
+def migrate_receipt_blobs(batch_size=50):
+    """نقل الصور المخزنة داخل قاعدة البيانات إلى القرص على دفعات
+
+    كل دفعة تقرأ batch_size صورة فقط ثم تُحفظ وتُفرغ أعمدتها، فلا يُحمَّل
+    الجدول كاملاً في الذاكرة. يرجع عدد الفواتير المنقولة لكل جدول.
+    """
+    moved = {}
+    for model in RECEIPT_MODELS:
+        table = model.__table__
+        last_id = 0
+        moved[table.name] = 0
+        while True:
+            rows = db.session.execute(
+                select(table.c.id, table.c.image_data)
+                .where(table.c.id > last_id, table.c.image_data.isnot(None))
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            for row_id, data in rows:
+                db.session.execute(
+                    update(table).where(table.c.id == row_id)
+                    .values(content_hash=store_blob(data), file_size=len(data), image_data=None)
+                )
+            db.session.commit()
+            last_id = rows[-1][0]
+            moved[table.name] += len(rows)
+            print(f"📦 {table.name}: تم نقل {moved[table.name]} فاتورة")
+    return moved
@@ -0,0 +1,133 @@
+# attendance_sync.py
+"""رفع تسجيلات الحضور من تطبيق العمال دفعة واحدة
+
+التطبيق يجمع التسجيلات (punches) أثناء العمل دون اتصال ثم يرسلها في طلب
+واحد. كل تسجيل يحمل مفتاح عدم تكرار (idempotency key) يولده التطبيق، فإعادة
+إرسال نفس الدفعة بعد انقطاع لا تغير شيئاً. التسجيلات تُدمج في سجل الحضور
+الوحيد لكل (عامل، يوم): الحقول المرسلة فقط تُحدَّث بترتيب وصولها.
+
+كل الدفعة تُحفظ في معاملة واحدة (عبر write_queue)، والنتيجة لكل عنصر:
+created / updated / duplicate / error.
+"""
+from datetime import datetime, time
+
+from sqlalchemy import select
+
+from models import AttendanceUploadKey, WorkerAttendance
+
+MAX_PUNCHES_PER_BATCH = 500
+MAX_KEY_LENGTH = 64
+
+TIME_FIELDS = ('check_in_morning', 'check_out_morning', 'check_in_afternoon', 'check_out_afternoon')
+HOURS_FIELDS = ('total_hours', 'absence_hours')
+
+
+class InvalidPunch(ValueError):
+    """تسجيل حضور غير صالح"""
+
+
+def _parse_time(value, day):
+    """تاريخ ووقت ISO كامل، أو وقت فقط (HH:MM) في يوم التسجيل"""
+    if value in (None, ''):
+        return None
+    if not isinstance(value, str):
+        raise InvalidPunch(f"وقت غير صالح: {value!r}")
+    try:
+        if len(value) <= 8:
+            return datetime.combine(day, time.fromisoformat(value))
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidPunch(f"وقت غير صالح: {value}")
+
+
+def parse_punch(item):
+    """التحقق من تسجيل واحد وإرجاع {key, date, values} بالحقول المرسلة فقط"""
+    if not isinstance(item, dict):
+        raise InvalidPunch("كل تسجيل يجب أن يكون كائن JSON")
+
+    key = item.get('idempotency_key')
+    if key is not None and (not isinstance(key, str) or not key or len(key) > MAX_KEY_LENGTH):
+        raise InvalidPunch(f"مفتاح عدم التكرار يجب أن يكون نصاً حتى {MAX_KEY_LENGTH} حرفاً")
+
+    try:
+        day = datetime.strptime(item.get('date') or '', '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise InvalidPunch("التاريخ مطلوب بصيغة YYYY-MM-DD")
+
+    values = {}
+    for field in TIME_FIELDS:
+        if field in item:
+            values[field] = _parse_time(item[field], day)
+    for field in HOURS_FIELDS:
+        if item.get(field) is not None:
+            try:
+                values[field] = float(item[field])
+            except (TypeError, ValueError):
+                raise InvalidPunch(f"قيمة غير صالحة للحقل {field}")
+    if 'location_verified' in item:
+        values['location_verified'] = bool(item['location_verified'])
+    if item.get('notes') is not None:
+        values['notes'] = str(item['notes'])
+
+    return {'key': key, 'date': day, 'values': values}
+
+
+def upsert_punches(db_session, worker_id, items):
+    """دمج التسجيلات في سجلات الحضور، ويرجع نتيجة لكل عنصر بنفس الترتيب
+
+    استعلام واحد للمفاتيح المعروفة وآخر للسجلات الموجودة في أيام الدفعة،
+    ثم flush واحد. الحفظ (commit) على المستدعي.
+    """
+    results = [None] * len(items)
+    parsed = []
+    for index, item in enumerate(items):
+        try:
+            parsed.append((index, parse_punch(item)))
+        except InvalidPunch as e:
+            key = item.get('idempotency_key') if isinstance(item, dict) else None
+            results[index] = {'index': index, 'key': key, 'status': 'error', 'error': str(e)}
+
+    keys = {punch['key'] for _, punch in parsed if punch['key']}
+    known_keys = dict(db_session.execute(
+        select(AttendanceUploadKey.key, AttendanceUploadKey.attendance_id)
+        .where(AttendanceUploadKey.worker_id == worker_id, AttendanceUploadKey.key.in_(keys))
+    ).all()) if keys else {}
+
+    days = {punch['date'] for _, punch in parsed}
+    records = {record.date: record for record in db_session.scalars(
+        select(WorkerAttendance).where(WorkerAttendance.worker_id == worker_id, WorkerAttendance.date.in_(days))
+    )} if days else {}
+
+    outcomes = []   # (index, key, status, record أو رقم السجل)
+    new_keys = {}
+    for index, punch in parsed:
+        key = punch['key']
+        if key in known_keys:
+            outcomes.append((index, key, 'duplicate', known_keys[key]))
+            continue
+        if key in new_keys:
+            outcomes.append((index, key, 'duplicate', new_keys[key]))
+            continue
+
+        record = records.get(punch['date'])
+        status = 'updated'
+        if record is None:
+            record = WorkerAttendance(worker_id=worker_id, date=punch['date'])
+            db_session.add(record)
+            records[punch['date']] = record
+            status = 'created'
+        for field, value in punch['values'].items():
+            setattr(record, field, value)
+
+        if key:
+            new_keys[key] = record
+        outcomes.append((index, key, status, record))
+
+    db_session.flush()
+    for key, record in new_keys.items():
+        db_session.add(AttendanceUploadKey(key=key, worker_id=worker_id, attendance_id=record.id))
+
+    for index, key, status, record in outcomes:
+        attendance_id = record.id if isinstance(record, WorkerAttendance) else record
+        results[index] = {'index': index, 'key': key, 'status': status, 'attendance_id': attendance_id}
+    return results
@@ -0,0 +1,106 @@
+# benchmarks/bench_group_commit.py
+"""مقارنة إنتاجية الكتابة: commit لكل طلب مقابل الخيط الكاتب (write_queue)
+
+عدة خيوط (مثل خيوط الخادم) تنشئ طلبيات بأرقامها وسجلها كما يفعل add_order،
+مرة بجلسة و commit لكل طلب، ومرة عبر write_queue.run الذي يجمعها في دفعات.
+القاعدة ملف SQLite مؤقت بنفس إعدادات database.py (ويمكن تغييرها بمتغيرات
+البيئة، مثل SQLITE_SYNCHRONOUS=FULL لقياس أثر fsync لكل commit).
+
+الاستخدام:
+    python benchmarks/bench_group_commit.py --threads 16 --orders 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+
+from database import init_database  # noqa: E402
+from models import db, Order, PhoneNumber, OrderHistory  # noqa: E402
+from write_queue import WriteQueue  # noqa: E402
+
+
+def create_order(index):
+    def unit(db_session):
+        order = Order(name=f"زبون {index}", wilaya="سطيف", product="منتج", paid=0, total=1000, is_paid=False)
+        order.phones.append(PhoneNumber(number=f"0555{index:06d}", is_primary=True))
+        order.history.append(OrderHistory(change_type="إنشاء الطلب", details="bench"))
+        db_session.add(order)
+        db_session.flush()
+        return order.id
+    return unit
+
+
+def make_app(path, group_commit):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': 32, 'max_overflow': 32}
+    app.config['WRITE_QUEUE_ENABLED'] = group_commit
+    init_database(app)
+    queue = WriteQueue(app)
+    with app.app_context():
+        db.create_all()
+    return app, queue
+
+
+def run(mode, threads, orders):
+    with tempfile.TemporaryDirectory() as tmp:
+        app, queue = make_app(os.path.join(tmp, 'bench.db'), mode == 'group')
+        latencies, errors = [], []
+
+        def client(offset):
+            with app.app_context():
+                for i in range(orders):
+                    started = time.perf_counter()
+                    try:
+                        queue.run(create_order(offset * orders + i))
+                    except Exception as e:
+                        errors.append(e)
+                    latencies.append(time.perf_counter() - started)
+                db.session.remove()
+
+        workers = [threading.Thread(target=client, args=(n,)) for n in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        queue.shutdown()
+
+        with app.app_context():
+            saved = Order.query.count()
+            db.engine.dispose()
+
+    latencies.sort()
+    return {
+        'orders_per_second': saved / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        'saved': saved,
+        'errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--orders', type=int, default=200, help="طلبيات لكل خيط")
+    args = parser.parse_args()
+
+    print(f"⚙️ {args.threads} خيط × {args.orders} طلبية\n")
+    print(f"{'الوضع':<10}{'طلبية/ث':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'محفوظة':>9}{'أخطاء':>7}")
+    for mode in ('per-request', 'group'):
+        row = run(mode, args.threads, args.orders)
+        print(f"{mode:<10}{row['orders_per_second']:>10.0f}{row['p50_ms']:>10.1f}{row['p99_ms']:>10.1f}"
+              f"{row['saved']:>9}{row['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# benchmarks/bench_ingest.py
+"""مقارنة سرعة ضغط صور الفواتير والذاكرة القصوى بين الطريقة القديمة والجديدة
+
+الطريقة القديمة تفك ترميز الصورة كاملة ثم تصغرها، والجديدة (imaging.compress_image)
+تستخدم وضع draft لفك JPEG بمقياس مصغر مع تدوير EXIF.
+
+كل طريقة تعمل في عملية مستقلة حتى تكون قيمة الذاكرة القصوى (ru_maxrss) خاصة بها.
+
+الاستخدام:
+    python benchmarks/bench_ingest.py                  # صور تجريبية 12 ميغابكسل
+    python benchmarks/bench_ingest.py --corpus photos/ # مجلد صور حقيقية
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from imaging import compress_image  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # ويندوز
+    resource = None
+
+
+def legacy_compress_image(image_data, max_size=(1200, 1200), quality=85):
+    """الطريقة السابقة كما كانت في app.py"""
+    image = Image.open(BytesIO(image_data))
+    image.thumbnail(max_size, Image.Resampling.LANCZOS)
+    output = BytesIO()
+    image.save(output, format='JPEG', quality=quality, optimize=True)
+    return output.getvalue()
+
+
+def fast_compress_image(image_data):
+    return compress_image(BytesIO(image_data))
+
+
+IMPLEMENTATIONS = {
+    'legacy': legacy_compress_image,
+    'draft': fast_compress_image,
+}
+
+
+def make_corpus(directory, count, size=(4000, 3000)):
+    """صور JPEG تجريبية بحجم كاميرا هاتف، نصفها بعلامة تدوير EXIF"""
+    paths = []
+    for index in range(count):
+        image = Image.merge('RGB', [Image.effect_noise(size, 40 + index * 7).convert('L'),
+                                    Image.linear_gradient('L').resize(size),
+                                    Image.effect_noise(size, 20).convert('L')])
+        exif = Image.Exif()
+        if index % 2:
+            exif[0x0112] = 6  # Orientation: تدوير 90 درجة
+        path = os.path.join(directory, f"sample_{index}.jpg")
+        image.save(path, format='JPEG', quality=92, exif=exif.tobytes())
+        paths.append(path)
+    return paths
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # لينكس بالكيلوبايت، ماك بالبايت
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _run(name, paths, repeat, results):
+    func = IMPLEMENTATIONS[name]
+    corpus = []
+    for path in paths:
+        with open(path, 'rb') as source:
+            corpus.append(source.read())
+
+    func(corpus[0])  # تسخين
+    output_bytes = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for data in corpus:
+            output_bytes += len(func(data))
+    elapsed = time.perf_counter() - started
+
+    images = repeat * len(corpus)
+    results[name] = {
+        'images': images,
+        'seconds': elapsed,
+        'images_per_second': images / elapsed,
+        'avg_output_kb': output_bytes / images / 1024,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help="مجلد صور JPEG (افتراضياً صور تجريبية)")
+    parser.add_argument('--count', type=int, default=6, help="عدد الصور التجريبية")
+    parser.add_argument('--repeat', type=int, default=3, help="عدد مرات تكرار المجموعة")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.corpus:
+            paths = sorted(glob.glob(os.path.join(args.corpus, '*.jp*g')))
+        else:
+            print(f"📸 توليد {args.count} صور تجريبية 4000x3000...")
+            paths = make_corpus(tmp, args.count)
+        if not paths:
+            sys.exit("❌ لا توجد صور JPEG في المجلد")
+
+        manager = multiprocessing.Manager()
+        results = manager.dict()
+        for name in IMPLEMENTATIONS:
+            process = multiprocessing.Process(target=_run, args=(name, paths, args.repeat, results))
+            process.start()
+            process.join()
+
+        print(f"\n{'الطريقة':<10}{'صورة/ث':>10}{'الزمن (ث)':>12}{'الحجم (KB)':>12}{'RSS (MB)':>10}")
+        for name in IMPLEMENTATIONS:
+            row = results[name]
+            rss = f"{row['peak_rss_mb']:.0f}" if row['peak_rss_mb'] is not None else '-'
+            print(f"{name:<10}{row['images_per_second']:>10.2f}{row['seconds']:>12.2f}"
+                  f"{row['avg_output_kb']:>12.1f}{rss:>10}")
+
+        speedup = results['draft']['images_per_second'] / results['legacy']['images_per_second']
+        print(f"\n⚡ التسريع: {speedup:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+# benchmarks/bench_routes.py
+"""قياس أداء المسارات عبر Flask test client على قاعدة مولدة
+
+يشغل كل مسار قراءة (الصفحات وواجهات تطبيق العمال) عدة مرات ويسجل لكل مسار:
+زمن p50/p95، عدد استعلامات SQL في الطلب، وذروة الذاكرة المخصصة أثناءه
+(tracemalloc في جولة منفصلة حتى لا يؤثر على الأزمنة)، والتحميل الكسول (N+1)
+الذي يكشفه lazyload_guard. النتائج تُحفظ بصيغة JSON وتُقارن بنتيجة سابقة
+لكشف التراجع.
+
+لكل مسار حد معلن لعدد استعلامات SQL، ويفشل القياس إذا تجاوزه أي مسار.
+
+مسارات الكتابة غير مشمولة حتى تبقى القاعدة كما هي بين التشغيلات.
+
+الاستخدام:
+    python benchmarks/generate_data.py --output bench.db
+    python benchmarks/bench_routes.py --database bench.db --json baseline.json
+    python benchmarks/bench_routes.py --database bench.db --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKER_HEADERS = {'Authorization': 'Bearer worker_app'}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def build_routes(app_module):
+    """قائمة المسارات المقاسة مع حد الاستعلامات المعلن لكل مسار"""
+    from models import Worker
+
+    with app_module.app.app_context():
+        worker = Worker.query.filter_by(is_active=True).order_by(Worker.id).first()
+        first_page = app_module.paginate_keyset(
+            app_module.Order.query.filter(app_module.Order.is_paid == False), app_module.Order)  # noqa: E712
+        next_cursor = first_page.next_cursor or ''
+
+    # (الاسم، الطريقة، الرابط، حد استعلامات SQL، kwargs)؛ None = بدون حد
+    routes = [
+        ('dashboard', 'GET', '/dashboard', 3, {}),
+        ('orders', 'GET', '/orders', 6, {}),
+        ('orders_next_page', 'GET', f'/orders?after={next_cursor}', 6, {}),
+        ('orders_all', 'GET', '/orders?show_paid=true', 6, {}),
+        ('orders_wilaya', 'GET', '/orders?wilaya=سطيف', 6, {}),
+        ('workers', 'GET', '/workers', 3, {}),
+        ('expenses', 'GET', '/expenses', 6, {}),
+        ('expenses_period', 'GET', '/expenses?type=unpaid&date_from=2024-01-01&date_to=2024-03-31', 6, {}),
+        ('transport', 'GET', '/transport', 7, {}),
+        ('debts', 'GET', '/debts', 6, {}),
+        ('stats', 'GET', '/stats', 6, {}),
+        ('expenses_statistics', 'GET', '/expenses/statistics', 3, {}),
+        ('product_search', 'GET', '/api/products/search?q=ديسك تق', 2, {}),
+        ('price_history', 'GET', '/expenses/price_history?product_name=أسمنت', 2, {}),
+        ('supplier_prices', 'GET', '/api/products/prices?product_name=ديسك تقطاع صغير مجلفن', 1, {}),
+        ('expenses_export', 'GET', '/export/expenses?format=csv&type=unpaid&date_from=2024-01-01&date_to=2024-03-31', 1, {}),
+    ]
+    if worker is not None:
+        routes += [
+            ('api_worker_login', 'POST', '/api/workers/login', 2,
+             {'json': {'username': worker.phone, 'password': 'worker123'}, 'headers': WORKER_HEADERS}),
+            ('api_worker_orders', 'GET', f'/api/workers/{worker.id}/assigned-orders', 3, {'headers': WORKER_HEADERS}),
+            ('api_worker_salary', 'GET', f'/api/workers/{worker.id}/salary-info', 2, {'headers': WORKER_HEADERS}),
+        ]
+    return routes
+
+
+def measure_route(client, counter, guard, method, url, kwargs, requests, warmup):
+    # close() ينهي الاستجابات المتدفقة (التصدير) داخل القياس نفسه
+    for _ in range(warmup):
+        client.open(url, method=method, **kwargs).close()
+
+    guard.clear()
+    latencies, queries, statuses = [], [], set()
+    for _ in range(requests):
+        counter[0] = 0
+        started = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        response.close()
+        latencies.append(time.perf_counter() - started)
+        queries.append(counter[0])
+        statuses.add(response.status_code)
+
+    # جولة منفصلة لذروة الذاكرة، tracemalloc يبطئ التنفيذ
+    tracemalloc.start()
+    client.open(url, method=method, **kwargs).close()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'queries': max(queries),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'status': sorted(statuses),
+        'lazy_loads': sorted({f"{report['attribute']} @ {report['site']}" for report in guard.recent}),
+    }
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """يرجع قائمة التراجعات مقارنة بنتيجة سابقة"""
+    regressions = []
+    print(f"\n{'المسار':<20}{'p95 قبل':>10}{'p95 بعد':>10}{'النسبة':>8}{'SQL قبل':>9}{'SQL بعد':>9}")
+    for name, row in results['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if before is None:
+            continue
+        ratio = row['p95_ms'] / before['p95_ms'] if before['p95_ms'] else 1.0
+        marker = ''
+        if ratio > threshold and row['p95_ms'] - before['p95_ms'] > min_delta_ms:
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms → {row['p95_ms']}ms")
+            marker = ' ⚠️'
+        if row['queries'] > before['queries']:
+            regressions.append(f"{name}: استعلامات SQL {before['queries']} → {row['queries']}")
+            marker = ' ⚠️'
+        print(f"{name:<20}{before['p95_ms']:>10.1f}{row['p95_ms']:>10.1f}{ratio:>8.2f}"
+              f"{before['queries']:>9}{row['queries']:>9}{marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default='bench.db', help="القاعدة المولدة بـ generate_data.py")
+    parser.add_argument('--requests', type=int, default=20, help="عدد الطلبات المقاسة لكل مسار")
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--only', action='append', help="قياس مسار بعينه فقط (يمكن تكراره)")
+    parser.add_argument('--json', help="حفظ النتائج في ملف JSON")
+    parser.add_argument('--compare', help="ملف JSON سابق للمقارنة")
+    parser.add_argument('--threshold', type=float, default=1.25, help="أقصى نسبة مسموحة لزيادة p95")
+    parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                        help="تجاهل الزيادات الأصغر من هذا (تذبذب المسارات السريعة)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.database):
+        print(f"❌ القاعدة {args.database} غير موجودة، أنشئها بـ benchmarks/generate_data.py")
+        return 1
+
+    # يجب ضبط البيئة قبل استيراد التطبيق
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.abspath(args.database)}"
+    os.environ.setdefault('METRICS_SLOW_QUERY_LOG', '')
+    os.environ['LAZYLOAD_GUARD'] = 'record'
+
+    from sqlalchemy import event
+
+    import app as app_module
+    from lazyload_guard import lazyload_guard
+    from models import db
+
+    app = app_module.app
+    if not os.path.isdir(os.path.join(ROOT, 'templates')):
+        # القوالب في جذر المستودع عند التشغيل من نسخة التطوير
+        app.template_folder = ROOT
+    app.config['TESTING'] = True
+
+    counter = [0]
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda *args: counter.__setitem__(0, counter[0] + 1))
+
+    routes = build_routes(app_module)
+    if args.only:
+        routes = [route for route in routes if route[0] in args.only]
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = 'admin'
+
+    results = {
+        'database': os.path.basename(args.database),
+        'requests': args.requests,
+        'python': platform.python_version(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'routes': {},
+    }
+    print(f"⚙️ {len(routes)} مسار × {args.requests} طلب على {args.database}\n")
+    print(f"{'المسار':<20}{'p50 (ms)':>10}{'p95 (ms)':>10}{'SQL':>6}{'الحد':>6}{'ذاكرة (KB)':>12}{'الحالة':>10}")
+    for name, method, url, budget, kwargs in routes:
+        row = measure_route(client, counter, lazyload_guard, method, url, kwargs, args.requests, args.warmup)
+        row['query_budget'] = budget
+        results['routes'][name] = row
+        print(f"{name:<20}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['queries']:>6}{budget or '-':>6}"
+              f"{row['peak_memory_kb']:>12.0f}{','.join(map(str, row['status'])):>10}")
+        for lazy_load in row['lazy_loads']:
+            print(f"    ↳ N+1: {lazy_load}")
+
+    results['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print(f"\n📦 ذروة ذاكرة العملية: {results['max_rss_mb']} MB")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump(results, output, ensure_ascii=False, indent=2)
+
+    failed = [name for name, row in results['routes'].items() if any(status >= 400 for status in row['status'])]
+    for name in failed:
+        print(f"❌ {name}: رد غير ناجح {results['routes'][name]['status']}")
+    for name, row in results['routes'].items():
+        if row['query_budget'] is not None and row['queries'] > row['query_budget']:
+            print(f"❌ {name}: {row['queries']} استعلام SQL يتجاوز الحد المعلن {row['query_budget']}")
+            failed.append(name)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f"⚠️ تراجع: {regression}")
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
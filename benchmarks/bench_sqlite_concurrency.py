@@ -0,0 +1,111 @@
+# benchmarks/bench_sqlite_concurrency.py
+"""قياس الإنتاجية مع قراءات وكتابات متزامنة على SQLite قبل الضبط وبعده
+
+كل عامل عملية مستقلة (مثل عمال gunicorn) تفتح اتصالها الخاص وتنفذ خليطاً من
+قراءات صفحة الطلبيات وكتابات صغيرة بنسبة --write-ratio لمدة --seconds ثانية.
+
+- default: إعدادات sqlite3 الافتراضية (journal_mode=DELETE و synchronous=FULL)
+- tuned: نفس الـ pragmas التي يطبقها database.py على كل اتصال
+
+الاستخدام:
+    python benchmarks/bench_sqlite_concurrency.py --workers 4 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import apply_sqlite_pragmas, sqlite_pragmas  # noqa: E402
+
+CONFIGURATIONS = {
+    'default': {},
+    'tuned': sqlite_pragmas(),
+}
+
+
+def _prepare(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE bench_order (id INTEGER PRIMARY KEY, name TEXT, wilaya TEXT, "
+        "total REAL, paid REAL, is_paid BOOLEAN, created_at TEXT)"
+    )
+    conn.execute("CREATE INDEX ix_bench_order_is_paid_created_at ON bench_order (is_paid, created_at)")
+    conn.executemany(
+        "INSERT INTO bench_order (name, wilaya, total, paid, is_paid, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        [(f"زبون {i}", random.choice(['الجزائر', 'سطيف', 'وهران']), 1000.0, 0.0, i % 2,
+          f"2024-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}.{i:06d}") for i in range(rows)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def _worker(path, pragmas, seconds, write_ratio, seed, results):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    if pragmas:
+        apply_sqlite_pragmas(conn, pragmas)
+
+    reads = writes = locked = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            if rng.random() < write_ratio:
+                conn.execute("UPDATE bench_order SET paid = paid + 1 WHERE id = ?", (rng.randint(1, 1000),))
+                conn.commit()
+                writes += 1
+            else:
+                conn.execute(
+                    "SELECT * FROM bench_order WHERE is_paid = 0 ORDER BY created_at DESC LIMIT 25"
+                ).fetchall()
+                reads += 1
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            conn.rollback()
+            locked += 1
+    conn.close()
+    results.append((reads, writes, locked))
+
+
+def run(name, workers, seconds, write_ratio, rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        _prepare(path, rows)
+        manager = multiprocessing.Manager()
+        results = manager.list()
+        processes = [
+            multiprocessing.Process(target=_worker,
+                                    args=(path, CONFIGURATIONS[name], seconds, write_ratio, seed, results))
+            for seed in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        reads, writes, locked = (sum(column) for column in zip(*results))
+    return reads, writes, locked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"⚙️ {args.workers} عمليات، {args.seconds:g} ثانية، نسبة الكتابة {args.write_ratio:.0%}\n")
+    print(f"{'الإعداد':<10}{'قراءة/ث':>12}{'كتابة/ث':>12}{'مقفلة':>10}")
+    for name in CONFIGURATIONS:
+        reads, writes, locked = run(name, args.workers, args.seconds, args.write_ratio, args.rows)
+        print(f"{name:<10}{reads / args.seconds:>12.0f}{writes / args.seconds:>12.0f}{locked:>10}")
+
+
+if __name__ == '__main__':
+    main()
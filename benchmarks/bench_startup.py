@@ -0,0 +1,78 @@
+# benchmarks/bench_startup.py
+"""قياس زمن استيراد التطبيق (بدء كل عامل gunicorn)
+
+كل قياس في عملية Python جديدة: زمن `import app`، وعدد استعلامات SQL المنفذة
+أثناء الاستيراد (يجب أن يكون صفراً)، وهل تم تحميل Pillow.
+
+الاستخدام:
+    python benchmarks/bench_startup.py --runs 10
+    python benchmarks/bench_startup.py --max-ms 400   # يفشل إذا تجاوز الوسيط الحد
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = []
+event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(json.dumps({'import_ms': elapsed * 1000, 'sql_statements': len(statements),
+                  'pillow_loaded': 'PIL' in sys.modules, 'modules': len(sys.modules)}))
+"""
+
+
+def measure():
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, help="الحد الأقصى المسموح لوسيط زمن الاستيراد")
+    parser.add_argument('--json', help="حفظ النتائج في ملف JSON")
+    args = parser.parse_args()
+
+    measure()  # تسخين ذاكرة الملفات و __pycache__
+    runs = [measure() for _ in range(args.runs)]
+    times = sorted(run['import_ms'] for run in runs)
+    result = {
+        'runs': args.runs,
+        'median_ms': statistics.median(times),
+        'min_ms': times[0],
+        'max_ms': times[-1],
+        'sql_statements': max(run['sql_statements'] for run in runs),
+        'pillow_loaded': any(run['pillow_loaded'] for run in runs),
+        'modules': runs[-1]['modules'],
+    }
+
+    print(f"⏱️ import app: الوسيط {result['median_ms']:.0f}ms "
+          f"(أدنى {result['min_ms']:.0f}ms، أقصى {result['max_ms']:.0f}ms، {args.runs} مرات)")
+    print(f"🗃️ استعلامات SQL أثناء الاستيراد: {result['sql_statements']}")
+    print(f"🖼️ Pillow محمّل: {'نعم' if result['pillow_loaded'] else 'لا'}")
+    print(f"📦 الوحدات المحملة: {result['modules']}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump(result, output, ensure_ascii=False, indent=2)
+
+    failed = result['sql_statements'] > 0
+    if args.max_ms is not None and result['median_ms'] > args.max_ms:
+        print(f"❌ زمن الاستيراد تجاوز {args.max_ms:.0f}ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
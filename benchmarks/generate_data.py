@@ -0,0 +1,323 @@
+# benchmarks/generate_data.py
+"""توليد قاعدة بيانات واقعية الحجم لقياس الأداء
+
+ينشئ ملف SQLite جديداً بنفس الجداول والترحيلات والبيانات الافتراضية، ثم يملؤه
+ببيانات مولدة من بذرة ثابتة (نفس البذرة ← نفس القاعدة تماماً):
+طلبيات بأرقامها وسجلها، عمال مع سنة حضور، مصاريف مع بيانات فواتيرها (بدون
+ملفات الصور)، نقل وديون يدوية، ثم مطابقة الديون التلقائية وأرصدة الرواتب
+و ANALYZE.
+
+الحجم عند --scale 1:
+    100k طلبية، 500 عامل (سنة حضور)، 200k مصروف، 20k نقل، 5k دين يدوي
+
+الاستخدام:
+    python benchmarks/generate_data.py --output bench.db
+    python benchmarks/generate_data.py --output small.db --scale 0.05 --seed 7
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from sqlalchemy import insert, select, text  # noqa: E402
+
+from bootstrap import init_db, seed_defaults  # noqa: E402
+from database import init_database  # noqa: E402
+from debt_sync import reconcile_debts  # noqa: E402
+from expense_rollup import rebuild_rollups  # noqa: E402
+from product_search import rebuild_search_index  # noqa: E402
+from supplier_prices import rebuild_supplier_prices  # noqa: E402
+from payroll import rebuild_balances  # noqa: E402
+from models import (db, Status, Order, PhoneNumber, OrderHistory, Worker, WorkerAttendance,  # noqa: E402
+                    WorkerHistory, ExpenseCategory, Expense, ExpenseReceipt, Supplier, Product,
+                    Transport, TransportCategory, TransportSubType, Debt, ProductPriceHistory)
+
+BASE_COUNTS = {
+    'orders': 100_000,
+    'workers': 500,
+    'suppliers': 300,
+    'expenses': 200_000,
+    'transports': 20_000,
+    'debts': 5_000,
+    'price_history': 1_000_000,
+}
+
+ATTENDANCE_DAYS = 365
+RECEIPT_RATIO = 0.3
+CHUNK_SIZE = 5_000
+
+WILAYAS = ["سطيف", "الجزائر", "وهران", "قسنطينة", "عنابة", "باتنة", "بجاية", "البليدة",
+           "تيزي وزو", "ورقلة", "بسكرة", "المسيلة", "برج بوعريريج", "جيجل", "تلمسان"]
+FIRST_NAMES = ["محمد", "أحمد", "علي", "يوسف", "عمر", "كريم", "سمير", "نبيل", "رشيد", "فاطمة",
+               "خديجة", "أمينة", "سارة", "مريم", "عبد القادر", "إسماعيل", "هشام", "مراد"]
+LAST_NAMES = ["بن علي", "بوزيد", "حمادي", "زروقي", "بلقاسم", "سعيدي", "مرابط", "عمراني",
+              "بوعلام", "شريف", "قاسمي", "لعربي", "منصوري", "بن يحيى"]
+ORDER_PRODUCTS = ["مونتشارج 500 كغ", "مونتشارج 1000 كغ", "باب حديدي", "درج معدني",
+                  "هيكل مستودع", "سياج", "نافذة ألمنيوم", "بوابة أوتوماتيكية"]
+HISTORY_TYPES = ["تعديل الحالة", "دفعة جديدة", "تعديل البيانات", "تعيين عامل"]
+PRODUCT_VARIANTS = ["", "صغير", "كبير", "10 مم", "12 مم", "16 مم", "2 متر", "6 متر", "مجلفن", "أبيض",
+                    "رمادي", "مستورد", "محلي", "درجة أولى", "علبة 25", "كيس 50 كغ"]
+PAYMENT_METHODS = ["cash", "transfer", "check"]
+TRANSPORT_METHODS = ["car", "truck", "taxi", "bus"]
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.abspath(path)}"
+    init_database(app)
+    return app
+
+
+def person(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def phone(rng):
+    return f"0{rng.choice('567')}{rng.randrange(10_000_000, 99_999_999)}"
+
+
+def moment(rng, start, days):
+    """لحظة عشوائية خلال days يوماً بعد start"""
+    return start + timedelta(seconds=rng.randrange(days * 86400))
+
+
+def insert_chunks(model, rows):
+    """إدراج جماعي على دفعات، rows مولد لا قائمة حتى لا تمتلئ الذاكرة"""
+    count = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            db.session.execute(insert(model), chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(insert(model), chunk)
+        count += len(chunk)
+    return count
+
+
+def generate(rng, counts, start):
+    days = ATTENDANCE_DAYS
+    status_ids = list(db.session.execute(select(Status.id)).scalars())
+    paid_status = status_ids[-1]
+    category_ids = list(db.session.execute(select(ExpenseCategory.id)).scalars())
+    products = db.session.execute(select(Product.name, Product.category_id)).all()
+    sub_types = db.session.execute(select(TransportSubType.id, TransportSubType.category_id)).all()
+    transport_category_ids = list(db.session.execute(select(TransportCategory.id)).scalars())
+    stats = {}
+
+    # 👷 العمال
+    worker_rows = []
+    for worker_id in range(1, counts['workers'] + 1):
+        worker_rows.append({
+            'id': worker_id, 'name': person(rng), 'phone': phone(rng),
+            'address': rng.choice(WILAYAS), 'id_card': f"{rng.randrange(10**8, 10**9)}",
+            'start_date': start.date() - timedelta(days=rng.randrange(30, 1500)),
+            'monthly_salary': rng.randrange(30, 90) * 1000.0,
+            'absences': float(rng.randrange(0, 10)), 'outside_work_days': rng.randrange(0, 20),
+            'outside_work_bonus': rng.randrange(0, 20) * 500.0, 'advances': rng.randrange(0, 10) * 1000.0,
+            'incentives': rng.randrange(0, 10) * 500.0, 'late_hours': float(rng.randrange(0, 12)),
+            'is_active': rng.random() < 0.9, 'created_at': start,
+        })
+    stats['workers'] = insert_chunks(Worker, worker_rows)
+    worker_ids = [row['id'] for row in worker_rows]
+
+    def attendance_rows():
+        for worker_id in worker_ids:
+            for day in range(days):
+                current = start.date() + timedelta(days=day)
+                if current.weekday() == 4 or rng.random() < 0.05:  # الجمعة والغيابات
+                    continue
+                morning = datetime.combine(current, datetime.min.time()) + timedelta(hours=8, minutes=rng.randrange(-10, 40))
+                afternoon = morning + timedelta(hours=5)
+                yield {
+                    'worker_id': worker_id, 'date': current,
+                    'check_in_morning': morning, 'check_out_morning': morning + timedelta(hours=4),
+                    'check_in_afternoon': afternoon, 'check_out_afternoon': afternoon + timedelta(hours=3, minutes=rng.randrange(0, 60)),
+                    'total_hours': round(7 + rng.random() * 1.5, 2), 'absence_hours': 0.0,
+                    'location_verified': rng.random() < 0.95, 'created_at': morning,
+                }
+    stats['attendance'] = insert_chunks(WorkerAttendance, attendance_rows())
+
+    stats['worker_history'] = insert_chunks(WorkerHistory, (
+        {'worker_id': rng.choice(worker_ids), 'change_type': rng.choice(["سلفة", "غياب", "دفع الراتب"]),
+         'details': "بيانات مولدة", 'amount': rng.randrange(1, 50) * 1000.0, 'timestamp': moment(rng, start, days)}
+        for _ in range(counts['workers'] * 24)
+    ))
+
+    # 📦 الطلبيات وأرقامها وسجلها
+    def order_rows():
+        for order_id in range(1, counts['orders'] + 1):
+            total = rng.randrange(20, 800) * 1000.0
+            is_paid = rng.random() < 0.6
+            yield {
+                'id': order_id, 'name': person(rng), 'wilaya': rng.choice(WILAYAS),
+                'product': rng.choice(ORDER_PRODUCTS), 'total': total,
+                'paid': total if is_paid else rng.randrange(0, int(total), 1000) * 1.0,
+                'note': "", 'status_id': paid_status if is_paid else rng.choice(status_ids),
+                'created_at': moment(rng, start, days), 'is_paid': is_paid,
+                'assigned_worker_id': rng.choice(worker_ids) if rng.random() < 0.5 else None,
+            }
+    stats['orders'] = insert_chunks(Order, order_rows())
+
+    def phone_rows():
+        for order_id in range(1, counts['orders'] + 1):
+            for index in range(1 if rng.random() < 0.7 else 2):
+                yield {'order_id': order_id, 'number': phone(rng), 'is_primary': index == 0}
+    stats['phones'] = insert_chunks(PhoneNumber, phone_rows())
+
+    def history_rows():
+        for order_id in range(1, counts['orders'] + 1):
+            created = moment(rng, start, days)
+            yield {'order_id': order_id, 'change_type': "إنشاء الطلب", 'details': "بيانات مولدة", 'timestamp': created}
+            for _ in range(rng.randrange(0, 4)):
+                created += timedelta(hours=rng.randrange(1, 240))
+                yield {'order_id': order_id, 'change_type': rng.choice(HISTORY_TYPES),
+                       'details': "بيانات مولدة", 'timestamp': created}
+    stats['history'] = insert_chunks(OrderHistory, history_rows())
+
+    # 🏢 الموردون والمصاريف وفواتيرها
+    stats['suppliers'] = insert_chunks(Supplier, (
+        {'id': supplier_id, 'name': f"مورد {supplier_id} - {rng.choice(LAST_NAMES)}",
+         'phone': phone(rng), 'address': rng.choice(WILAYAS), 'created_at': start}
+        for supplier_id in range(1, counts['suppliers'] + 1)
+    ))
+
+    def expense_rows():
+        for expense_id in range(1, counts['expenses'] + 1):
+            product_name, category_id = rng.choice(products)
+            quantity = rng.randrange(1, 20)
+            unit_price = rng.randrange(2, 500) * 100.0
+            created = moment(rng, start, days)
+            yield {
+                'id': expense_id, 'category_id': category_id or rng.choice(category_ids),
+                'description': product_name, 'quantity': quantity, 'unit_price': unit_price,
+                'amount': quantity * unit_price, 'total_amount': quantity * unit_price,
+                'supplier_id': rng.randrange(1, counts['suppliers'] + 1) if rng.random() < 0.8 else None,
+                'purchased_by': rng.choice(["owner", "worker"]), 'recorded_by': "admin",
+                'purchase_date': created.date(), 'payment_status': "paid" if rng.random() < 0.85 else "unpaid",
+                'payment_method': rng.choice(PAYMENT_METHODS), 'notes': "", 'created_at': created,
+            }
+    stats['expenses'] = insert_chunks(Expense, expense_rows())
+
+    def receipt_rows():
+        for expense_id in range(1, counts['expenses'] + 1):
+            if rng.random() >= RECEIPT_RATIO:
+                continue
+            yield {
+                'expense_id': expense_id, 'filename': f"receipt_{expense_id}.jpg",
+                'original_filename': f"IMG_{rng.randrange(1000, 9999)}.jpg",
+                'file_size': rng.randrange(80_000, 2_000_000), 'mime_type': "image/jpeg",
+                'processing_status': "ready", 'captured_at': moment(rng, start, days), 'captured_by': "admin",
+            }
+    stats['expense_receipts'] = insert_chunks(ExpenseReceipt, receipt_rows())
+
+    # 🏷️ سجل الأسعار: أسماء الكتالوج وأشكالها، وكل اسم عند بعض الموردين فقط
+    price_names = [f"{name} {variant}".strip() for name, _ in products for variant in PRODUCT_VARIANTS]
+
+    def price_rows():
+        for _ in range(counts['price_history']):
+            name_index = rng.randrange(len(price_names))
+            created = moment(rng, start, days)
+            yield {
+                'product_name': price_names[name_index],
+                'supplier_id': 1 + (name_index * 7 + rng.randrange(8)) % counts['suppliers'],
+                'price': rng.randrange(2, 500) * 100.0, 'purchase_date': created.date(),
+                'recorded_by': "admin", 'created_at': created,
+            }
+    stats['price_history'] = insert_chunks(ProductPriceHistory, price_rows())
+
+    # 🚚 النقل
+    def transport_rows():
+        for _ in range(counts['transports']):
+            sub_type_id, category_id = rng.choice(sub_types)
+            amount = rng.randrange(5, 300) * 100.0
+            created = moment(rng, start, days)
+            yield {
+                'name': person(rng), 'phone': phone(rng), 'address': rng.choice(WILAYAS),
+                'transport_amount': amount, 'paid_amount': amount if rng.random() < 0.7 else 0.0,
+                'destination': rng.choice(WILAYAS), 'type': rng.choice(["inside", "outside"]),
+                'category_id': category_id or rng.choice(transport_category_ids), 'sub_type_id': sub_type_id,
+                'transport_method': rng.choice(TRANSPORT_METHODS), 'purpose': "بيانات مولدة",
+                'distance': round(rng.random() * 300, 1), 'is_quick': rng.random() < 0.3,
+                'recorded_by': "admin", 'transport_date': created.date(), 'created_at': created,
+            }
+    stats['transports'] = insert_chunks(Transport, transport_rows())
+
+    # 💸 الديون اليدوية (التلقائية تنشئها المطابقة)
+    def debt_rows():
+        for _ in range(counts['debts']):
+            amount = rng.randrange(1, 200) * 1000.0
+            paid = rng.choice([0.0, amount, rng.randrange(0, int(amount), 1000) * 1.0])
+            created = moment(rng, start, days)
+            yield {
+                'name': person(rng), 'phone': phone(rng), 'address': rng.choice(WILAYAS),
+                'debt_amount': amount, 'paid_amount': paid, 'start_date': created.date(),
+                'status': "paid" if paid >= amount else ("partial" if paid else "unpaid"),
+                'created_at': created, 'source_type': "manual", 'description': "دين مولد",
+                'recorded_by': "admin",
+            }
+    stats['manual_debts'] = insert_chunks(Debt, debt_rows())
+
+    stats['automatic_debts'] = sum(reconcile_debts().values())
+    # الإدراج الجماعي لا يمر بأحداث ORM، فتُبنى الأرصدة والمجاميع مرة واحدة في النهاية
+    stats['worker_balances'] = rebuild_balances()
+    stats['expense_rollups'] = rebuild_rollups()
+    stats['product_names'] = rebuild_search_index()
+    stats['supplier_prices'] = rebuild_supplier_prices()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default='bench.db', help="مسار ملف القاعدة المولدة")
+    parser.add_argument('--scale', type=float, default=1.0, help="معامل الحجم (1 = الحجم الكامل)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--force', action='store_true', help="استبدال الملف إن كان موجوداً")
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        if not args.force:
+            print(f"❌ الملف {args.output} موجود، استعمل --force لاستبداله")
+            return 1
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.output + suffix):
+                os.remove(args.output + suffix)
+
+    counts = {name: max(1, int(count * args.scale)) for name, count in BASE_COUNTS.items()}
+    rng = random.Random(args.seed)
+    # تاريخ بداية ثابت حتى لا تتغير القاعدة حسب يوم التشغيل
+    start = datetime.combine(date(2024, 1, 1), datetime.min.time())
+
+    app = make_app(args.output)
+    started = time.perf_counter()
+    with app.app_context():
+        init_db()
+        seed_defaults()
+        try:
+            stats = generate(rng, counts, start)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ خطأ في توليد البيانات: {e}")
+            raise
+        with db.engine.connect() as connection:
+            connection.execute(text("ANALYZE"))
+            connection.commit()
+        db.engine.dispose()
+
+    print(f"\n📊 {args.output} (البذرة {args.seed}، الحجم ×{args.scale:g})")
+    for name, count in stats.items():
+        print(f"   {name:<18}{count:>10,}")
+    print(f"⏱️ {time.perf_counter() - started:.1f} ثانية، {os.path.getsize(args.output) / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
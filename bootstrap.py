@@ -0,0 +1,165 @@
+# bootstrap.py
+"""تهيئة قاعدة البيانات والبيانات الافتراضية
+
+لا يعمل شيء من هذا عند استيراد التطبيق، بل يُنفذ صراحة مرة واحدة:
+    flask --app app db init    # إنشاء الجداول وتطبيق الترحيلات ثم البيانات الافتراضية
+    flask --app app db seed    # إضافة البيانات الافتراضية الناقصة فقط
+أو تلقائياً عند تشغيل python app.py للتطوير.
+"""
+import click
+from flask.cli import AppGroup
+from sqlalchemy import insert, select
+
+from migrations import run_migrations
+from product_search import rebuild_search_index
+from models import db, SystemSettings, Status, ExpenseCategory, User, Product, TransportCategory, TransportSubType
+
+DEFAULT_STATUSES = [
+    {"name": "قيد التنفيذ", "color": "#FFC107"},
+    {"name": "مدفوعة", "color": "#28A745"},
+]
+
+DEFAULT_EXPENSE_CATEGORIES = [
+    {"name": "مواد بناء", "icon": "🏗️", "color": "#EF4444"},
+    {"name": "مواد تلحيم", "icon": "🔥", "color": "#3B82F6"},
+    {"name": "محركات ومعدات", "icon": "⚡", "color": "#10B981"},
+    {"name": "عتاد الورشة", "icon": "🔧", "color": "#F59E0B"},
+    {"name": "مصاريف تركيب", "icon": "🚚", "color": "#8B5CF6"},
+    {"name": "مصاريف تشغيل", "icon": "💼", "color": "#06B6D4"},
+    {"name": "مصاريف صيانة", "icon": "🛠️", "color": "#F97316"},
+    {"name": "مشتريات عمال", "icon": "👷", "color": "#84CC16"},
+]
+
+DEFAULT_ADMIN = {
+    "username": "admin",
+    "password": "+f1234",
+    "full_name": "مدير النظام",
+    "role": "admin",
+    "is_active": True,
+}
+
+DEFAULT_PRODUCTS = {
+    "مواد بناء": ["صباغة", "شوفيات", "لصقة كحلة", "مفاتيح", "مفك براغي", "أسمنت", "رمل", "طوب"],
+    "مواد تلحيم": ["ديسك تقطاع صغير", "ديسك مولاج صغير", "ديسك تقطاع متوسط", "ديسك تقطاع كبير", "بقيط 3", "بقيط 2", "TUBE CARE 20 PAR 18", "TUBE CARE 40 PAR 18"],
+    "محركات ومعدات": ["مونتشارج بيترو 500", "مونتشارج بيترو 600", "مونتشارج بيترو 800", "مونتشارج بيترو 1000", "رولو كابل 2×1.5", "رولو 3×1.5", "فانت كورس", "كونطاكتار"],
+    "عتاد الورشة": ["طرونسوناز كبيرة كراون", "بوسطا سودي 250A كراون", "طرونسوناز اطابل كراون", "نيفو لازار", "نيفو المنيوم", "مفكات", "شواكيش"],
+    "مصاريف تركيب": ["اطعام العمال", "حقوق الايواء", "شراء اضطراري عند السفر", "مواصلات", "فنادق"],
+    "مصاريف تشغيل": ["تأمين العمال", "تأمين المسير", "كهرباء", "غاز", "ماء", "كراء", "ضرائب", "اتصالات"],
+    "مصاريف صيانة": ["صيانة السيارة", "صيانة العتاد", "صيانة المباني", "صيانة المعدات"],
+    "مشتريات العمال": ["أدوات وقائية", "ملابس عمل", "مستلزمات شخصية"],
+}
+
+DEFAULT_TRANSPORT_CATEGORIES = [
+    {"name": "معاينة مواقع", "icon": "📍", "color": "#3B82F6"},
+    {"name": "تركيب معدات", "icon": "⚡", "color": "#10B981"},
+    {"name": "إصلاح أعطال", "icon": "🔧", "color": "#F59E0B"},
+    {"name": "شراء مواد", "icon": "🛒", "color": "#EF4444"},
+    {"name": "بحث عن منتجات", "icon": "🔍", "color": "#8B5CF6"},
+    {"name": "توصيل سلع", "icon": "🚚", "color": "#06B6D4"},
+    {"name": "اجتماعات عمل", "icon": "💼", "color": "#F97316"},
+    {"name": "تنقلات شخصية", "icon": "👤", "color": "#84CC16"},
+]
+
+DEFAULT_TRANSPORT_SUB_TYPES = {
+    "معاينة مواقع": ["معاينة تركيب مونتشارج", "معاينة موقع عميل", "معاينة موقع جديد"],
+    "تركيب معدات": ["تركيب مونتشارج", "تركيب محركات", "تركيب معدات ورشة"],
+    "إصلاح أعطال": ["إصلاح أخطاء تركيب", "صيانة وقائية", "إصلاح عطل طارئ"],
+    "شراء مواد": ["شراء مواد بناء", "شراء مواد تلحيم", "شراء معدات", "شراء مستلزمات"],
+    "بحث عن منتجات": ["بحث عن سعر", "مقارنة أسعار", "بحث عن مورد جديد"],
+    "توصيل سلع": ["توصيل للعميل", "استلام من المورد", "نقل بين الورش"],
+    "اجتماعات عمل": ["اجتماع مع عميل", "اجتماع مع مورد", "اجتماع مع فريق"],
+    "تنقلات شخصية": ["ذهاب للعمل", "عودة من العمل", "مهمة شخصية"],
+}
+
+
+def init_db():
+    """إنشاء الجداول الجديدة فقط ثم تطبيق الترحيلات المعلقة"""
+    db.create_all()
+    return run_migrations()
+
+
+def _is_empty(model):
+    return db.session.execute(select(model.id).limit(1)).first() is None
+
+
+def _bulk_insert(model, rows):
+    if rows:
+        db.session.execute(insert(model), rows)
+    return len(rows)
+
+
+def _ids_by_name(model):
+    return dict(db.session.execute(select(model.name, model.id)).all())
+
+
+def seed_defaults():
+    """إضافة البيانات الافتراضية للجداول الفارغة، بإدراج جماعي في معاملة واحدة"""
+    try:
+        if _is_empty(SystemSettings):
+            _bulk_insert(SystemSettings, [{}])
+            print("✅ تم إضافة إعدادات النظام")
+
+        if _is_empty(Status):
+            _bulk_insert(Status, DEFAULT_STATUSES)
+            print("✅ تم إضافة الحالات الافتراضية")
+
+        if _is_empty(ExpenseCategory):
+            _bulk_insert(ExpenseCategory, DEFAULT_EXPENSE_CATEGORIES)
+            print("✅ تم إضافة تصنيفات المصاريف")
+
+        if _is_empty(User):
+            _bulk_insert(User, [DEFAULT_ADMIN])
+            print("✅ تم إضافة مستخدم المدير")
+
+        if _is_empty(Product):
+            category_ids = _ids_by_name(ExpenseCategory)
+            product_count = _bulk_insert(Product, [
+                {"name": product_name, "category_id": category_ids[category_name]}
+                for category_name, products in DEFAULT_PRODUCTS.items()
+                if category_name in category_ids
+                for product_name in products
+            ])
+            # الإدراج الجماعي لا يمر بأحداث ORM، فيُبنى فهرس البحث مرة واحدة
+            rebuild_search_index()
+            print(f"✅ تم إضافة {product_count} منتج")
+
+        if _is_empty(TransportCategory):
+            category_count = _bulk_insert(TransportCategory, DEFAULT_TRANSPORT_CATEGORIES)
+            category_ids = _ids_by_name(TransportCategory)
+            sub_type_count = _bulk_insert(TransportSubType, [
+                {"name": sub_type_name, "category_id": category_ids[category_name]}
+                for category_name, sub_types in DEFAULT_TRANSPORT_SUB_TYPES.items()
+                for sub_type_name in sub_types
+            ])
+            print(f"✅ تم إضافة {category_count} تصنيف نقل و {sub_type_count} نوع فرعي")
+
+        db.session.commit()
+        print("🎉 تم تهيئة قاعدة البيانات بنجاح بالكامل")
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ خطأ في تهيئة قاعدة البيانات: {e}")
+        raise
+
+
+db_cli = AppGroup('db', help="تهيئة قاعدة البيانات")
+
+
+@db_cli.command('init')
+@click.option('--seed/--no-seed', default=True, help="إضافة البيانات الافتراضية بعد الترحيلات")
+def init_command(seed):
+    """إنشاء الجداول وتطبيق الترحيلات المعلقة"""
+    applied = init_db()
+    print(f"✅ الجداول جاهزة، الترحيلات المطبقة: {applied or 'لا شيء'}")
+    if seed:
+        seed_defaults()
+
+
+@db_cli.command('seed')
+def seed_command():
+    """إضافة البيانات الافتراضية الناقصة"""
+    seed_defaults()
+
+
+def register_commands(app):
+    app.cli.add_command(db_cli)
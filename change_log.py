@@ -0,0 +1,199 @@
+# change_log.py
+"""سجل التغييرات (change log) لمزامنة تطبيق العمال بالفروقات
+
+كل إضافة أو تعديل أو حذف على الطلبيات وسجلها، العمال وسجلهم، والحضور يضيف
+صفاً إلى change_log داخل نفس المعاملة عبر أحداث SQLAlchemy (مثل debt_sync).
+رقم الصف (seq) تصاعدي دائماً، و SQLite يسمح بكاتب واحد فقط، فالتغييرات
+تظهر للقارئ بنفس ترتيب أرقامها.
+
+التطبيق يحفظ آخر seq استلمه ويطلب `?since=<seq>`، فيستلم العناصر المتغيرة
+فقط مع قائمة المحذوفات (tombstones). الطلبية التي نُقلت لعامل آخر تظهر
+كمحذوفة عند العامل السابق.
+"""
+from flask import Response, request
+from sqlalchemy import event, func, insert, select
+from sqlalchemy.orm import object_session
+
+from models import db, now_utc, ChangeLog, Order, OrderHistory, PhoneNumber, Worker, WorkerHistory, WorkerAttendance
+
+UPSERT = 'upsert'
+DELETE = 'delete'
+
+
+def _log(connection, entity, entity_id, worker_id, operation=UPSERT):
+    connection.execute(insert(ChangeLog.__table__).values(
+        worker_id=worker_id, entity=entity, entity_id=entity_id,
+        operation=operation, changed_at=now_utc()
+    ))
+
+
+def log_changes(connection, entity, changes, operation=UPSERT):
+    """تسجيل الكتابات الجماعية (Core) التي لا تمر بأحداث SQLAlchemy
+
+    changes: أزواج (رقم العنصر، رقم العامل)، وكلها في استعلام واحد.
+    """
+    now = now_utc()
+    rows = [{'worker_id': worker_id, 'entity': entity, 'entity_id': entity_id,
+             'operation': operation, 'changed_at': now}
+            for entity_id, worker_id in changes if worker_id]
+    if rows:
+        connection.execute(insert(ChangeLog.__table__), rows)
+
+
+def _is_modified(target):
+    session = object_session(target)
+    return session is None or session.is_modified(target, include_collections=False)
+
+
+# ========================
+# 📦 الطلبيات
+# ========================
+
+@event.listens_for(Order, 'after_insert')
+def _order_inserted(mapper, connection, target):
+    if target.assigned_worker_id:
+        _log(connection, 'order', target.id, target.assigned_worker_id)
+
+
+@event.listens_for(Order, 'after_update')
+def _order_updated(mapper, connection, target):
+    if not _is_modified(target):
+        return
+    history = db.inspect(target).attrs.assigned_worker_id.history
+    for previous_worker_id in history.deleted or ():
+        # الطلبية لم تعد لهذا العامل
+        if previous_worker_id and previous_worker_id != target.assigned_worker_id:
+            _log(connection, 'order', target.id, previous_worker_id, DELETE)
+    if target.assigned_worker_id:
+        _log(connection, 'order', target.id, target.assigned_worker_id)
+
+
+@event.listens_for(Order, 'after_delete')
+def _order_deleted(mapper, connection, target):
+    if target.assigned_worker_id:
+        _log(connection, 'order', target.id, target.assigned_worker_id, DELETE)
+
+
+def _order_worker(connection, order_id):
+    # العامل من الطلبية نفسها (الطلبية تُحذف بعد سجلها وهواتفها عند الحذف المتسلسل)
+    return connection.execute(select(Order.assigned_worker_id).where(Order.id == order_id)).scalar()
+
+
+def _log_order_history(connection, target, operation):
+    worker_id = _order_worker(connection, target.order_id)
+    if worker_id:
+        _log(connection, 'order_history', target.id, worker_id, operation)
+
+
+@event.listens_for(OrderHistory, 'after_insert')
+def _order_history_inserted(mapper, connection, target):
+    _log_order_history(connection, target, UPSERT)
+
+
+@event.listens_for(OrderHistory, 'after_delete')
+def _order_history_deleted(mapper, connection, target):
+    _log_order_history(connection, target, DELETE)
+
+
+@event.listens_for(PhoneNumber, 'after_insert')
+@event.listens_for(PhoneNumber, 'after_update')
+@event.listens_for(PhoneNumber, 'after_delete')
+def _order_phone_changed(mapper, connection, target):
+    # الهواتف جزء من الطلبية في التطبيق، فتغييرها وحده تعديل للطلبية
+    worker_id = _order_worker(connection, target.order_id)
+    if worker_id:
+        _log(connection, 'order', target.order_id, worker_id)
+
+
+# ========================
+# 👷 العمال وسجلهم وحضورهم
+# ========================
+
+@event.listens_for(Worker, 'after_insert')
+@event.listens_for(Worker, 'after_update')
+def _worker_changed(mapper, connection, target):
+    if _is_modified(target):
+        _log(connection, 'worker', target.id, target.id)
+
+
+@event.listens_for(Worker, 'after_delete')
+def _worker_deleted(mapper, connection, target):
+    _log(connection, 'worker', target.id, target.id, DELETE)
+
+
+def _register_worker_entity(model, entity):
+    @event.listens_for(model, 'after_insert')
+    @event.listens_for(model, 'after_update')
+    def _changed(mapper, connection, target):
+        if target.worker_id and _is_modified(target):
+            _log(connection, entity, target.id, target.worker_id)
+
+    @event.listens_for(model, 'after_delete')
+    def _deleted(mapper, connection, target):
+        if target.worker_id:
+            _log(connection, entity, target.id, target.worker_id, DELETE)
+
+
+_register_worker_entity(WorkerHistory, 'worker_history')
+_register_worker_entity(WorkerAttendance, 'attendance')
+
+
+# ========================
+# 🔄 القراءة
+# ========================
+
+def latest_seq(worker_id):
+    """آخر رقم تسلسل يخص العامل (0 إذا لم يتغير شيء)"""
+    return db.session.execute(
+        select(func.coalesce(func.max(ChangeLog.id), 0)).where(ChangeLog.worker_id == worker_id)
+    ).scalar()
+
+
+def parse_since():
+    """قيمة ?since من الطلب: None إذا غابت، ويرفع ValueError إذا كانت غير صالحة"""
+    since = request.args.get('since')
+    if since in (None, ''):
+        return None
+    since = int(since)
+    if since < 0:
+        raise ValueError(since)
+    return since
+
+
+def changes_since(worker_id, since, entities=None):
+    """التغييرات بعد since لكل كيان: {entity: {'upsert': {ids}, 'delete': {ids}}}
+
+    آخر عملية على كل عنصر هي المعتبرة (إضافة ثم حذف = محذوف).
+    """
+    query = select(ChangeLog.entity, ChangeLog.entity_id, ChangeLog.operation).where(
+        ChangeLog.worker_id == worker_id, ChangeLog.id > since
+    ).order_by(ChangeLog.id)
+    if entities:
+        query = query.where(ChangeLog.entity.in_(entities))
+
+    latest = {}
+    for entity, entity_id, operation in db.session.execute(query):
+        latest[(entity, entity_id)] = operation
+
+    changes = {}
+    for (entity, entity_id), operation in latest.items():
+        changes.setdefault(entity, {UPSERT: set(), DELETE: set()})[operation].add(entity_id)
+    return changes
+
+
+def sync_etag(*parts):
+    return '-'.join(str(part) for part in parts)
+
+
+def not_modified(etag):
+    """رد 304 إذا كانت نسخة التطبيق مطابقة، قبل بناء أي بيانات"""
+    if request.if_none_match.contains(etag):
+        return sync_response(Response(status=304), etag)
+    return None
+
+
+def sync_response(response, etag):
+    response.set_etag(etag)
+    # التطبيق يعيد التحقق في كل مرة، والرد 304 لا يحمل أي بيانات
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,78 @@
+# database.py
+"""إعدادات قاعدة البيانات
+
+رابط القاعدة وإعدادات مجموعة الاتصالات تُقرأ من متغيرات البيئة، وعند فتح
+كل اتصال SQLite تُضبط pragmas الإنتاج: WAL حتى لا ينتظر القراء الكاتب،
+و busy_timeout بدلاً من خطأ "database is locked" الفوري، و synchronous=NORMAL
+حتى لا يكلف كل commit عملية fsync كاملة (آمن مع WAL).
+"""
+import os
+
+from sqlalchemy import event
+
+from models import db
+
+DEFAULT_DATABASE_URL = 'sqlite:///data.db'
+
+# القيم الافتراضية، ويمكن تغيير أي منها بمتغير بيئة SQLITE_<الاسم>
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,        # ملي ثانية
+    'cache_size': -64000,        # سالب = بالكيلوبايت (64MB)
+    'mmap_size': 268435456,      # 256MB
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
+# متغيرات البيئة لإعدادات مجموعة الاتصالات (SQLAlchemy create_engine)
+POOL_SETTINGS = (
+    ('pool_size', 'DB_POOL_SIZE', int),
+    ('max_overflow', 'DB_MAX_OVERFLOW', int),
+    ('pool_timeout', 'DB_POOL_TIMEOUT', float),
+    ('pool_recycle', 'DB_POOL_RECYCLE', int),
+)
+
+
+def sqlite_pragmas(environ=os.environ):
+    """الـ pragmas بعد تطبيق متغيرات البيئة"""
+    return {name: environ.get(f'SQLITE_{name.upper()}', default)
+            for name, default in DEFAULT_PRAGMAS.items()}
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    """تنفيذ الـ pragmas على اتصال sqlite3 مفتوح"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def engine_options(environ=os.environ):
+    options = {}
+    for option, variable, cast in POOL_SETTINGS:
+        if environ.get(variable):
+            options[option] = cast(environ[variable])
+    if environ.get('DB_POOL_PRE_PING', '').lower() in ('1', 'true', 'yes'):
+        options['pool_pre_ping'] = True
+    return options
+
+
+def init_database(app):
+    """ربط قاعدة البيانات بالتطبيق وضبط اتصالات SQLite"""
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL))
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options())
+    app.config.setdefault('SQLITE_PRAGMAS', sqlite_pragmas())
+    db.init_app(app)
+
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name == 'sqlite':
+        pragmas = app.config['SQLITE_PRAGMAS']
+
+        @event.listens_for(engine, 'connect')
+        def _on_connect(dbapi_connection, connection_record):
+            apply_sqlite_pragmas(dbapi_connection, pragmas)
+    return engine
@@ -0,0 +1,108 @@
+# debt_sync.py
+"""إنشاء الديون التلقائية من المصاريف والمشتريات والنقل
+
+تُنشأ الديون عند الكتابة عبر أحداث SQLAlchemy (after_insert / after_update)
+بدلاً من إعادة بنائها عند كل عرض لصفحة الديون. كل مصدر له استعلام
+INSERT ... SELECT واحد مع ربط عكسي (anti-join) على جدول الديون، يُستخدم
+لصف واحد من الأحداث ولكل الجدول في أمر المطابقة.
+"""
+from sqlalchemy import DateTime, bindparam, event, text
+
+from models import db, now_utc, Expense, Purchase, Transport
+
+DEBT_COLUMNS = (
+    "name, phone, address, debt_amount, paid_amount, start_date, status, "
+    "created_at, source_type, source_id, description, recorded_by"
+)
+
+# شروط إنشاء الدين لكل مصدر (نفس الشروط التي كانت في صفحة الديون)
+_SOURCE_SELECTS = {
+    'expense': """
+        SELECT COALESCE(s.name, 'مورد'), COALESCE(s.phone, ''), COALESCE(s.address, ''),
+               e.total_amount, :paid_amount, e.purchase_date, 'unpaid',
+               :now, 'expense', e.id,
+               e.description || ' - ' || COALESCE(c.name, 'عام'), e.recorded_by
+        FROM expense e
+        LEFT JOIN supplier s ON s.id = e.supplier_id
+        LEFT JOIN expense_category c ON c.id = e.category_id
+        LEFT JOIN debt d ON d.source_type = 'expense' AND d.source_id = e.id
+        WHERE d.id IS NULL AND e.payment_status IN ('unpaid', 'partial')
+    """,
+    'purchase': """
+        SELECT s.name, s.phone, s.address,
+               p.total_price, 0.0, p.purchase_date, 'unpaid',
+               :now, 'purchase', p.id,
+               COALESCE(pr.name, 'منتج') || ' - ' || p.quantity || ' وحدة', 'system'
+        FROM purchase p
+        JOIN supplier s ON s.id = p.supplier_id
+        LEFT JOIN product pr ON pr.id = p.product_id
+        LEFT JOIN debt d ON d.source_type = 'purchase' AND d.source_id = p.id
+        WHERE d.id IS NULL AND p.status = 'unpaid'
+    """,
+    'transport': """
+        SELECT t.name, t.phone, t.address,
+               t.transport_amount, COALESCE(t.paid_amount, 0), t.transport_date, 'unpaid',
+               :now, 'transport', t.id,
+               COALESCE(t.purpose, '') || ' - ' || COALESCE(t.destination, ''), t.recorded_by
+        FROM transport t
+        LEFT JOIN debt d ON d.source_type = 'transport' AND d.source_id = t.id
+        WHERE d.id IS NULL AND COALESCE(t.paid_amount, 0) < t.transport_amount
+    """,
+}
+
+_SOURCE_ALIASES = {'expense': 'e', 'purchase': 'p', 'transport': 't'}
+
+
+def _insert_statement(source_type, single=False):
+    select_sql = _SOURCE_SELECTS[source_type]
+    if single:
+        select_sql += f" AND {_SOURCE_ALIASES[source_type]}.id = :source_id"
+    return text(f"INSERT OR IGNORE INTO debt ({DEBT_COLUMNS}) {select_sql}").bindparams(
+        bindparam("now", type_=DateTime())
+    )
+
+
+def sync_source_debt(connection, source_type, source_id, paid_amount=0.0):
+    """إنشاء دين لمصدر واحد إذا استوفى الشروط ولم يكن له دين"""
+    return connection.execute(
+        _insert_statement(source_type, single=True),
+        {"source_id": source_id, "paid_amount": paid_amount or 0.0, "now": now_utc()}
+    ).rowcount
+
+
+def reconcile_debts(connection=None):
+    """مطابقة شاملة: استعلام INSERT ... SELECT واحد لكل مصدر
+
+    يرجع عدد الديون المنشأة لكل مصدر.
+    """
+    connection = connection or db.session.connection()
+    created = {}
+    for source_type in _SOURCE_SELECTS:
+        created[source_type] = connection.execute(
+            _insert_statement(source_type),
+            {"paid_amount": 0.0, "now": now_utc()}
+        ).rowcount
+    return created
+
+
+# ========================
+# 🔔 أحداث الكتابة
+# ========================
+
+# المصروف الجديد: مسارات الإضافة تستدعي sync_source_debt بالمبلغ المدفوع من النموذج
+# لأنه ليس عموداً في المصروف، وأمر المطابقة (reconcile_debts) يلتقط أي مسار آخر
+@event.listens_for(Expense, 'after_update')
+def _expense_written(mapper, connection, target):
+    sync_source_debt(connection, 'expense', target.id)
+
+
+@event.listens_for(Purchase, 'after_insert')
+@event.listens_for(Purchase, 'after_update')
+def _purchase_written(mapper, connection, target):
+    sync_source_debt(connection, 'purchase', target.id)
+
+
+@event.listens_for(Transport, 'after_insert')
+@event.listens_for(Transport, 'after_update')
+def _transport_written(mapper, connection, target):
+    sync_source_debt(connection, 'transport', target.id)
@@ -0,0 +1,131 @@
+# expense_rollup.py
+"""مجاميع المصاريف الجاهزة لإحصائيات المصاريف (expense_rollup)
+
+كل صف يجمع المصاريف في (شهر، تصنيف، مورد): المجموع وعدد العمليات.
+الإضافة والتعديل والحذف على Expense تضيف الفرق فقط إلى الصف المعني عبر
+أحداث SQLAlchemy في نفس المعاملة (INSERT ... ON CONFLICT DO UPDATE)، مثل
+payroll. فإحصائيات المصاريف تقرأ بضع مئات من الصفوف مهما كبر سجل المصاريف.
+
+المفاتيح الغائبة تُحفظ كقيمة ثابتة (0 للتصنيف والمورد، '' للشهر) لأن
+المفتاح الأساسي لا يقبل NULL. rebuild_rollups يعيد البناء من جدول المصاريف.
+"""
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, track_old_values, Expense, ExpenseRollup
+
+ROLLUP_FIELDS = ('purchase_date', 'category_id', 'supplier_id', 'total_amount')
+
+
+def _month(purchase_date):
+    return purchase_date.strftime('%Y-%m') if purchase_date else ''
+
+
+def _key(values):
+    return (_month(values['purchase_date']), values['category_id'] or 0, values['supplier_id'] or 0)
+
+
+def _apply(connection, key, total, count):
+    """إضافة (total, count) إلى صف المفتاح، وحذف الصف إذا لم يبق فيه مصروف"""
+    month, category_id, supplier_id = key
+    table = ExpenseRollup.__table__
+    statement = sqlite_insert(table).values(
+        month=month, category_id=category_id, supplier_id=supplier_id,
+        total=total, expense_count=count
+    )
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[table.c.month, table.c.category_id, table.c.supplier_id],
+        set_={
+            'total': table.c.total + statement.excluded.total,
+            'expense_count': table.c.expense_count + statement.excluded.expense_count,
+        }
+    ))
+    if count < 0:
+        connection.execute(delete(table).where(
+            table.c.month == month, table.c.category_id == category_id,
+            table.c.supplier_id == supplier_id, table.c.expense_count <= 0
+        ))
+
+
+def _current_values(expense):
+    return {field: getattr(expense, field) for field in ROLLUP_FIELDS}
+
+
+# ========================
+# 🔔 أحداث المصاريف
+# ========================
+
+# القيمة القديمة تُحمَّل دائماً عند التعديل ليُطرح المصروف من صفه السابق
+track_old_values(*(getattr(Expense, field) for field in ROLLUP_FIELDS))
+
+
+@event.listens_for(Expense, 'after_insert')
+def _expense_inserted(mapper, connection, target):
+    _apply(connection, _key(_current_values(target)), target.total_amount or 0, 1)
+
+
+@event.listens_for(Expense, 'after_update')
+def _expense_updated(mapper, connection, target):
+    state = db.inspect(target)
+    new = _current_values(target)
+    old = {}
+    for field in ROLLUP_FIELDS:
+        history = state.attrs[field].history
+        old[field] = history.deleted[0] if history.deleted else new[field]
+    if old == new:
+        return
+
+    old_key, new_key = _key(old), _key(new)
+    if old_key == new_key:
+        _apply(connection, new_key, (new['total_amount'] or 0) - (old['total_amount'] or 0), 0)
+    else:
+        _apply(connection, old_key, -(old['total_amount'] or 0), -1)
+        _apply(connection, new_key, new['total_amount'] or 0, 1)
+
+
+@event.listens_for(Expense, 'after_delete')
+def _expense_deleted(mapper, connection, target):
+    _apply(connection, _key(_current_values(target)), -(target.total_amount or 0), -1)
+
+
+# ========================
+# 🔍 إعادة البناء
+# ========================
+
+def _rollup_select():
+    key = (
+        func.coalesce(func.strftime('%Y-%m', Expense.purchase_date), ''),
+        func.coalesce(Expense.category_id, 0),
+        func.coalesce(Expense.supplier_id, 0),
+    )
+    return select(
+        *key,
+        func.coalesce(func.sum(Expense.total_amount), 0.0),
+        func.count(Expense.id),
+    ).group_by(*key)
+
+
+def rebuild_rollups(connection=None):
+    """إعادة حساب كل المجاميع من جدول المصاريف باستعلام واحد، ويرجع عدد الصفوف"""
+    connection = connection or db.session.connection()
+    table = ExpenseRollup.__table__
+    connection.execute(delete(table))
+    return connection.execute(insert(table).from_select(
+        ['month', 'category_id', 'supplier_id', 'total', 'expense_count'], _rollup_select()
+    )).rowcount
+
+
+def verify_rollups(tolerance=0.01):
+    """مقارنة المجاميع المخزنة بإعادة الحساب، ويرجع قائمة (المفتاح، المحسوب، المخزن)"""
+    expected = {(month, category_id, supplier_id): (round(total, 2), count)
+                for month, category_id, supplier_id, total, count in db.session.execute(_rollup_select())}
+    stored = {(month, category_id, supplier_id): (round(total, 2), count)
+              for month, category_id, supplier_id, total, count in db.session.execute(select(
+                  ExpenseRollup.month, ExpenseRollup.category_id, ExpenseRollup.supplier_id,
+                  ExpenseRollup.total, ExpenseRollup.expense_count))}
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        exp, got = expected.get(key), stored.get(key)
+        if exp is None or got is None or exp[1] != got[1] or abs(exp[0] - got[0]) > tolerance:
+            mismatches.append((key, exp, got))
+    return mismatches
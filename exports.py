@@ -0,0 +1,309 @@
+# exports.py
+"""تصدير صفحات العرض (المصاريف، الطلبيات، الديون، النقل) إلى CSV أو XLSX
+
+الصفوف تُقرأ أعمدةً فقط (بدون كائنات ORM) على دفعات من EXPORT_BATCH صف عبر
+yield_per، وتُكتب في استجابة متدفقة (generator) دفعة بدفعة، فذاكرة التصدير
+ثابتة مهما كان عدد الصفوف. شروط التصفية هي نفسها شروط صفحة العرض.
+
+ملف XLSX يُبنى بـ zipfile من المكتبة القياسية (ورقة واحدة بنصوص مضمنة)،
+فلا حاجة لمكتبة خارجية، ويُضغط ويُرسل أثناء الكتابة.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+from flask import Response, stream_with_context
+from sqlalchemy import case, func, select
+
+from models import (db, Debt, Expense, ExpenseCategory, Order, PhoneNumber, Status, Supplier,
+                    Transport, TransportCategory, TransportSubType)
+
+EXPORT_BATCH = 1000
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+CSV_MIMETYPE = 'text/csv'  # Werkzeug يضيف charset=utf-8 لأنواع text/
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+PAYMENT_STATUS_LABELS = {'paid': 'مدفوعة', 'unpaid': 'غير مدفوعة'}
+DEBT_STATUS_LABELS = {'paid': 'مدفوع', 'unpaid': 'غير مدفوع'}
+TRANSPORT_TYPE_LABELS = {'inside': 'داخلي', 'outside': 'خارجي'}
+
+
+def _labels(column, labels):
+    return case(labels, value=column, else_=column)
+
+
+# ========================
+# 📋 استعلامات التصدير
+# ========================
+# كل عمود مسمى بعنوانه في الملف، والترتيب نفس ترتيب صفحة العرض (الأحدث أولاً)
+
+def expenses_export(filters):
+    return (select(
+        Expense.id.label('الرقم'),
+        Expense.purchase_date.label('تاريخ الشراء'),
+        ExpenseCategory.name.label('التصنيف'),
+        Expense.description.label('المنتج'),
+        Expense.quantity.label('الكمية'),
+        Expense.unit_price.label('سعر الوحدة'),
+        Expense.total_amount.label('الإجمالي'),
+        Supplier.name.label('المورد'),
+        _labels(Expense.payment_status, PAYMENT_STATUS_LABELS).label('حالة الدفع'),
+        Expense.payment_method.label('طريقة الدفع'),
+        Expense.purchased_by.label('المشتري'),
+        Expense.recorded_by.label('سجله'),
+        Expense.notes.label('ملاحظات'),
+    ).select_from(Expense)
+     .outerjoin(ExpenseCategory, ExpenseCategory.id == Expense.category_id)
+     .outerjoin(Supplier, Supplier.id == Expense.supplier_id)
+     .where(*filters)
+     .order_by(Expense.created_at.desc(), Expense.id.desc()))
+
+
+def orders_export(filters):
+    # كل أرقام الطلبية في خلية واحدة، من فهرس phone_number.order_id
+    phones = (select(func.group_concat(PhoneNumber.number, ' / '))
+              .where(PhoneNumber.order_id == Order.id)
+              .scalar_subquery())
+    return (select(
+        Order.id.label('الرقم'),
+        Order.created_at.label('التاريخ'),
+        Order.name.label('الاسم'),
+        phones.label('الهاتف'),
+        Order.wilaya.label('الولاية'),
+        Order.product.label('المنتج'),
+        Order.total.label('الإجمالي'),
+        Order.paid.label('المدفوع'),
+        func.round(Order.total - Order.paid, 2).label('المتبقي'),
+        Status.name.label('الحالة'),
+        case((Order.is_paid == True, 'نعم'), else_='لا').label('مدفوعة بالكامل'),
+        Order.note.label('ملاحظات'),
+    ).select_from(Order)
+     .outerjoin(Status, Status.id == Order.status_id)
+     .where(*filters)
+     .order_by(Order.created_at.desc(), Order.id.desc()))
+
+
+def debts_export(filters):
+    return (select(
+        Debt.id.label('الرقم'),
+        Debt.start_date.label('تاريخ البداية'),
+        Debt.name.label('الاسم'),
+        Debt.phone.label('الهاتف'),
+        Debt.address.label('العنوان'),
+        Debt.source_type.label('المصدر'),
+        Debt.description.label('الوصف'),
+        Debt.debt_amount.label('مبلغ الدين'),
+        Debt.paid_amount.label('المدفوع'),
+        func.round(Debt.debt_amount - Debt.paid_amount, 2).label('المتبقي'),
+        _labels(Debt.status, DEBT_STATUS_LABELS).label('الحالة'),
+        Debt.payment_date.label('تاريخ السداد'),
+    ).where(*filters)
+     .order_by(Debt.created_at.desc(), Debt.id.desc()))
+
+
+def transport_export(filters):
+    return (select(
+        Transport.id.label('الرقم'),
+        Transport.transport_date.label('التاريخ'),
+        _labels(Transport.type, TRANSPORT_TYPE_LABELS).label('النوع'),
+        TransportCategory.name.label('التصنيف'),
+        TransportSubType.name.label('النوع الفرعي'),
+        Transport.name.label('الاسم'),
+        Transport.phone.label('الهاتف'),
+        Transport.destination.label('الوجهة'),
+        Transport.transport_method.label('وسيلة النقل'),
+        Transport.transport_amount.label('المبلغ'),
+        Transport.paid_amount.label('المدفوع'),
+        func.round(Transport.transport_amount - Transport.paid_amount, 2).label('المتبقي'),
+        Transport.recorded_by.label('سجله'),
+        Transport.notes.label('ملاحظات'),
+    ).select_from(Transport)
+     .outerjoin(TransportCategory, TransportCategory.id == Transport.category_id)
+     .outerjoin(TransportSubType, TransportSubType.id == Transport.sub_type_id)
+     .where(*filters)
+     .order_by(Transport.created_at.desc(), Transport.id.desc()))
+
+
+def stream_rows(statement):
+    """صفوف الاستعلام على دفعات من EXPORT_BATCH دون تحميل النتيجة كاملة"""
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH))
+    for partition in result.partitions():
+        yield partition
+
+
+# ========================
+# 📄 CSV
+# ========================
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    value = _plain(value)
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        # نص يبدأ بـ = أو + ... لا يُنفذ كصيغة عند فتحه في Excel (أرقام الهواتف +213... تبقى كما هي)
+        if not (value[0] in '+-' and value[1:].replace(' ', '').isdigit()):
+            return "'" + value
+    return value
+
+
+def csv_stream(header, batches):
+    """ملف CSV بترميز UTF-8 مع BOM (ليفتح Excel النص العربي مباشرة)، دفعة بدفعة"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    for rows in batches:
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+# ========================
+# 📊 XLSX
+# ========================
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0" rightToLeft="1"/></sheetViews>'
+    '<sheetData>'
+)
+_SHEET_END = '</sheetData></worksheet>'
+
+
+class _StreamBuffer:
+    """ملف كتابة فقط بدون seek: zipfile يكتب فيه ثم نرسل ما تجمع بعد كل دفعة"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _column_letters(count):
+    letters = []
+    for index in range(count):
+        name = ''
+        index += 1
+        while index:
+            index, remainder = divmod(index - 1, 26)
+            name = chr(65 + remainder) + name
+        letters.append(name)
+    return letters
+
+
+def _xlsx_row(number, letters, values):
+    cells = []
+    for letter, value in zip(letters, values):
+        if value is None:
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c r="{letter}{number}"><v>{value}</v></c>')
+        else:
+            text = escape(_INVALID_XML.sub('', str(_plain(value))))
+            cells.append(f'<c r="{letter}{number}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+def xlsx_stream(sheet_name, header, batches):
+    """ملف XLSX بورقة واحدة يُضغط ويُرسل أثناء كتابة الصفوف"""
+    buffer = _StreamBuffer()
+    letters = _column_letters(len(header))
+    # ضغط سريع (المستوى 1): الملف أكبر قليلاً لكن الإرسال لا ينتظر الضغط
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr('xl/workbook.xml', _WORKBOOK.format(name=escape(sheet_name[:31])))
+        yield buffer.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((_SHEET_START + _xlsx_row(1, letters, header)).encode('utf-8'))
+            number = 1
+            for rows in batches:
+                lines = []
+                for row in rows:
+                    number += 1
+                    lines.append(_xlsx_row(number, letters, row))
+                sheet.write(''.join(lines).encode('utf-8'))
+                yield buffer.drain()
+            sheet.write(_SHEET_END.encode('utf-8'))
+    yield buffer.drain()
+
+
+def export_response(name, sheet_name, export_format, statement):
+    """استجابة تنزيل متدفقة للاستعلام بصيغة csv أو xlsx"""
+    header = [column.name for column in statement.selected_columns]
+    batches = stream_rows(statement)
+    if export_format == 'xlsx':
+        body, mimetype = xlsx_stream(sheet_name, header, batches), XLSX_MIMETYPE
+    else:
+        body, mimetype = csv_stream(header, batches), CSV_MIMETYPE
+    filename = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M')}.{export_format}"
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
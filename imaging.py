@@ -0,0 +1,88 @@
+# imaging.py
+"""دوال معالجة صور الفواتير
+
+لا تعتمد على Flask ولا على قاعدة البيانات حتى يمكن تشغيلها داخل
+عمليات منفصلة (receipt_pool).
+"""
+from io import BytesIO
+
+# أحجام النسخ المصغرة (أطول ضلع بالبكسل) وصيغها
+THUMBNAIL_SIZES = {'thumb': 160, 'medium': 480}
+VARIANT_FORMATS = {'jpeg': 'JPEG', 'webp': 'WEBP'}
+
+
+def _pil():
+    # Pillow يُستورد عند أول صورة فقط حتى لا يدفع بدء التطبيق كلفته
+    from PIL import Image, ImageOps
+    return Image, ImageOps
+
+
+def _open(source, max_size):
+    """فتح الصورة (مسار أو ملف) مصغرة وباتجاهها الصحيح وبدون بيانات وصفية"""
+    Image, ImageOps = _pil()
+    image = Image.open(source)
+    if image.format == 'JPEG':
+        # فك الترميز بمقياس DCT مصغر (1/2، 1/4، 1/8) بدلاً من الدقة الكاملة
+        # ثم تصغير الباقي بـ LANCZOS؛ المربع المطلوب متساوي الأضلاع فلا يتأثر بالتدوير
+        image.draft('RGB', max_size)
+
+    # تدوير الصورة حسب اتجاه الكاميرا (EXIF) مرة واحدة
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'L'):
+        # JPEG لا يدعم الشفافية ولا الألوان المفهرسة
+        image = image.convert('RGB')
+
+    # تغيير الحجم إذا كان كبيراً
+    image.thumbnail(max_size, Image.Resampling.LANCZOS)
+
+    # لا نحفظ EXIF (الموقع، نوع الهاتف...) ولا ملفات الألوان في الصور الناتجة
+    image.info = {}
+    return image
+
+
+def _encode(image, image_format, quality):
+    output = BytesIO()
+    if image_format == 'JPEG':
+        image.save(output, format='JPEG', quality=quality, optimize=True)
+    else:
+        image.save(output, format=image_format, quality=quality)
+    return output.getvalue()
+
+
+def build_variants(image, quality=80):
+    """النسخ المصغرة بأحجام ثابتة بصيغتي JPEG و WebP، مفتاحها (الحجم، الصيغة)
+
+    الحجم الكامل بصيغة JPEG هو الملف الأصلي نفسه، فتُضاف له نسخة WebP فقط.
+    """
+    Image, _ = _pil()
+    variants = {('full', 'webp'): _encode(image, 'WEBP', quality)}
+    for size_name, pixels in THUMBNAIL_SIZES.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail((pixels, pixels), Image.Resampling.LANCZOS)
+        for format_name, image_format in VARIANT_FORMATS.items():
+            variants[(size_name, format_name)] = _encode(thumbnail, image_format, quality)
+    return variants
+
+
+def compress_image(source, max_size=(1200, 1200), quality=85):
+    """ضغط الصورة للحفاظ على المساحة، ويرفع استثناء إذا تعذر الضغط"""
+    return _encode(_open(source, max_size), 'JPEG', quality)
+
+
+def process_receipt_file(path, max_size=(1200, 1200), quality=85):
+    """ضغط صورة محفوظة على القرص وتوليد نسخها المصغرة، ويرفع استثناء إذا تعذر الضغط
+
+    يُمرَّر المسار للعملية بدلاً من المحتوى. يرجع (الصورة المضغوطة، النسخ).
+    """
+    image = _open(path, max_size)
+    return _encode(image, 'JPEG', quality), build_variants(image)
+
+
+def variants_for_file(path):
+    """توليد النسخ المصغرة لصورة مضغوطة مسبقاً (دون إعادة ضغطها)"""
+    Image, _ = _pil()
+    with open(path, 'rb') as source:
+        image = Image.open(BytesIO(source.read()))
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+    return build_variants(image)
@@ -0,0 +1,155 @@
+# lazyload_guard.py
+"""كشف التحميل الكسول للعلاقات (N+1) أثناء التطوير والاختبار
+
+كل علاقة تُحمَّل كسولاً تنفذ استعلاماً منفصلاً. هذا الحارس يراقب أحداث
+do_orm_execute ويسجل التحميل الكسول في حالتين:
+    - أثناء عرض قالب (مثل `o.status.name` داخل حلقة في القالب)
+    - تكراره من نفس السطر في نفس الطلب (حلقة في الكود) LAZYLOAD_GUARD_REPEAT مرة
+
+التقرير يذكر العلاقة (Order.status) ومكان الاستدعاء (orders.html:120 أو
+app.py:250). الأوضاع عبر LAZYLOAD_GUARD:
+    off     إيقاف
+    record  تسجيل فقط في guard.recent (لأدوات القياس)
+    warn    تسجيل وطباعة ملخص بعد كل طلب
+    raise   رفع LazyLoadError عند أول اكتشاف (للاختبارات)
+    auto    (الافتراضي) warn في وضع debug و off في غيره
+"""
+import os
+import sys
+import sysconfig
+import threading
+from collections import deque
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+from models import db
+
+MODES = ('off', 'record', 'warn', 'raise', 'auto')
+
+# إطارات المكتبات لا تُعتبر مكان الاستدعاء
+_LIBRARY_PATHS = tuple({sysconfig.get_paths()[name] for name in ('stdlib', 'platstdlib', 'purelib', 'platlib')})
+
+
+class LazyLoadError(Exception):
+    """تحميل كسول غير مسموح في وضع raise"""
+
+
+def _call_site():
+    """أول إطار خارج المكتبات: سطر القالب أو سطر الكود"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        template = frame.f_globals.get('__jinja_template__')
+        if template is not None:
+            name = template.name or template.filename or '<template>'
+            return f"{name}:{template.get_corresponding_lineno(frame.f_lineno)}"
+        filename = frame.f_code.co_filename
+        if filename != __file__ and not filename.startswith(_LIBRARY_PATHS) and not filename.startswith('<'):
+            return f"{os.path.basename(filename)}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return '<unknown>'
+
+
+class LazyLoadGuard:
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self.recent = deque(maxlen=200)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.extensions.get('lazyload_guard') is self:
+            return
+        mode = os.environ.get('LAZYLOAD_GUARD', 'auto').lower()
+        app.config.setdefault('LAZYLOAD_GUARD', mode if mode in MODES else 'auto')
+        app.config.setdefault('LAZYLOAD_GUARD_REPEAT', 2)
+        self.app = app
+        app.extensions['lazyload_guard'] = self
+
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_finished, app)
+        app.after_request(self._report)
+
+    @property
+    def mode(self):
+        if self.app is None:
+            return 'off'
+        mode = self.app.config['LAZYLOAD_GUARD']
+        if mode == 'auto':
+            return 'warn' if self.app.debug else 'off'
+        return mode
+
+    def clear(self):
+        with self._lock:
+            self.recent.clear()
+
+    # ========================
+    # 🖼️ عرض القوالب
+    # ========================
+
+    def _template_started(self, sender, template, context, **extra):
+        g.lazyload_template_depth = g.get('lazyload_template_depth', 0) + 1
+
+    def _template_finished(self, sender, template, context, **extra):
+        g.lazyload_template_depth = max(0, g.get('lazyload_template_depth', 0) - 1)
+
+    # ========================
+    # 🔍 الاكتشاف
+    # ========================
+
+    def on_execute(self, orm_execute_state):
+        # lazy_loaded_from متاح لاستعلامات SELECT فقط
+        if not orm_execute_state.is_select or orm_execute_state.lazy_loaded_from is None:
+            return
+        if not has_request_context():
+            return
+        mode = self.mode
+        if mode == 'off':
+            return
+
+        attribute = str(orm_execute_state.loader_strategy_path.prop)
+        site = _call_site()
+        in_template = g.get('lazyload_template_depth', 0) > 0
+
+        counts = g.setdefault('lazyload_counts', {})
+        key = (attribute, site)
+        counts[key] = counts.get(key, 0) + 1
+        if not in_template and counts[key] < self.app.config['LAZYLOAD_GUARD_REPEAT']:
+            return
+
+        reports = g.setdefault('lazyload_reports', {})
+        if key not in reports:
+            reports[key] = {
+                'endpoint': request.endpoint,
+                'attribute': attribute,
+                'site': site,
+                'in_template': in_template,
+            }
+            if mode == 'raise':
+                raise LazyLoadError(f"تحميل كسول {attribute} في {site}"
+                                    f"{' أثناء عرض القالب' if in_template else ' داخل حلقة'}")
+
+    def _report(self, response):
+        reports = g.pop('lazyload_reports', None)
+        if not reports:
+            return response
+        counts = g.get('lazyload_counts', {})
+        with self._lock:
+            for key, report in reports.items():
+                report['count'] = counts[key]
+                self.recent.append(report)
+        if self.mode == 'warn':
+            for report in reports.values():
+                where = 'أثناء عرض القالب' if report['in_template'] else 'داخل حلقة'
+                print(f"⚠️ N+1: تحميل كسول {report['attribute']} ×{report['count']} {where} "
+                      f"في {report['site']} ({request.method} {request.path})")
+        return response
+
+
+lazyload_guard = LazyLoadGuard()
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _on_orm_execute(orm_execute_state):
+    lazyload_guard.on_execute(orm_execute_state)
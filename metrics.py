@@ -0,0 +1,239 @@
+# metrics.py
+"""قياسات الطلبات واستعلامات SQL بصيغة Prometheus
+
+لكل مسار (endpoint): توزيع زمن الاستجابة، عدد استعلامات SQL وزمنها، وحجم
+الرد. تُعرض على /metrics بصيغة Prometheus النصية. كل استعلام يتجاوز
+METRICS_SLOW_QUERY_MS يُكتب في سجل الاستعلامات البطيئة مع قيمه وخطة
+EXPLAIN QUERY PLAN.
+
+القيم خاصة بكل عملية (كل عامل gunicorn يعرض قياساته).
+إذا ضُبط METRICS_TOKEN يُطلب `Authorization: Bearer <token>` لقراءة /metrics،
+وإلا يُطلب تسجيل الدخول مثل بقية الصفحات.
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from flask import Response, g, has_request_context, request, session
+from sqlalchemy import event
+
+from models import db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# لا نشرح إلا الاستعلامات، لا أوامر المعاملات
+_EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{_label(value)}"' for key, value in labels.items()) + '}'
+
+
+class RequestMetrics:
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._slow_log_lock = threading.Lock()
+        self.reset()
+        if app is not None:
+            self.init_app(app)
+
+    def reset(self):
+        with self._lock:
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.statements = defaultdict(lambda: Histogram(STATEMENT_BUCKETS))
+            self.requests = defaultdict(int)
+            self.sql_seconds = defaultdict(float)
+            self.response_bytes = defaultdict(int)
+            self.slow_queries = 0
+
+    def init_app(self, app):
+        if app.extensions.get('request_metrics') is self:
+            return  # مُهيأ مسبقاً، فلا تُسجل الخطافات مرتين
+        app.config.setdefault('METRICS_SLOW_QUERY_MS', float(os.environ.get('METRICS_SLOW_QUERY_MS', 100)))
+        app.config.setdefault('METRICS_SLOW_QUERY_LOG', os.environ.get('METRICS_SLOW_QUERY_LOG', 'slow_queries.log'))
+        app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+        self.app = app
+        app.extensions['request_metrics'] = self
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    # ========================
+    # ⏱️ الطلبات
+    # ========================
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+
+    def _finish_request(self, response):
+        started = g.pop('metrics_started', None)
+        endpoint = request.endpoint or 'unknown'
+        if started is None or endpoint == 'metrics':
+            return response
+
+        elapsed = time.perf_counter() - started
+        key = (endpoint, request.method)
+        # التصدير المتدفق بلا طول معروف: تُعد البايتات أثناء الإرسال
+        streamed = response.content_length is None and response.is_streamed
+        with self._lock:
+            self.latency[key].observe(elapsed)
+            self.statements[key].observe(g.sql_statements)
+            self.requests[key + (response.status_code,)] += 1
+            self.sql_seconds[key] += g.sql_seconds
+            if not streamed:
+                self.response_bytes[key] += response.content_length or 0
+        if streamed:
+            response.response = self._count_streamed(key, response.response)
+        return response
+
+    def _count_streamed(self, key, chunks):
+        sent = 0
+        try:
+            for chunk in chunks:
+                sent += len(chunk.encode() if isinstance(chunk, str) else chunk)
+                yield chunk
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+            with self._lock:
+                self.response_bytes[key] += sent
+
+    # ========================
+    # 🗃️ استعلامات SQL
+    # ========================
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+        if has_request_context() and 'sql_statements' in g:
+            g.sql_statements += 1
+            g.sql_seconds += elapsed
+        if elapsed * 1000 >= self.app.config['METRICS_SLOW_QUERY_MS']:
+            self._log_slow_query(conn, statement, parameters, executemany, elapsed)
+
+    def _log_slow_query(self, conn, statement, parameters, executemany, elapsed):
+        with self._lock:
+            self.slow_queries += 1
+        if executemany and parameters:
+            parameters = parameters[0]
+
+        plan = []
+        if conn.dialect.name == 'sqlite' and statement.lstrip().upper().startswith(_EXPLAINABLE):
+            try:
+                # مؤشر DBAPI مباشر حتى لا تُستدعى أحداث SQLAlchemy مرة أخرى
+                cursor = conn.connection.dbapi_connection.cursor()
+                try:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ())
+                    plan = [row[-1] for row in cursor.fetchall()]
+                finally:
+                    cursor.close()
+            except Exception as e:
+                plan = [f"تعذر تنفيذ EXPLAIN: {e}"]
+
+        endpoint = request.endpoint if has_request_context() else '-'
+        lines = [
+            f"[{datetime.now().isoformat(timespec='seconds')}] {elapsed * 1000:.1f}ms endpoint={endpoint}",
+            statement.strip(),
+            f"params: {parameters!r}",
+        ] + [f"    {line}" for line in plan]
+
+        path = self.app.config['METRICS_SLOW_QUERY_LOG']
+        if path:
+            with self._slow_log_lock, open(path, 'a', encoding='utf-8') as log:
+                log.write('\n'.join(lines) + '\n\n')
+
+    # ========================
+    # 📈 العرض
+    # ========================
+
+    def _authorized(self):
+        token = self.app.config['METRICS_TOKEN']
+        if token:
+            return request.headers.get('Authorization') == f"Bearer {token}"
+        return "user" in session
+
+    def render(self):
+        """القياسات بصيغة Prometheus النصية"""
+        out = []
+        with self._lock:
+            out.append("# HELP http_request_duration_seconds زمن الاستجابة لكل مسار")
+            out.append("# TYPE http_request_duration_seconds histogram")
+            for (endpoint, method), histogram in sorted(self.latency.items()):
+                self._render_histogram(out, 'http_request_duration_seconds', histogram,
+                                       endpoint=endpoint, method=method)
+
+            out.append("# HELP http_request_sql_statements عدد استعلامات SQL في الطلب")
+            out.append("# TYPE http_request_sql_statements histogram")
+            for (endpoint, method), histogram in sorted(self.statements.items()):
+                self._render_histogram(out, 'http_request_sql_statements', histogram,
+                                       endpoint=endpoint, method=method)
+
+            out.append("# HELP http_requests_total عدد الطلبات حسب المسار والحالة")
+            out.append("# TYPE http_requests_total counter")
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                out.append(f"http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}")
+
+            out.append("# HELP http_request_sql_seconds_total مجموع زمن SQL لكل مسار")
+            out.append("# TYPE http_request_sql_seconds_total counter")
+            for (endpoint, method), seconds in sorted(self.sql_seconds.items()):
+                out.append(f"http_request_sql_seconds_total{_labels(endpoint=endpoint, method=method)} {seconds:.6f}")
+
+            out.append("# HELP http_response_size_bytes_total مجموع حجم الردود لكل مسار")
+            out.append("# TYPE http_response_size_bytes_total counter")
+            for (endpoint, method), size in sorted(self.response_bytes.items()):
+                out.append(f"http_response_size_bytes_total{_labels(endpoint=endpoint, method=method)} {size}")
+
+            out.append("# HELP sql_slow_queries_total عدد الاستعلامات التي تجاوزت الحد")
+            out.append("# TYPE sql_slow_queries_total counter")
+            out.append(f"sql_slow_queries_total {self.slow_queries}")
+        return '\n'.join(out) + '\n'
+
+    @staticmethod
+    def _render_histogram(out, name, histogram, **labels):
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            out.append(f"{name}_bucket{_labels(**labels, le=bound)} {count}")
+        out.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {histogram.total}")
+        out.append(f"{name}_sum{_labels(**labels)} {histogram.sum:.6f}")
+        out.append(f"{name}_count{_labels(**labels)} {histogram.total}")
+
+    def metrics_view(self):
+        if not self._authorized():
+            return Response("غير مصرح\n", status=401, mimetype='text/plain')
+        return Response(self.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,432 @@
+# migrations.py
+"""نظام ترحيل قاعدة البيانات بإصدارات مرقمة
+
+كل ترحيل دالة تستقبل اتصالاً مفتوحاً داخل معاملة، ويُسجَّل رقمه في جدول
+schema_version بعد نجاحه، فلا يُعاد تنفيذه مرة أخرى.
+"""
+from datetime import date, datetime, timezone
+
+from sqlalchemy import inspect, text
+
+from models import db
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """تسجيل دالة كترحيل برقم إصدار ووصف"""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return func
+    return decorator
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR(200), "
+        "applied_at DATETIME)"
+    ))
+
+
+def current_version(conn):
+    """آخر إصدار تم تطبيقه على القاعدة"""
+    _ensure_version_table(conn)
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def pending_migrations(conn):
+    version = current_version(conn)
+    return [m for m in MIGRATIONS if m[0] > version]
+
+
+def run_migrations(engine=None):
+    """تطبيق جميع الترحيلات المعلقة بالترتيب، كل ترحيل في معاملة مستقلة"""
+    engine = engine or db.engine
+    applied = []
+
+    with engine.begin() as conn:
+        pending = pending_migrations(conn)
+
+    for version, description, func in pending:
+        with engine.begin() as conn:
+            func(conn)
+            conn.execute(
+                text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.now(timezone.utc)}
+            )
+        print(f"✅ تم تطبيق الترحيل #{version}: {description}")
+        applied.append(version)
+
+    return applied
+
+
+def _columns(conn, table):
+    inspector = inspect(conn)
+    if table not in inspector.get_table_names():
+        return None
+    return [col['name'] for col in inspector.get_columns(table)]
+
+
+def _add_missing_columns(conn, table, columns):
+    existing = _columns(conn, table)
+    if existing is None:
+        return
+    for name, ddl in columns:
+        if name not in existing:
+            conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {name} {ddl}'))
+            print(f"✅ تم إضافة العمود {table}.{name}")
+
+
+# ========================
+# 📜 الترحيلات
+# ========================
+
+@migration(1, "أعمدة الديون الذكية وعمود is_paid للطلبيات")
+def _legacy_columns(conn):
+    # يحل محل كتلة ALTER TABLE القديمة في app.py وسكربت update_database.py
+    _add_missing_columns(conn, 'debt', [
+        ('source_type', 'VARCHAR(50)'),
+        ('source_id', 'INTEGER'),
+        ('description', 'TEXT'),
+        ('recorded_by', 'VARCHAR(50)'),
+    ])
+
+    order_columns = _columns(conn, 'order')
+    if order_columns is not None and 'is_paid' not in order_columns:
+        conn.execute(text('ALTER TABLE "order" ADD COLUMN is_paid BOOLEAN DEFAULT 0'))
+        conn.execute(text('UPDATE "order" SET is_paid = (COALESCE(paid, 0) >= COALESCE(total, 0))'))
+        print("✅ تم إضافة العمود order.is_paid وتحديث الطلبيات الحالية")
+
+    # حقول نظام الإنتاج والتعيين للعمال
+    _add_missing_columns(conn, 'order', [
+        ('assigned_worker_id', 'INTEGER REFERENCES worker (id)'),
+        ('production_details', 'TEXT'),
+        ('expected_delivery_date', 'DATE'),
+        ('actual_delivery_date', 'DATE'),
+        ('is_travel_assignment', 'BOOLEAN DEFAULT 0'),
+        ('travel_worker_id', 'INTEGER REFERENCES worker (id)'),
+        ('media_attachments', 'JSON'),
+    ])
+
+
+# فهارس مطابقة لشروط WHERE و ORDER BY في صفحات العرض ولمفاتيح الربط
+LISTING_INDEXES = [
+    # orders(): WHERE is_paid = ? ORDER BY created_at DESC
+    ("ix_order_is_paid_created_at", "order", "is_paid, created_at"),
+    ("ix_order_created_at", "order", "created_at"),
+    ("ix_order_assigned_worker_id", "order", "assigned_worker_id"),
+    ("ix_phone_number_order_id", "phone_number", "order_id"),
+    ("ix_order_history_order_id_timestamp", "order_history", "order_id, timestamp"),
+    # debts(): WHERE status = ? [AND source_type = ?] ORDER BY created_at DESC
+    ("ix_debt_status_created_at", "debt", "status, created_at"),
+    ("ix_debt_source_type_status_created_at", "debt", "source_type, status, created_at"),
+    ("ix_debt_source", "debt", "source_type, source_id"),
+    # expenses(): WHERE payment_status = ? ORDER BY created_at DESC / نطاق purchase_date
+    ("ix_expense_payment_status_created_at", "expense", "payment_status, created_at"),
+    ("ix_expense_purchase_date_payment_status", "expense", "purchase_date, payment_status"),
+    ("ix_expense_created_at", "expense", "created_at"),
+    ("ix_expense_category_id", "expense", "category_id"),
+    ("ix_expense_supplier_id", "expense", "supplier_id"),
+    ("ix_expense_receipt_expense_id", "expense_receipt", "expense_id"),
+    # transport(): WHERE type = ? ORDER BY created_at DESC
+    ("ix_transport_type_created_at", "transport", "type, created_at"),
+    ("ix_transport_transport_date", "transport", "transport_date"),
+    ("ix_transport_receipt_transport_id", "transport_receipt", "transport_id"),
+    ("ix_purchase_status", "purchase", "status"),
+    ("ix_product_category_id", "product", "category_id"),
+    ("ix_transport_sub_type_category_id", "transport_sub_type", "category_id"),
+    ("ix_worker_history_worker_id_timestamp", "worker_history", "worker_id, timestamp"),
+    ("ix_worker_attendance_worker_id_date", "worker_attendance", "worker_id, date"),
+]
+
+
+@migration(2, "فهارس صفحات العرض ومفاتيح الربط")
+def _listing_indexes(conn):
+    tables = set(inspect(conn).get_table_names())
+    for name, table, columns in LISTING_INDEXES:
+        if table in tables:
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({columns})'))
+    conn.execute(text("ANALYZE"))
+
+
+@migration(3, "فهارس تصفية الطلبيات حسب الحالة والولاية")
+def _order_filter_indexes(conn):
+    # orders(): WHERE status_id = ? / wilaya = ? مع الترقيم على (created_at, id)
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_order_status_id_created_at ON "order" (status_id, created_at)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_order_wilaya_created_at ON "order" (wilaya, created_at)'))
+
+
+@migration(4, "قيد فريد على مصدر الدين ومطابقة الديون التلقائية")
+def _unique_debt_source(conn):
+    from debt_sync import reconcile_debts
+
+    # الديون المكررة لنفس المصدر (من إعادة البناء القديمة) تتحول إلى ديون يدوية بدلاً من حذفها
+    duplicates = conn.execute(text(
+        "UPDATE debt SET source_type = 'manual', source_id = NULL "
+        "WHERE source_id IS NOT NULL AND id NOT IN ("
+        "SELECT MIN(id) FROM debt WHERE source_id IS NOT NULL GROUP BY source_type, source_id)"
+    )).rowcount
+    if duplicates:
+        print(f"⚠️ تم تحويل {duplicates} دين مكرر إلى ديون يدوية")
+
+    conn.execute(text("DROP INDEX IF EXISTS ix_debt_source"))
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_debt_source ON debt (source_type, source_id)"))
+
+    created = reconcile_debts(conn)
+    if any(created.values()):
+        print(f"✅ تم إنشاء الديون التلقائية الناقصة: {created}")
+
+
+@migration(5, "بصمة المحتوى لفواتير المصاريف والنقل")
+def _receipt_content_hash(conn):
+    for table in ('expense_receipt', 'transport_receipt'):
+        _add_missing_columns(conn, table, [('content_hash', 'VARCHAR(64)')])
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{table}_content_hash ON {table} (content_hash)'))
+
+
+@migration(6, "حالة معالجة صور الفواتير")
+def _receipt_processing_status(conn):
+    for table in ('expense_receipt', 'transport_receipt'):
+        _add_missing_columns(conn, table, [('processing_status', "VARCHAR(20) DEFAULT 'ready'")])
+
+
+@migration(7, "حضور واحد لكل عامل في اليوم")
+def _unique_worker_attendance(conn):
+    if _columns(conn, 'worker_attendance') is None:
+        return
+    # التسجيلات المكررة جاءت من إعادة إرسال التطبيق: تُدمج في آخرها ثم تُحذف
+    kept = "SELECT MAX(id) FROM worker_attendance GROUP BY worker_id, date"
+    duplicates = conn.execute(text(
+        f"SELECT id FROM worker_attendance WHERE id NOT IN ({kept}) ORDER BY id"
+    )).scalars().all()
+    if duplicates:
+        same_day = "FROM worker_attendance d WHERE d.worker_id = worker_attendance.worker_id AND d.date = worker_attendance.date"
+        merged = [f"{field} = (SELECT {func}(d.{field}) {same_day})"
+                  for field, func in (('check_in_morning', 'MIN'), ('check_out_morning', 'MAX'),
+                                      ('check_in_afternoon', 'MIN'), ('check_out_afternoon', 'MAX'))]
+        # باقي الحقول: قيمة السجل المحتفظ به، وإلا آخر قيمة غير فارغة من المكررات
+        merged += [f"{field} = COALESCE({field}, (SELECT d.{field} {same_day} AND d.{field} IS NOT NULL "
+                   f"ORDER BY d.id DESC LIMIT 1))"
+                   for field in ('total_hours', 'absence_hours', 'location_verified', 'notes')]
+        conn.execute(text(
+            f"UPDATE worker_attendance SET {', '.join(merged)} "
+            f"WHERE id IN (SELECT MAX(id) FROM worker_attendance GROUP BY worker_id, date HAVING COUNT(*) > 1)"
+        ))
+        if _columns(conn, 'attendance_upload_key') is not None:
+            conn.execute(text(
+                "UPDATE attendance_upload_key SET attendance_id = ("
+                "SELECT MAX(d.id) FROM worker_attendance a JOIN worker_attendance d "
+                "ON d.worker_id = a.worker_id AND d.date = a.date "
+                "WHERE a.id = attendance_upload_key.attendance_id) "
+                f"WHERE attendance_id NOT IN ({kept})"
+            ))
+        conn.execute(text(f"DELETE FROM worker_attendance WHERE id NOT IN ({kept})"))
+        print(f"⚠️ تم دمج وحذف {len(duplicates)} تسجيل حضور مكرر: {', '.join(map(str, duplicates))}")
+
+    # الفهرس الفريد يغني عن فهرس (worker_id, date) العادي
+    conn.execute(text("DROP INDEX IF EXISTS ix_worker_attendance_worker_id_date"))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_worker_attendance_worker_date ON worker_attendance (worker_id, date)"
+    ))
+
+
+@migration(8, "الرصيد الجاري لرواتب العمال")
+def _worker_balances(conn):
+    from payroll import rebuild_balances
+
+    if _columns(conn, 'worker') is None:
+        return
+    # الجدول ينشئه create_all، والترحيل يملؤه للعمال الحاليين
+    built = rebuild_balances(conn)
+    if built:
+        print(f"✅ تم حساب رصيد {built} عامل")
+
+
+@migration(9, "مجاميع إحصائيات المصاريف")
+def _expense_rollups(conn):
+    from expense_rollup import rebuild_rollups
+
+    if _columns(conn, 'expense') is None:
+        return
+    built = rebuild_rollups(conn)
+    if built:
+        print(f"✅ تم بناء {built} صف من مجاميع المصاريف")
+
+
+@migration(10, "فهرس البحث في أسماء المنتجات وآخر الأسعار")
+def _product_search(conn):
+    from product_search import rebuild_search_index
+
+    if _columns(conn, 'product_price_history') is None:
+        return
+    # آخر سعر لكل (اسم، مورد) وسجل أسعار الاسم بالتاريخ
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_product_price_history_name_supplier_date '
+                      'ON product_price_history (product_name, supplier_id, purchase_date, price)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_product_price_history_name_date '
+                      'ON product_price_history (product_name, purchase_date)'))
+    built = rebuild_search_index(conn)
+    print(f"✅ تم فهرسة {built} اسم منتج للبحث")
+
+
+
+@migration(11, "آخر سعر لكل مورد لمقارنة الأسعار")
+def _supplier_prices(conn):
+    from supplier_prices import rebuild_supplier_prices
+
+    if _columns(conn, 'product_price_history') is None:
+        return
+    built = rebuild_supplier_prices(conn)
+    if built:
+        print(f"✅ تم بناء {built} سعر مورد للمقارنة")
+
+
+@migration(12, "مفاتيح عدم تكرار الحضور لكل عامل")
+def _attendance_keys_per_worker(conn):
+    if _columns(conn, 'attendance_upload_key') is None:
+        return
+    if inspect(conn).get_pk_constraint('attendance_upload_key')['constrained_columns'] == ['worker_id', 'key']:
+        return
+    # SQLite لا يغير المفتاح الأساسي، فيُعاد إنشاء الجدول بالمفتاح (worker_id, key)
+    conn.execute(text('ALTER TABLE attendance_upload_key RENAME TO attendance_upload_key_old'))
+    conn.execute(text(
+        'CREATE TABLE attendance_upload_key ('
+        'worker_id INTEGER NOT NULL, '
+        'key VARCHAR(64) NOT NULL, '
+        'attendance_id INTEGER, '
+        'created_at DATETIME, '
+        'PRIMARY KEY (worker_id, key))'
+    ))
+    conn.execute(text(
+        'INSERT INTO attendance_upload_key (worker_id, key, attendance_id, created_at) '
+        'SELECT worker_id, key, attendance_id, created_at FROM attendance_upload_key_old'
+    ))
+    conn.execute(text('DROP TABLE attendance_upload_key_old'))
+
+
+@migration(13, "فهرس صفحة النقل بدون تصفية النوع")
+def _transport_created_at_index(conn):
+    if _columns(conn, 'transport') is None:
+        return
+    # transport(?type=all): ORDER BY created_at DESC, id DESC مع الترقيم
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_transport_created_at_id ON transport (created_at, id)'))
+    # sqlite_stat1 من الترحيل 2 لا يعرف الفهرس الجديد، فيبقى المخطط على الفهرس القديم
+    conn.execute(text("ANALYZE transport"))
+
+
+@migration(14, "ترتيب فهرس أسعار المورد بالتاريخ ثم الرقم")
+def _price_history_supplier_index(conn):
+    if _columns(conn, 'product_price_history') is None:
+        return
+    # إعادة حساب المورد ترتب بـ (purchase_date, id)؛ وجود price قبل الرقم كان يفرض
+    # فرزاً إضافياً فيفضل المخطط ix_product_price_history_name_date عليه
+    conn.execute(text('DROP INDEX IF EXISTS ix_product_price_history_name_supplier_date'))
+    conn.execute(text('CREATE INDEX ix_product_price_history_name_supplier_date '
+                      'ON product_price_history (product_name, supplier_id, purchase_date, id, price)'))
+    conn.execute(text("ANALYZE product_price_history"))
+
+
+# ========================
+# 🔍 التحقق من خطط الاستعلام
+# ========================
+
+# أقل عدد صفوف يُشترط فيه استخدام الفهرس المتوقع
+PLAN_CHECK_MIN_ROWS = 1000
+
+
+def _listing_queries():
+    """استعلامات صفحات العرض كما تنفذها المسارات، مع الفهرس المتوقع لكل منها"""
+    from sqlalchemy import case, func, select, tuple_
+    from models import Order, PhoneNumber, Debt, Expense, ExpenseReceipt, OrderHistory, WorkerHistory, Transport, ChangeLog, PayrollPeriod
+    from models import ProductPriceHistory, SupplierPrice
+
+    return [
+        ("orders (غير مدفوعة)", "ix_order_is_paid_created_at",
+         select(Order).where(Order.is_paid == False).order_by(Order.created_at.desc())),
+        ("orders (صفحة تالية)", "ix_order_is_paid_created_at",
+         select(Order).where(Order.is_paid == False,
+                             tuple_(Order.created_at, Order.id) < (datetime(2030, 1, 1), 1000))
+         .order_by(Order.created_at.desc(), Order.id.desc()).limit(25)),
+        ("orders (الولاية)", "ix_order_wilaya_created_at",
+         select(Order).where(Order.wilaya == 'سطيف').order_by(Order.created_at.desc(), Order.id.desc())),
+        ("orders (الكل)", "ix_order_created_at",
+         select(Order).order_by(Order.created_at.desc())),
+        ("orders → phones", "ix_phone_number_order_id",
+         select(PhoneNumber).where(PhoneNumber.order_id == 1)),
+        ("order_history", "ix_order_history_order_id_timestamp",
+         select(OrderHistory).where(OrderHistory.order_id == 1).order_by(OrderHistory.timestamp.desc())),
+        ("debts (الحالة)", "ix_debt_status_created_at",
+         select(Debt).where(Debt.status == 'unpaid').order_by(Debt.created_at.desc())),
+        ("debts (الحالة والمصدر)", "ix_debt_source_type_status_created_at",
+         select(Debt).where(Debt.status == 'unpaid', Debt.source_type == 'expense').order_by(Debt.created_at.desc())),
+        ("debts (المصدر)", "uq_debt_source",
+         select(Debt).where(Debt.source_type == 'expense', Debt.source_id == 1)),
+        ("expenses (حالة الدفع)", "ix_expense_payment_status_created_at",
+         select(Expense).where(Expense.payment_status == 'unpaid').order_by(Expense.created_at.desc())),
+        ("expenses (الكل)", "ix_expense_created_at",
+         select(Expense).order_by(Expense.created_at.desc())),
+        ("expenses (إجماليات الفترة)", "ix_expense_purchase_date_payment_status",
+         select(func.count(Expense.id), func.sum(case((Expense.payment_status == 'paid', Expense.total_amount), else_=0.0)))
+         .where(Expense.purchase_date >= date(2024, 1, 1), Expense.purchase_date <= date(2024, 1, 31))),
+        ("expense_receipt", "ix_expense_receipt_expense_id",
+         select(ExpenseReceipt.id).where(ExpenseReceipt.expense_id == 1)),
+        ("worker_history", "ix_worker_history_worker_id_timestamp",
+         select(WorkerHistory).where(WorkerHistory.worker_id == 1).order_by(WorkerHistory.timestamp.desc())),
+        ("transport (النوع)", "ix_transport_type_created_at",
+         select(Transport).where(Transport.type == 'inside').order_by(Transport.created_at.desc())),
+        ("transport (الكل)", "ix_transport_created_at_id",
+         select(Transport).order_by(Transport.created_at.desc(), Transport.id.desc()).limit(25)),
+        ("change_log (مزامنة العامل)", "ix_change_log_worker_id_id",
+         select(ChangeLog).where(ChangeLog.worker_id == 1, ChangeLog.id > 100).order_by(ChangeLog.id)),
+        ("payroll_period (العامل)", "ix_payroll_period_worker_id_period_end",
+         select(PayrollPeriod).where(PayrollPeriod.worker_id == 1).order_by(PayrollPeriod.period_end.desc())),
+        ("payroll_period (التاريخ)", "ix_payroll_period_period_end",
+         select(PayrollPeriod).where(PayrollPeriod.period_end >= date(2024, 1, 1)).order_by(PayrollPeriod.period_end.desc())),
+        ("supplier_price (مقارنة الموردين)", "sqlite_autoindex_supplier_price_1",
+         select(SupplierPrice).where(SupplierPrice.product_name.in_(['اسمنت', 'حديد']))
+         .order_by(SupplierPrice.product_name, SupplierPrice.price)),
+        ("product_price_history (إعادة حساب المورد)", "ix_product_price_history_name_supplier_date",
+         select(ProductPriceHistory.id, ProductPriceHistory.price, ProductPriceHistory.purchase_date)
+         .where(ProductPriceHistory.product_name == 'اسمنت', ProductPriceHistory.supplier_id == 1)
+         .order_by(ProductPriceHistory.purchase_date.desc(), ProductPriceHistory.id.desc()).limit(5)),
+        ("product_price_history (سجل الاسم)", "ix_product_price_history_name_date",
+         select(ProductPriceHistory).where(ProductPriceHistory.product_name == 'اسمنت')
+         .order_by(ProductPriceHistory.purchase_date.desc()).limit(10)),
+    ]
+
+
+def explain(conn, statement):
+    """تنفيذ EXPLAIN QUERY PLAN وإرجاع أسطر الخطة"""
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    rows = conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).fetchall()
+    return [row[-1] for row in rows]
+
+
+def _table_rows(conn, statement, limit):
+    """عدد صفوف الجدول الأول في الاستعلام، حتى limit فقط"""
+    table = statement.get_final_froms()[0]
+    return conn.execute(text(f'SELECT COUNT(*) FROM (SELECT 1 FROM "{table.name}" LIMIT {int(limit)})')).scalar()
+
+
+def check_query_plans(engine=None, min_rows=PLAN_CHECK_MIN_ROWS):
+    """التأكد من أن كل استعلام عرض يستخدم الفهرس المخصص له
+
+    في جدول أصغر من min_rows يكون المسح الكامل أرخص، و ANALYZE يجعل المخطط
+    يختاره، فلا يُعد فشلاً (min_rows=0 يشترط الفهرس دائماً).
+    يرجع قائمة (الاسم، الفهرس، ناجح، الخطة).
+    """
+    engine = engine or db.engine
+    results = []
+    with engine.connect() as conn:
+        for name, index, statement in _listing_queries():
+            plan = explain(conn, statement)
+            ok = any(index in line for line in plan)
+            if not ok and min_rows:
+                rows = _table_rows(conn, statement, min_rows)
+                if rows < min_rows:
+                    ok = True
+                    plan.append(f"جدول صغير ({rows} صف): المسح الكامل مقبول")
+            results.append((name, index, ok, plan))
+    return results
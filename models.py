@@ -1,6 +1,8 @@
 # ====== models.py ======
 from datetime import datetime, timezone, timedelta
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, func
+from sqlalchemy.ext.hybrid import hybrid_property
 
 db = SQLAlchemy()
 
@@ -8,6 +10,19 @@ db = SQLAlchemy()
 def now_utc():
     return datetime.now(timezone.utc)
 
+def _keep_old_value(target, value, oldvalue, initiator):
+    return value
+
+def track_old_values(*attributes):
+    """تحميل القيمة القديمة دائماً عند التعديل (active_history)
+
+    أحداث after_update التي تنقل صفاً بين مفاتيح تجميع تحتاج القيمة السابقة
+    في history.deleted حتى لو لم تكن محمّلة. التسجيل مرة واحدة لكل عمود.
+    """
+    for attribute in attributes:
+        if not event.contains(attribute, 'set', _keep_old_value):
+            event.listen(attribute, 'set', _keep_old_value, active_history=True, retval=True)
+
 # ========================
 # 🏷️ قسم الحالات والطلبيات
 # ========================
@@ -74,6 +89,8 @@ class OrderHistory(db.Model):
 # 👥 قسم العمال
 # ========================
 
+LATE_HOUR_PENALTY = 500  # خصم كل ساعة تأخير (دج)
+
 class WorkerHistory(db.Model):
     __tablename__ = 'worker_history'
     id = db.Column(db.Integer, primary_key=True)
@@ -102,7 +119,7 @@ class Worker(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=now_utc)
 
-    @property
+    @hybrid_property
     def total_salary(self):
         """حساب الراتب الإجمالي المستحق بدقة"""
         try:
@@ -114,7 +131,7 @@ class Worker(db.Model):
             base_salary = days_worked * daily_salary
             
             absence_deduction = self.absences * daily_salary
-            late_deduction = self.late_hours * 500
+            late_deduction = self.late_hours * LATE_HOUR_PENALTY
             
             total = (base_salary + 
                     self.outside_work_bonus + 
@@ -127,9 +144,88 @@ class Worker(db.Model):
         except:
             return 0.0
 
+    @total_salary.inplace.expression
+    @classmethod
+    def _total_salary_expression(cls):
+        """نفس المعادلة بـ SQL: تسمح بالتصفية والترتيب والجمع في استعلام واحد"""
+        days_worked = func.max(0, func.cast(func.julianday(func.date('now')) - func.julianday(cls.start_date), db.Integer))
+        daily_salary = cls.monthly_salary / 30.0
+        total = (days_worked * daily_salary
+                 + cls.outside_work_bonus
+                 + cls.incentives
+                 - cls.advances
+                 - cls.absences * daily_salary
+                 - cls.late_hours * LATE_HOUR_PENALTY)
+        # القيم الفارغة تجعل المعادلة NULL، والخاصية في بايثون ترجع 0 في هذه الحالة
+        return func.coalesce(func.max(0, func.round(total, 2)), 0.0)
+
+class WorkerBalance(db.Model):
+    """الرصيد الجاري لراتب العامل، يُحدَّث تدريجياً مع كل تغيير (payroll.py)"""
+    __tablename__ = 'worker_balance'
+    worker_id = db.Column(db.Integer, db.ForeignKey('worker.id'), primary_key=True)
+    period_start = db.Column(db.Date, nullable=False)  # بداية فترة الراتب الحالية
+    daily_rate = db.Column(db.Float, default=0.0)  # الراتب الشهري / 30
+    adjustments = db.Column(db.Float, default=0.0)  # المكافآت والتحفيزات ناقص التسبيقات والغيابات والتأخر
+    updated_at = db.Column(db.DateTime, default=now_utc)
+
+    worker = db.relationship('Worker', backref=db.backref('balance', uselist=False,
+                                                             cascade='all, delete-orphan'))
+
+    @hybrid_property
+    def current_balance(self):
+        days_worked = max(0, (now_utc().date() - self.period_start).days)
+        return max(0, round(days_worked * self.daily_rate + self.adjustments, 2))
+
+    @current_balance.inplace.expression
+    @classmethod
+    def _current_balance_expression(cls):
+        days_worked = func.max(0, func.cast(func.julianday(func.date('now')) - func.julianday(cls.period_start), db.Integer))
+        return func.max(0, func.round(days_worked * cls.daily_rate + cls.adjustments, 2))
+
+class PayrollRun(db.Model):
+    """دفعة رواتب جماعية: تدفع لكل العمال النشطين في معاملة واحدة (payroll.py)"""
+    __tablename__ = 'payroll_run'
+    id = db.Column(db.Integer, primary_key=True)
+    period_end = db.Column(db.Date, nullable=False)  # آخر يوم في الفترة المدفوعة
+    payment_method = db.Column(db.String(50), default='نقدي')
+    notes = db.Column(db.Text)
+    worker_count = db.Column(db.Integer, default=0)
+    total_net = db.Column(db.Float, default=0.0)
+    created_by = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=now_utc)
+
+    periods = db.relationship('PayrollPeriod', backref='run', lazy=True)
+
+class PayrollPeriod(db.Model):
+    """فترة راتب مدفوعة لعامل واحد بأرقامها المفصلة (دفعة جماعية أو دفع فردي)"""
+    __tablename__ = 'payroll_period'
+    __table_args__ = (
+        db.Index('ix_payroll_period_worker_id_period_end', 'worker_id', 'period_end'),
+        db.Index('ix_payroll_period_period_end', 'period_end'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('payroll_run.id'), index=True)  # فارغ للدفع الفردي
+    worker_id = db.Column(db.Integer, db.ForeignKey('worker.id'))
+    period_start = db.Column(db.Date, nullable=False)
+    period_end = db.Column(db.Date, nullable=False)
+    days_worked = db.Column(db.Integer, default=0)
+    daily_rate = db.Column(db.Float, default=0.0)
+    base = db.Column(db.Float, default=0.0)  # أيام العمل × الأجر اليومي
+    bonuses = db.Column(db.Float, default=0.0)  # العمل الخارجي والتحفيزات
+    deductions = db.Column(db.Float, default=0.0)  # التسبيقات والغيابات والتأخر
+    net = db.Column(db.Float, default=0.0)  # المستحق عند الدفع
+    paid_amount = db.Column(db.Float, default=0.0)
+    created_at = db.Column(db.DateTime, default=now_utc)
+
+    worker = db.relationship('Worker', backref='payroll_periods')
+
 class WorkerAttendance(db.Model):
     __tablename__ = 'worker_attendance'
-    __table_args__ = {'extend_existing': True}
+    # سجل حضور واحد لكل عامل في اليوم (رفع الدفعات يحدّث السجل بدلاً من تكراره)
+    __table_args__ = (
+        db.Index('uq_worker_attendance_worker_date', 'worker_id', 'date', unique=True),
+        {'extend_existing': True},
+    )
     id = db.Column(db.Integer, primary_key=True)
     worker_id = db.Column(db.Integer, db.ForeignKey('worker.id'))
     date = db.Column(db.Date, default=lambda: now_utc().date())
@@ -183,6 +279,15 @@ class Expense(db.Model):
     def calculated_total(self):
         return self.quantity * self.unit_price
 
+class ExpenseRollup(db.Model):
+    """مجاميع المصاريف لكل (شهر، تصنيف، مورد)، تُحدَّث مع كل كتابة (expense_rollup.py)"""
+    __tablename__ = 'expense_rollup'
+    month = db.Column(db.String(7), primary_key=True)  # YYYY-MM من purchase_date، فارغ إذا غاب التاريخ
+    category_id = db.Column(db.Integer, primary_key=True, default=0)  # 0 = بدون تصنيف
+    supplier_id = db.Column(db.Integer, primary_key=True, default=0)  # 0 = بدون مورد
+    total = db.Column(db.Float, default=0.0)
+    expense_count = db.Column(db.Integer, default=0)
+
 class ProductPriceHistory(db.Model):
     __tablename__ = 'product_price_history'
     id = db.Column(db.Integer, primary_key=True)
@@ -195,6 +300,29 @@ class ProductPriceHistory(db.Model):
     
     supplier = db.relationship('Supplier', backref='price_history')
 
+class ProductName(db.Model):
+    """أسماء المنتجات المميزة من الكتالوج وسجل الأسعار، مفهرسة بـ FTS5 للبحث (product_search.py)"""
+    __tablename__ = 'product_name'
+    id = db.Column(db.Integer, primary_key=True)  # rowid في product_name_fts
+    name = db.Column(db.String(200), unique=True, nullable=False)
+    product_id = db.Column(db.Integer)  # منتج الكتالوج بنفس الاسم إن وجد
+    category_id = db.Column(db.Integer)
+    price_count = db.Column(db.Integer, default=0)  # عدد الأسعار المسجلة بهذا الاسم
+
+class SupplierPrice(db.Model):
+    """آخر سعر لكل (منتج، مورد) مع آخر الأسعار للاتجاه، يُحدَّث مع كل سعر مسجل (supplier_prices.py)"""
+    __tablename__ = 'supplier_price'
+    product_name = db.Column(db.String(200), primary_key=True)
+    supplier_id = db.Column(db.Integer, primary_key=True, default=0)  # 0 = بدون مورد
+    price = db.Column(db.Float, default=0.0)  # آخر سعر
+    purchase_date = db.Column(db.Date)
+    history_id = db.Column(db.Integer)  # صف آخر سعر في product_price_history
+    recent_prices = db.Column(db.JSON)  # آخر الأسعار، الأحدث أولاً: [{"date": ..., "price": ...}]
+    min_price = db.Column(db.Float, default=0.0)
+    max_price = db.Column(db.Float, default=0.0)
+    price_count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=now_utc)
+
 # ========================
 # 🏢 قسم الموردين
 # ========================
@@ -269,7 +397,9 @@ class TransportReceipt(db.Model):
     original_filename = db.Column(db.String(255), nullable=False)
     file_size = db.Column(db.Integer)
     mime_type = db.Column(db.String(100))
-    image_data = db.Column(db.LargeBinary)
+    image_data = db.deferred(db.Column(db.LargeBinary))  # قديم - الصور الجديدة تُحفظ على القرص، لا يُحمَّل إلا عند الطلب
+    content_hash = db.Column(db.String(64), index=True)  # بصمة SHA-256 للملف في مخزن الفواتير
+    processing_status = db.Column(db.String(20), default='ready')  # processing / ready / failed
     captured_at = db.Column(db.DateTime, default=now_utc)
     captured_by = db.Column(db.String(50), nullable=False)
     
@@ -311,6 +441,10 @@ class Transport(db.Model):
 
 class Debt(db.Model):
     __tablename__ = 'debt'
+    # دين تلقائي واحد فقط لكل مصدر (الديون اليدوية مصدرها NULL)
+    __table_args__ = (
+        db.Index('uq_debt_source', 'source_type', 'source_id', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(40))
@@ -400,7 +534,9 @@ class ExpenseReceipt(db.Model):
     file_path = db.Column(db.String(500))
     file_size = db.Column(db.Integer)  # حجم الملف بالبايت
     mime_type = db.Column(db.String(100))
-    image_data = db.Column(db.LargeBinary)  # تخزين الصورة كبيانات ثنائية
+    image_data = db.deferred(db.Column(db.LargeBinary))  # قديم - الصور الجديدة تُحفظ على القرص، لا يُحمَّل إلا عند الطلب
+    content_hash = db.Column(db.String(64), index=True)  # بصمة SHA-256 للملف في مخزن الفواتير
+    processing_status = db.Column(db.String(20), default='ready')  # processing / ready / failed
     captured_at = db.Column(db.DateTime, default=now_utc)
     captured_by = db.Column(db.String(50), nullable=False)
     
@@ -457,4 +593,32 @@ class AdvancedStatistic(db.Model):
     trend = db.Column(db.String(20))  # up, down, stable
     trend_percentage = db.Column(db.Float)
     
-    calculated_at = db.Column(db.DateTime, default=now_utc)
\ No newline at end of file
+    calculated_at = db.Column(db.DateTime, default=now_utc)
+
+# ========================
+# 🔄 سجل التغييرات لمزامنة تطبيق العمال
+# ========================
+
+class ChangeLog(db.Model):
+    __tablename__ = 'change_log'
+    # AUTOINCREMENT: التسلسل لا يُعاد استخدامه بعد الحذف فيبقى تصاعدياً دائماً
+    __table_args__ = (
+        db.Index('ix_change_log_worker_id_id', 'worker_id', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+    id = db.Column(db.Integer, primary_key=True)  # رقم التسلسل (seq)
+    worker_id = db.Column(db.Integer)  # العامل الذي يخصه التغيير
+    entity = db.Column(db.String(30), nullable=False)  # order, order_history, worker, worker_history, attendance
+    entity_id = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.String(10), default='upsert')  # upsert / delete
+    changed_at = db.Column(db.DateTime, default=now_utc)
+
+
+class AttendanceUploadKey(db.Model):
+    """مفاتيح عدم التكرار (idempotency keys) لتسجيلات الحضور المرفوعة من التطبيق"""
+    __tablename__ = 'attendance_upload_key'
+    # المفتاح فريد داخل تسجيلات العامل الواحد فقط، فأجهزة العمال قد تولد نفس المفتاح
+    worker_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    key = db.Column(db.String(64), primary_key=True)  # يولده التطبيق لكل تسجيل
+    attendance_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=now_utc)
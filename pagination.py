@@ -0,0 +1,75 @@
+# pagination.py
+"""ترقيم الصفحات بالمؤشر (keyset) على (created_at, id)
+
+بدلاً من OFFSET الذي يمسح كل الصفوف السابقة، نحتفظ بآخر (created_at, id)
+معروض ونطلب الصفوف التي تليه مباشرة عبر الفهرس، فتكون تكلفة أي صفحة ثابتة.
+"""
+import base64
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from models import SystemSettings
+
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor', 'prev_cursor', 'per_page'])
+
+DEFAULT_ROWS_PER_PAGE = 25
+MAX_ROWS_PER_PAGE = 500
+
+
+def get_rows_per_page():
+    """عدد الصفوف في الصفحة حسب إعدادات النظام"""
+    settings = SystemSettings.query.with_entities(SystemSettings.rows_per_page).first()
+    per_page = settings[0] if settings and settings[0] else DEFAULT_ROWS_PER_PAGE
+    return max(1, min(per_page, MAX_ROWS_PER_PAGE))
+
+
+def encode_cursor(created_at, row_id):
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """فك المؤشر، ويرجع None إذا كان غير صالح"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def paginate_keyset(query, model, after=None, before=None, per_page=None):
+    """جلب صفحة مرتبة تنازلياً على (created_at, id)
+
+    after: مؤشر آخر صف في الصفحة السابقة (الصفحة التالية)
+    before: مؤشر أول صف في الصفحة الحالية (الصفحة السابقة)
+    """
+    per_page = per_page or get_rows_per_page()
+    key = tuple_(model.created_at, model.id)
+
+    after_key = decode_cursor(after)
+    before_key = decode_cursor(before) if not after_key else None
+
+    if before_key:
+        # نقرأ تصاعدياً من المؤشر ثم نعكس النتيجة لنحافظ على الترتيب التنازلي
+        rows = (query.filter(key > before_key)
+                .order_by(model.created_at.asc(), model.id.asc())
+                .limit(per_page + 1).all())
+        has_more = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_prev, has_next = has_more, True
+    else:
+        if after_key:
+            query = query.filter(key < after_key)
+        rows = (query.order_by(model.created_at.desc(), model.id.desc())
+                .limit(per_page + 1).all())
+        items = rows[:per_page]
+        has_prev, has_next = bool(after_key), len(rows) > per_page
+
+    next_cursor = encode_cursor(items[-1].created_at, items[-1].id) if items and has_next else None
+    prev_cursor = encode_cursor(items[0].created_at, items[0].id) if items and has_prev else None
+    return KeysetPage(items, next_cursor, prev_cursor, per_page)
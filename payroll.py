@@ -0,0 +1,230 @@
+# payroll.py
+"""الرصيد الجاري لرواتب العمال (worker_balance)
+
+بدلاً من إعادة حساب Worker.total_salary من كل الحقول، يحتفظ كل عامل بصف
+رصيد: بداية الفترة، الأجر اليومي، ومجموع التعديلات (المكافآت والتحفيزات
+ناقص التسبيقات والغيابات والتأخر). الرصيد الحالي:
+    max(0, أيام الفترة × الأجر اليومي + التعديلات)
+
+الصف يُحدَّث تدريجياً عبر أحداث SQLAlchemy على Worker: كل تغيير في الحقول
+يضيف فرقه فقط (UPDATE ... SET adjustments = adjustments + :delta) في نفس
+المعاملة، مهما كان المسار الذي غيّره. دفع الراتب يبدأ فترة جديدة فيُعاد حساب
+الصف كاملاً. verify_balances يقارن الرصيد بإعادة الحساب الكاملة بـ SQL.
+
+دفعات الرواتب الجماعية (run_payroll) تقرأ أرصدة كل العمال النشطين باستعلام
+واحد وتدفعها في معاملة واحدة، وتحفظ كل فترة مدفوعة بأرقامها المفصلة في
+payroll_period (البداية، النهاية، الأساسي، الخصومات، المكافآت، الصافي).
+"""
+import math
+from datetime import datetime
+
+from sqlalchemy import delete, event, insert, select, update
+
+from change_log import log_changes
+from models import db, now_utc, LATE_HOUR_PENALTY, PayrollPeriod, PayrollRun, Worker, WorkerBalance, WorkerHistory
+
+BALANCE_FIELDS = ('start_date', 'monthly_salary', 'absences', 'outside_work_bonus',
+                  'incentives', 'advances', 'late_hours')
+
+
+def _adjustments(values):
+    daily_rate = (values['monthly_salary'] or 0) / 30.0
+    return ((values['outside_work_bonus'] or 0)
+            + (values['incentives'] or 0)
+            - (values['advances'] or 0)
+            - (values['absences'] or 0) * daily_rate
+            - (values['late_hours'] or 0) * LATE_HOUR_PENALTY)
+
+
+def _period_start(start_date):
+    return start_date.date() if isinstance(start_date, datetime) else start_date
+
+
+def _balance_row(values):
+    return {
+        'period_start': _period_start(values['start_date']),
+        'daily_rate': (values['monthly_salary'] or 0) / 30.0,
+        'adjustments': _adjustments(values),
+        'updated_at': now_utc(),
+    }
+
+
+def _current_values(worker):
+    return {field: getattr(worker, field) for field in BALANCE_FIELDS}
+
+
+def period_breakdown(values, period_end):
+    """أرقام فترة الراتب عند period_end بنفس معادلة Worker.total_salary"""
+    period_start = _period_start(values['start_date'])
+    daily_rate = (values['monthly_salary'] or 0) / 30.0
+    days_worked = max(0, (period_end - period_start).days)
+    base = days_worked * daily_rate
+    bonuses = (values['outside_work_bonus'] or 0) + (values['incentives'] or 0)
+    deductions = ((values['advances'] or 0)
+                  + (values['absences'] or 0) * daily_rate
+                  + (values['late_hours'] or 0) * LATE_HOUR_PENALTY)
+    return {
+        'period_start': period_start,
+        'period_end': period_end,
+        'days_worked': days_worked,
+        'daily_rate': daily_rate,
+        'base': round(base, 2),
+        'bonuses': round(bonuses, 2),
+        'deductions': round(deductions, 2),
+        'net': max(0, round(base + bonuses - deductions, 2)),
+    }
+
+
+def worker_period(worker, period_end):
+    return period_breakdown(_current_values(worker), period_end)
+
+
+# ========================
+# 🔔 أحداث العامل
+# ========================
+
+@event.listens_for(Worker, 'after_insert')
+def _worker_inserted(mapper, connection, target):
+    connection.execute(insert(WorkerBalance.__table__).values(
+        worker_id=target.id, **_balance_row(_current_values(target))
+    ))
+
+
+@event.listens_for(Worker, 'after_update')
+def _worker_updated(mapper, connection, target):
+    state = db.inspect(target)
+    new = _current_values(target)
+    old = {}
+    changed = False
+    full_recompute = False
+    for field in BALANCE_FIELDS:
+        history = state.attrs[field].history
+        if not history.has_changes():
+            old[field] = new[field]
+            continue
+        changed = True
+        if history.deleted:
+            old[field] = history.deleted[0]
+        else:
+            # القيمة القديمة لم تكن محملة، فلا يمكن حساب الفرق
+            full_recompute = True
+    if not changed:
+        return
+
+    table = WorkerBalance.__table__
+    row = _balance_row(new)
+    if not full_recompute and _period_start(old['start_date']) == row['period_start']:
+        # نفس الفترة: نضيف الفرق فقط
+        row['adjustments'] = table.c.adjustments + (row['adjustments'] - _adjustments(old))
+
+    result = connection.execute(update(table).where(table.c.worker_id == target.id).values(**row))
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(worker_id=target.id, **_balance_row(new)))
+
+
+# ========================
+# 🔍 إعادة البناء والتحقق
+# ========================
+
+def rebuild_balances(connection=None):
+    """إعادة حساب كل الأرصدة من حقول العمال باستعلام واحد، ويرجع عدد الصفوف"""
+    connection = connection or db.session.connection()
+    table = WorkerBalance.__table__
+    connection.execute(delete(table))
+    daily_rate = Worker.monthly_salary / 30.0
+    adjustments = (Worker.outside_work_bonus + Worker.incentives - Worker.advances
+                   - Worker.absences * daily_rate - Worker.late_hours * LATE_HOUR_PENALTY)
+    return connection.execute(insert(table).from_select(
+        ['worker_id', 'period_start', 'daily_rate', 'adjustments', 'updated_at'],
+        select(Worker.id, Worker.start_date, daily_rate, adjustments, db.literal(now_utc()))
+        .where(Worker.start_date.isnot(None))
+    )).rowcount
+
+
+def verify_balances(tolerance=0.01):
+    """مقارنة الرصيد الجاري مع إعادة الحساب الكاملة، ويرجع قائمة الفروقات
+
+    كل عنصر (رقم العامل، الاسم، المحسوب، الرصيد أو None إذا غاب الصف).
+    """
+    rows = db.session.execute(
+        select(Worker.id, Worker.name, Worker.total_salary, WorkerBalance.current_balance)
+        .outerjoin(WorkerBalance, WorkerBalance.worker_id == Worker.id)
+        .order_by(Worker.id)
+    ).all()
+    return [(worker_id, name, expected, balance)
+            for worker_id, name, expected, balance in rows
+            if balance is None or not math.isclose(expected, balance, abs_tol=tolerance)]
+
+
+# ========================
+# 💵 دفعات الرواتب الجماعية
+# ========================
+
+def snapshot_payroll(db_session, period_end, worker_ids=None):
+    """مستحقات كل العمال النشطين عند period_end باستعلام واحد، مرتبة بالاسم"""
+    query = select(Worker.id, Worker.name, *(getattr(Worker, field) for field in BALANCE_FIELDS)).where(
+        Worker.is_active == True, Worker.start_date <= period_end
+    ).order_by(Worker.name, Worker.id)
+    if worker_ids is not None:
+        query = query.where(Worker.id.in_(worker_ids))
+    return [{'worker_id': row.id, 'name': row.name, **period_breakdown(row._mapping, period_end)}
+            for row in db_session.execute(query)]
+
+
+def run_payroll(db_session, period_end, worker_ids=None, payment_method='نقدي', notes='', created_by=None):
+    """دفع رواتب الفترة في معاملة واحدة، ويرجع ملخص الدفعة بقيم عادية
+
+    كل عامل مستحق يُدفع له صافيه وتبدأ فترته الجديدة من period_end، ومن
+    مستحقه 0 يبقى على فترته. الكتابات جماعية (صف الدفعة، صفوف الفترات، سجل
+    العمال، تصفير الحقول) فلا تمر بأحداث Worker، لذلك يُحدَّث الرصيد وسجل
+    التغييرات هنا. الحفظ (commit) على المستدعي.
+    """
+    snapshot = snapshot_payroll(db_session, period_end, worker_ids)
+    payable = [row for row in snapshot if row['net'] > 0]
+    skipped = [row['worker_id'] for row in snapshot if row['net'] <= 0]
+    if not payable:
+        return {'run_id': None, 'worker_count': 0, 'total_net': 0.0, 'paid': [], 'skipped': skipped}
+
+    connection = db_session.connection()
+    now = now_utc()
+    total_net = round(sum(row['net'] for row in payable), 2)
+    run_id = connection.execute(insert(PayrollRun.__table__).values(
+        period_end=period_end, payment_method=payment_method, notes=notes,
+        worker_count=len(payable), total_net=total_net, created_by=created_by, created_at=now
+    )).inserted_primary_key[0]
+
+    period_fields = ('period_start', 'period_end', 'days_worked', 'daily_rate', 'base', 'bonuses', 'deductions', 'net')
+    connection.execute(insert(PayrollPeriod.__table__), [
+        {'run_id': run_id, 'worker_id': row['worker_id'], 'paid_amount': row['net'], 'created_at': now,
+         **{field: row[field] for field in period_fields}}
+        for row in payable
+    ])
+
+    history = WorkerHistory.__table__
+    history_ids = connection.execute(insert(history).returning(history.c.id, history.c.worker_id), [
+        {'worker_id': row['worker_id'], 'change_type': 'دفع راتب', 'amount': -row['net'], 'timestamp': now,
+         'details': f"دفعة رواتب #{run_id}: تم دفع راتب بقيمة {row['net']:.2f} دج. طريقة الدفع: {payment_method}. "
+                    f"{notes} | بداية فترة جديدة من: {period_end.strftime('%Y-%m-%d')}"}
+        for row in payable
+    ]).all()
+
+    ids = [row['worker_id'] for row in payable]
+    workers = Worker.__table__
+    connection.execute(update(workers).where(workers.c.id.in_(ids)).values(
+        start_date=period_end, absences=0, outside_work_days=0, outside_work_bonus=0,
+        advances=0, incentives=0, late_hours=0
+    ))
+    balances = WorkerBalance.__table__
+    connection.execute(update(balances).where(balances.c.worker_id.in_(ids)).values(
+        period_start=period_end, adjustments=0, updated_at=now
+    ))
+    log_changes(connection, 'worker', [(worker_id, worker_id) for worker_id in ids])
+    log_changes(connection, 'worker_history', [tuple(row) for row in history_ids])
+
+    return {
+        'run_id': run_id,
+        'worker_count': len(payable),
+        'total_net': total_net,
+        'paid': [{'worker_id': row['worker_id'], 'name': row['name'], 'net': row['net']} for row in payable],
+        'skipped': skipped,
+    }
@@ -0,0 +1,245 @@
+# product_search.py
+"""البحث في أسماء المنتجات والإكمال التلقائي (FTS5)
+
+البحث القديم ilike('%x%') يمسح كل سجل الأسعار. هنا كل اسم مميز من الكتالوج
+(product.name) ومن سجل الأسعار (product_price_history.product_name) له صف
+واحد في product_name، يُحدَّث عبر أحداث SQLAlchemy في نفس المعاملة، ومفهرس
+في جدول FTS5 خارجي المحتوى (product_name_fts) تزامنه مشغلات SQLite.
+
+البحث بالبادئة على كل كلمة في الاسم ("اسم 42" يطابق "اسمنت CPJ 42.5")،
+والترتيب: الاسم الذي يبدأ بالنص، ثم تصنيف المنتج المختار، ثم bm25، ثم عدد
+الأسعار المسجلة. إذا لم يكن FTS5 متاحاً في SQLite يُستعمل LIKE على البادئة.
+"""
+from sqlalchemy import delete, event, select, text, union_all, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload
+
+from models import db, track_old_values, Product, ProductName, ProductPriceHistory
+from supplier_prices import latest_prices
+
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+
+FTS_TABLE = 'product_name_fts'
+
+_FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, content='product_name', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_name_ai AFTER INSERT ON product_name BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_name_ad AFTER DELETE ON product_name BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_name_au AFTER UPDATE OF name ON product_name BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+    END""",
+]
+
+_SEARCH_SQL = text(f"""
+    SELECT pn.id, pn.name, pn.product_id, pn.category_id, pn.price_count
+    FROM {FTS_TABLE}
+    JOIN product_name pn ON pn.id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH :match
+    ORDER BY pn.name LIKE :prefix ESCAPE '\\' DESC,
+             COALESCE(pn.category_id = :category_id, 0) DESC,
+             {FTS_TABLE}.rank, pn.price_count DESC, pn.name
+    LIMIT :limit
+""")
+
+
+def create_search_index(connection):
+    """إنشاء جدول FTS5 ومشغلاته، ويرجع False إذا لم يكن FTS5 مدمجاً في SQLite"""
+    try:
+        for statement in _FTS_SCHEMA:
+            connection.execute(text(statement))
+    except OperationalError as e:
+        print(f"⚠️ FTS5 غير متاح، البحث في المنتجات بالبادئة فقط: {e}")
+        return False
+    return True
+
+
+# ========================
+# 🔔 أحداث المنتجات وسجل الأسعار
+# ========================
+
+def _upsert_name(connection, name, **values):
+    if not name:
+        return
+    table = ProductName.__table__
+    statement = sqlite_insert(table).values(name=name, **values)
+    if 'price_count' in values:
+        set_ = {'price_count': table.c.price_count + statement.excluded.price_count}
+    else:
+        set_ = {'product_id': statement.excluded.product_id, 'category_id': statement.excluded.category_id}
+    connection.execute(statement.on_conflict_do_update(index_elements=[table.c.name], set_=set_))
+
+
+def _drop_orphan(connection, name):
+    table = ProductName.__table__
+    connection.execute(delete(table).where(
+        table.c.name == name, table.c.product_id.is_(None), table.c.price_count <= 0
+    ))
+
+
+def _release_product(connection, name, product_id):
+    table = ProductName.__table__
+    connection.execute(update(table).where(table.c.name == name, table.c.product_id == product_id)
+                       .values(product_id=None, category_id=None))
+    _drop_orphan(connection, name)
+
+
+def _add_prices(connection, name, count):
+    if not name:
+        return
+    _upsert_name(connection, name, price_count=count)
+    if count < 0:
+        _drop_orphan(connection, name)
+
+
+def _old_value(target, field):
+    history = db.inspect(target).attrs[field].history
+    return history.deleted[0] if history.deleted else getattr(target, field)
+
+
+track_old_values(Product.name, Product.category_id, ProductPriceHistory.product_name)
+
+
+@event.listens_for(Product, 'after_insert')
+def _product_inserted(mapper, connection, target):
+    _upsert_name(connection, target.name, product_id=target.id, category_id=target.category_id)
+
+
+@event.listens_for(Product, 'after_update')
+def _product_updated(mapper, connection, target):
+    old_name = _old_value(target, 'name')
+    if old_name == target.name and _old_value(target, 'category_id') == target.category_id:
+        return
+    if old_name != target.name:
+        _release_product(connection, old_name, target.id)
+    _upsert_name(connection, target.name, product_id=target.id, category_id=target.category_id)
+
+
+@event.listens_for(Product, 'after_delete')
+def _product_deleted(mapper, connection, target):
+    _release_product(connection, target.name, target.id)
+
+
+@event.listens_for(ProductPriceHistory, 'after_insert')
+def _price_inserted(mapper, connection, target):
+    _add_prices(connection, target.product_name, 1)
+
+
+@event.listens_for(ProductPriceHistory, 'after_update')
+def _price_updated(mapper, connection, target):
+    old_name = _old_value(target, 'product_name')
+    if old_name != target.product_name:
+        _add_prices(connection, old_name, -1)
+        _add_prices(connection, target.product_name, 1)
+
+
+@event.listens_for(ProductPriceHistory, 'after_delete')
+def _price_deleted(mapper, connection, target):
+    _add_prices(connection, target.product_name, -1)
+
+
+# ========================
+# 🔍 البحث
+# ========================
+
+def _match_expression(query):
+    """كل كلمة بادئة: "اسم"* "42"* (علامات التنصيص مضاعفة داخل الكلمة)"""
+    words = query.split()
+    return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+def _like_prefix(query):
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"{escaped}%"
+
+
+def search_names(query, category_id=None, limit=AUTOCOMPLETE_LIMIT):
+    """الأسماء المطابقة مرتبة، كل عنصر {name, product_id, category_id, price_count}"""
+    query = (query or '').strip()
+    if not query:
+        return []
+    limit = max(1, min(limit, MAX_AUTOCOMPLETE_LIMIT))
+    params = {'match': _match_expression(query), 'prefix': _like_prefix(query),
+              'category_id': category_id, 'limit': limit}
+    try:
+        rows = db.session.execute(_SEARCH_SQL, params).all()
+    except OperationalError:
+        # قاعدة بدون FTS5: بادئة الاسم كاملاً فقط
+        rows = db.session.execute(
+            select(ProductName.id, ProductName.name, ProductName.product_id,
+                   ProductName.category_id, ProductName.price_count)
+            .where(ProductName.name.like(params['prefix'], escape='\\'))
+            .order_by(ProductName.price_count.desc(), ProductName.name)
+            .limit(limit)
+        ).all()
+    return [{'name': row.name, 'product_id': row.product_id, 'category_id': row.category_id,
+             'price_count': row.price_count} for row in rows]
+
+
+def recent_prices(names, limit=10):
+    """آخر limit سعر لأي من الأسماء، مع المورد في نفس الاستعلام
+
+    آخر limit لكل اسم على فهرس (product_name, purchase_date) ثم دمجها، بدلاً من
+    ترتيب كل أسعار الأسماء المطابقة.
+    """
+    if not names:
+        return []
+    history = ProductPriceHistory
+    per_name = [
+        select(select(history.id, history.purchase_date)
+               .where(history.product_name == name)
+               .order_by(history.purchase_date.desc(), history.id.desc())
+               .limit(limit).subquery())
+        for name in names
+    ]
+    latest = union_all(*per_name).subquery() if len(per_name) > 1 else per_name[0].subquery()
+    ids = select(latest.c.id).order_by(latest.c.purchase_date.desc(), latest.c.id.desc()).limit(limit)
+    return (history.query.options(joinedload(history.supplier))
+            .filter(history.id.in_(ids))
+            .order_by(history.purchase_date.desc(), history.id.desc())
+            .all())
+
+
+def autocomplete(query, category_id=None, limit=AUTOCOMPLETE_LIMIT):
+    """الأسماء المطابقة مع آخر سعر لكل مورد (supplier_price): استعلامان مهما كبر سجل الأسعار"""
+    results = search_names(query, category_id, limit)
+    prices = latest_prices([result['name'] for result in results if result['price_count']])
+    for result in results:
+        result['prices'] = prices.get(result['name'], [])
+        result['best_price'] = min((price['price'] for price in result['prices']), default=None)
+    return results
+
+
+# ========================
+# 🔧 إعادة البناء
+# ========================
+
+def rebuild_search_index(connection=None):
+    """إعادة بناء product_name من الكتالوج وسجل الأسعار ثم فهرس FTS5، ويرجع عدد الأسماء"""
+    connection = connection or db.session.connection()
+    connection.execute(delete(ProductName.__table__))
+    built = connection.execute(text("""
+        INSERT INTO product_name (name, product_id, category_id, price_count)
+        SELECT name, MAX(product_id), MAX(category_id), SUM(price_count)
+        FROM (
+            SELECT name, id AS product_id, category_id, 0 AS price_count
+            FROM product WHERE name <> ''
+            UNION ALL
+            SELECT product_name, NULL, NULL, COUNT(*)
+            FROM product_price_history WHERE product_name <> ''
+            GROUP BY product_name
+        )
+        GROUP BY name
+    """)).rowcount
+    if create_search_index(connection):
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    return built
@@ -0,0 +1,203 @@
+# receipt_pool.py
+"""ضغط صور الفواتير في الخلفية عبر مجموعة عمليات (process pool)
+
+المسار يحفظ الملف كما رُفع ويرجع رقم الفاتورة فوراً بحالة 'processing'،
+وبعد حفظ الفاتورة في القاعدة تضغط إحدى العمليات الصورة وتولد نسخها
+المصغرة، فيستبدل الملف المضغوط الأصلي وتصبح الحالة 'ready' (أو 'failed'
+ويبقى الأصل معروضاً).
+
+عدد الصور المعلقة محدود: إذا امتلأت القائمة ينتظر المسار قليلاً ثم يرفض
+الرفع (IngestQueueFull) بدلاً من تكديس الصور في الذاكرة.
+"""
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app, jsonify
+from sqlalchemy import event, inspect, select, update
+
+from attachments import RECEIPT_MODELS, blob_path, release_blob, store_blob, store_variants, variant_path
+from imaging import process_receipt_file, variants_for_file
+from models import db
+
+PROCESSING = 'processing'
+READY = 'ready'
+FAILED = 'failed'
+
+_PENDING_KEY = 'pending_receipts'
+
+
+class IngestQueueFull(Exception):
+    """قائمة ضغط الصور ممتلئة"""
+
+
+def busy_response():
+    """رد 503 عند امتلاء قائمة المعالجة"""
+    response = jsonify({"success": False, "error": "الخادم مشغول بمعالجة صور أخرى، أعد المحاولة بعد قليل"})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
+
+
+class ReceiptPool:
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.extensions.get('receipt_pool') is self:
+            return
+        app.config.setdefault('RECEIPT_POOL_WORKERS', 2)
+        app.config.setdefault('RECEIPT_POOL_MAX_PENDING', 16)
+        app.config.setdefault('RECEIPT_POOL_SUBMIT_TIMEOUT', 2.0)
+        self.app = app
+        self._slots = threading.BoundedSemaphore(app.config['RECEIPT_POOL_MAX_PENDING'])
+        app.extensions['receipt_pool'] = self
+        atexit.register(self.shutdown)
+
+    def _get_executor(self):
+        # العمليات تُنشأ عند أول رفع فقط، لا عند استيراد التطبيق
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.app.config['RECEIPT_POOL_WORKERS'])
+            return self._executor
+
+    def reserve(self):
+        """حجز مكان في القائمة، مع الانتظار حتى RECEIPT_POOL_SUBMIT_TIMEOUT ثانية"""
+        if not self._slots.acquire(timeout=self.app.config['RECEIPT_POOL_SUBMIT_TIMEOUT']):
+            raise IngestQueueFull()
+
+    def release(self):
+        self._slots.release()
+
+    def submit(self, table, receipt_id, raw_hash):
+        """إرسال فاتورة محفوظة للضغط (المكان محجوز مسبقاً بـ reserve)"""
+        try:
+            future = self._get_executor().submit(process_receipt_file, blob_path(raw_hash))
+        except Exception:
+            self.release()
+            raise
+        future.add_done_callback(lambda done: self._finish(done, table, receipt_id, raw_hash))
+
+    def _finish(self, future, table, receipt_id, raw_hash):
+        try:
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ خطأ في ضغط الفاتورة {table.name}#{receipt_id}: {e}")
+                result = None
+            with self.app.app_context():
+                apply_result(table, receipt_id, raw_hash, result)
+        except Exception as e:
+            print(f"❌ خطأ في حفظ الفاتورة المضغوطة {table.name}#{receipt_id}: {e}")
+        finally:
+            self.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+receipt_pool = ReceiptPool()
+
+
+def apply_result(table, receipt_id, raw_hash, result):
+    """تسجيل نتيجة الضغط (الصورة المضغوطة، النسخ) وحذف الملف الأصلي إذا لم يعد مستخدماً"""
+    if result is None:
+        values = {'processing_status': FAILED}
+    else:
+        data, variants = result
+        content_hash = store_blob(data)
+        store_variants(content_hash, variants)
+        values = {
+            'content_hash': content_hash,
+            'file_size': len(data),
+            'mime_type': 'image/jpeg',
+            'processing_status': READY,
+        }
+    db.session.execute(update(table).where(table.c.id == receipt_id).values(**values))
+    db.session.commit()
+    if values.get('content_hash', raw_hash) != raw_hash:
+        release_blob(raw_hash)
+
+
+def queue_receipt(receipt, data):
+    """حفظ الملف الأصلي وإضافة الفاتورة بحالة 'processing'
+
+    الضغط يبدأ بعد commit فقط، وإذا أُلغيت المعاملة يُحرَّر المكان المحجوز.
+    """
+    pool = current_app.extensions['receipt_pool']
+    pool.reserve()
+    try:
+        receipt.content_hash = store_blob(data)
+    except Exception:
+        pool.release()
+        raise
+    receipt.file_size = len(data)
+    receipt.processing_status = PROCESSING
+    db.session.add(receipt)
+    db.session.info.setdefault(_PENDING_KEY, []).append((receipt, receipt.content_hash))
+    return receipt
+
+
+@event.listens_for(db.session, 'after_commit')
+def _submit_pending(session):
+    for receipt, raw_hash in session.info.pop(_PENDING_KEY, []):
+        # identity متاحة بعد commit دون إعادة تحميل الصف
+        receipt_id = inspect(receipt).identity[0]
+        receipt_pool.submit(receipt.__table__, receipt_id, raw_hash)
+
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _release_abandoned(session, transaction):
+    # معاملة أُلغيت أو أُغلقت دون commit: الفواتير لم تُحفظ فنحرر أماكنها
+    if transaction.parent is None:
+        for _ in session.info.pop(_PENDING_KEY, []):
+            receipt_pool.release()
+
+
+def process_stale_receipts():
+    """ضغط الفواتير العالقة بحالة 'processing' (بعد توقف الخادم مثلاً) في العملية الحالية"""
+    processed = {}
+    for model in RECEIPT_MODELS:
+        table = model.__table__
+        rows = db.session.execute(
+            select(table.c.id, table.c.content_hash)
+            .where(table.c.processing_status == PROCESSING)
+        ).fetchall()
+        for receipt_id, raw_hash in rows:
+            try:
+                result = process_receipt_file(blob_path(raw_hash))
+            except Exception as e:
+                print(f"❌ خطأ في ضغط الفاتورة {table.name}#{receipt_id}: {e}")
+                result = None
+            apply_result(table, receipt_id, raw_hash, result)
+        processed[table.name] = len(rows)
+    return processed
+
+
+def build_missing_variants():
+    """توليد النسخ المصغرة للفواتير الجاهزة التي لا تملكها (المنقولة من القاعدة مثلاً)"""
+    built = {}
+    for model in RECEIPT_MODELS:
+        table = model.__table__
+        hashes = db.session.execute(
+            select(table.c.content_hash).distinct()
+            .where(table.c.content_hash.isnot(None), table.c.processing_status != PROCESSING)
+        ).scalars().all()
+        built[table.name] = 0
+        for content_hash in hashes:
+            if os.path.exists(variant_path(content_hash, 'thumb', 'jpeg')):
+                continue
+            try:
+                store_variants(content_hash, variants_for_file(blob_path(content_hash)))
+                built[table.name] += 1
+            except Exception as e:
+                print(f"❌ تعذر توليد النسخ المصغرة لـ {content_hash}: {e}")
+    return built
@@ -0,0 +1,151 @@
+# stats_engine.py
+"""محرك الإحصائيات لصفحتي /stats و /dashboard
+
+كل قسم يُحسب باستعلام تجميعي واحد (COUNT / SUM مع CASE) بدلاً من تحميل
+كل الكائنات وجمعها في بايثون. النتائج صفوف بسيطة (namedtuple).
+"""
+import math
+from collections import namedtuple
+
+from sqlalchemy import case, func, select
+
+from models import db, Order, Worker, Debt, Expense, Purchase
+
+OrderStats = namedtuple('OrderStats', ['total_orders', 'paid_orders', 'pending_orders', 'total_orders_amount'])
+WorkerStats = namedtuple('WorkerStats', ['total_workers', 'total_salaries', 'total_absences', 'total_outside_work_days'])
+DebtStats = namedtuple('DebtStats', ['total_debts', 'debts_unpaid', 'debts_paid', 'total_debts_amount', 'debts_paid_amount'])
+ExpenseStats = namedtuple('ExpenseStats', ['total_expenses', 'expenses_amount'])
+PurchaseStats = namedtuple('PurchaseStats', ['total_purchases', 'fixed_purchases', 'variable_purchases',
+                                             'purchases_paid', 'purchases_unpaid'])
+DashboardStats = namedtuple('DashboardStats', ['total_orders', 'total_workers', 'total_debts',
+                                               'total_expenses', 'total_purchases'])
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _sum_if(condition, value):
+    return func.coalesce(func.sum(case((condition, value), else_=0)), 0.0)
+
+
+def order_stats():
+    row = db.session.execute(select(
+        func.count(Order.id),
+        _count_if(Order.is_paid == True),
+        _count_if(Order.is_paid == False),
+        func.coalesce(func.sum(Order.total), 0.0),
+    )).one()
+    return OrderStats(*row)
+
+
+def worker_stats():
+    row = db.session.execute(select(
+        func.count(Worker.id),
+        func.coalesce(func.sum(Worker.total_salary), 0.0),
+        func.coalesce(func.sum(Worker.absences), 0.0),
+        func.coalesce(func.sum(Worker.outside_work_days), 0),
+    )).one()
+    return WorkerStats(*row)
+
+
+def debt_stats():
+    unpaid = Debt.status == 'unpaid'
+    paid = Debt.status == 'paid'
+    row = db.session.execute(select(
+        func.count(Debt.id),
+        _count_if(unpaid),
+        _count_if(paid),
+        _sum_if(unpaid, func.round(Debt.debt_amount - Debt.paid_amount, 2)),
+        _sum_if(paid, Debt.debt_amount),
+    )).one()
+    return DebtStats(*row)
+
+
+def expense_stats():
+    row = db.session.execute(select(
+        func.count(Expense.id),
+        func.coalesce(func.sum(Expense.total_amount), 0.0),
+    )).one()
+    return ExpenseStats(*row)
+
+
+def purchase_stats():
+    row = db.session.execute(select(
+        func.count(Purchase.id),
+        _count_if(Purchase.type == 'fixed'),
+        _count_if(Purchase.type == 'variable'),
+        _count_if(Purchase.status == 'paid'),
+        _count_if(Purchase.status == 'unpaid'),
+    )).one()
+    return PurchaseStats(*row)
+
+
+def dashboard_stats():
+    """عدادات لوحة التحكم في استعلام واحد"""
+    row = db.session.execute(select(
+        select(func.count(Order.id)).scalar_subquery(),
+        select(func.count(Worker.id)).scalar_subquery(),
+        select(func.count(Debt.id)).where(Debt.status == 'unpaid').scalar_subquery(),
+        select(func.count(Expense.id)).scalar_subquery(),
+        select(func.count(Purchase.id)).scalar_subquery(),
+    )).one()
+    return DashboardStats(*row)
+
+
+def stats_context():
+    """كل أرقام صفحة الإحصائيات كقاموس جاهز للقالب"""
+    context = {}
+    for section in (order_stats(), worker_stats(), debt_stats(), expense_stats(), purchase_stats()):
+        context.update(section._asdict())
+    return context
+
+
+# ========================
+# 🔍 التحقق من المطابقة مع الحساب القديم
+# ========================
+
+def legacy_stats_context():
+    """الحساب القديم في بايثون (تحميل كل الكائنات) للمقارنة فقط"""
+    orders = Order.query.all()
+    workers = Worker.query.all()
+    debts = Debt.query.all()
+    expenses = Expense.query.all()
+    purchases = Purchase.query.all()
+    return {
+        'total_orders': len(orders),
+        'paid_orders': sum(1 for o in orders if o.is_paid is True),
+        'pending_orders': sum(1 for o in orders if o.is_paid is False),
+        'total_orders_amount': sum(o.total or 0 for o in orders),
+        'total_workers': len(workers),
+        'total_salaries': sum(w.total_salary for w in workers),
+        'total_absences': sum(w.absences or 0 for w in workers),
+        'total_outside_work_days': sum(w.outside_work_days or 0 for w in workers),
+        'total_debts': len(debts),
+        'debts_unpaid': sum(1 for d in debts if d.status == 'unpaid'),
+        'debts_paid': sum(1 for d in debts if d.status == 'paid'),
+        'total_debts_amount': sum(d.remaining_amount for d in debts if d.status == 'unpaid'),
+        'debts_paid_amount': sum(d.debt_amount for d in debts if d.status == 'paid'),
+        'total_expenses': len(expenses),
+        'expenses_amount': sum(e.total_amount or 0 for e in expenses),
+        'total_purchases': len(purchases),
+        'fixed_purchases': sum(1 for p in purchases if p.type == 'fixed'),
+        'variable_purchases': sum(1 for p in purchases if p.type == 'variable'),
+        'purchases_paid': sum(1 for p in purchases if p.status == 'paid'),
+        'purchases_unpaid': sum(1 for p in purchases if p.status == 'unpaid'),
+    }
+
+
+def verify_stats(tolerance=0.01):
+    """مقارنة أرقام SQL مع الحساب القديم، ويرجع قائمة الفروقات (فارغة عند التطابق)
+
+    التقريب في SQLite قد يختلف عن round() في بايثون بقرش واحد لكل عامل.
+    """
+    new = stats_context()
+    old = legacy_stats_context()
+    mismatches = []
+    for key, expected in old.items():
+        allowed = tolerance * max(1, old['total_workers']) if key == 'total_salaries' else tolerance
+        if not math.isclose(new[key] or 0, expected or 0, abs_tol=allowed):
+            mismatches.append((key, expected, new[key]))
+    return mismatches
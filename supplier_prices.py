@@ -0,0 +1,261 @@
+# supplier_prices.py
+"""مقارنة أسعار الموردين: آخر سعر لكل (منتج، مورد) في supplier_price
+
+سجل الأسعار (product_price_history) يُضاف إليه فقط، وسؤال "أرخص سعر حالي
+لهذا المنتج" كان يعني ترتيب السجل كله. هنا لكل (اسم المنتج، المورد) صف واحد:
+آخر سعر وتاريخه، آخر RECENT_PRICES أسعار (للاتجاه)، وأدنى وأعلى سعر وعددها.
+
+تسجيل سعر جديد (add_expense مع "حفظ في سجل الأسعار") يحدّث الصف عبر أحداث
+SQLAlchemy في نفس المعاملة، مثل expense_rollup. تعديل أو حذف سعر يعيد حساب
+صف (المنتج، المورد) المعني فقط من فهرس (product_name, supplier_id, purchase_date).
+"""
+from datetime import date, datetime
+
+from sqlalchemy import delete, event, func, insert, select, update
+
+from models import db, now_utc, track_old_values, ProductPriceHistory, Supplier, SupplierPrice
+
+RECENT_PRICES = 5
+TREND_TOLERANCE = 0.01  # تغير أقل من 1% يعتبر ثباتاً
+
+PRICE_FIELDS = ('product_name', 'supplier_id', 'price', 'purchase_date')
+
+
+def _date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def _entry(history_id, price, purchase_date):
+    purchase_date = _date(purchase_date)
+    return {'id': history_id, 'price': price or 0.0,
+            'date': purchase_date.isoformat() if purchase_date else None}
+
+
+def _newest_first(entries):
+    return sorted(entries, key=lambda entry: (entry['date'] or '', entry['id']), reverse=True)[:RECENT_PRICES]
+
+
+def _row(product_name, supplier_id, recent, min_price, max_price, price_count):
+    latest = recent[0]
+    return {
+        'product_name': product_name,
+        'supplier_id': supplier_id,
+        'price': latest['price'],
+        'purchase_date': _date(latest['date']),
+        'history_id': latest['id'],
+        'recent_prices': recent,
+        'min_price': min_price,
+        'max_price': max_price,
+        'price_count': price_count,
+        'updated_at': now_utc(),
+    }
+
+
+def _key_filter(columns, product_name, supplier_id):
+    supplier = columns.supplier_id.is_(None) if supplier_id == 0 else columns.supplier_id == supplier_id
+    return (columns.product_name == product_name, supplier)
+
+
+def _refresh(connection, product_name, supplier_id):
+    """إعادة حساب صف (المنتج، المورد) من أسعاره فقط، وحذفه إذا لم يبق له سعر"""
+    if not product_name:
+        return
+    table = SupplierPrice.__table__
+    history = ProductPriceHistory.__table__
+    connection.execute(delete(table).where(table.c.product_name == product_name, table.c.supplier_id == supplier_id))
+
+    key = _key_filter(history.c, product_name, supplier_id)
+    price_count, min_price, max_price = connection.execute(
+        select(func.count(), func.min(history.c.price), func.max(history.c.price)).where(*key)
+    ).one()
+    if not price_count:
+        return
+    recent = [_entry(*row) for row in connection.execute(
+        select(history.c.id, history.c.price, history.c.purchase_date).where(*key)
+        .order_by(history.c.purchase_date.desc(), history.c.id.desc()).limit(RECENT_PRICES)
+    )]
+    connection.execute(insert(table).values(
+        **_row(product_name, supplier_id, recent, min_price, max_price, price_count)
+    ))
+
+
+# ========================
+# 🔔 أحداث سجل الأسعار
+# ========================
+
+track_old_values(*(getattr(ProductPriceHistory, field) for field in PRICE_FIELDS))
+
+
+@event.listens_for(ProductPriceHistory, 'after_insert')
+def _price_inserted(mapper, connection, target):
+    if not target.product_name:
+        return
+    table = SupplierPrice.__table__
+    supplier_id = target.supplier_id or 0
+    price = target.price or 0.0
+    entry = _entry(target.id, price, target.purchase_date)
+    current = connection.execute(select(table).where(
+        table.c.product_name == target.product_name, table.c.supplier_id == supplier_id
+    )).first()
+    if current is None:
+        connection.execute(insert(table).values(**_row(target.product_name, supplier_id, [entry], price, price, 1)))
+        return
+    row = _row(target.product_name, supplier_id, _newest_first(list(current.recent_prices or []) + [entry]),
+               min(current.min_price, price), max(current.max_price, price), current.price_count + 1)
+    connection.execute(update(table).where(
+        table.c.product_name == target.product_name, table.c.supplier_id == supplier_id
+    ).values(**row))
+
+
+@event.listens_for(ProductPriceHistory, 'after_update')
+def _price_updated(mapper, connection, target):
+    state = db.inspect(target)
+    if not any(state.attrs[field].history.has_changes() for field in PRICE_FIELDS):
+        return
+    old = {}
+    for field in ('product_name', 'supplier_id'):
+        history = state.attrs[field].history
+        old[field] = history.deleted[0] if history.deleted else getattr(target, field)
+    old_key = (old['product_name'], old['supplier_id'] or 0)
+    new_key = (target.product_name, target.supplier_id or 0)
+    _refresh(connection, *new_key)
+    if old_key != new_key:
+        _refresh(connection, *old_key)
+
+
+@event.listens_for(ProductPriceHistory, 'after_delete')
+def _price_deleted(mapper, connection, target):
+    _refresh(connection, target.product_name, target.supplier_id or 0)
+
+
+# ========================
+# 📊 المقارنة
+# ========================
+
+def _trend(recent):
+    """اتجاه السعر: آخر سعر مقارنة بالذي قبله (up / down / stable، أو None لسعر واحد)"""
+    if len(recent) < 2 or not recent[1]['price']:
+        return {'previous_price': None, 'change': None, 'change_percent': None, 'trend': None}
+    latest, previous = recent[0]['price'], recent[1]['price']
+    change = latest - previous
+    ratio = change / previous
+    trend = 'stable' if abs(ratio) < TREND_TOLERANCE else ('up' if change > 0 else 'down')
+    return {'previous_price': previous, 'change': round(change, 2),
+            'change_percent': round(ratio * 100, 1), 'trend': trend}
+
+
+def _supplier_prices(names):
+    return db.session.execute(
+        select(SupplierPrice, Supplier.name.label('supplier'))
+        .outerjoin(Supplier, Supplier.id == SupplierPrice.supplier_id)
+        .where(SupplierPrice.product_name.in_(names))
+        .order_by(SupplierPrice.product_name, SupplierPrice.price, SupplierPrice.supplier_id)
+    ).all()
+
+
+def latest_prices(names):
+    """آخر سعر لكل (اسم، مورد) باستعلام واحد على supplier_price
+
+    يرجع {الاسم: [{supplier_id, supplier, price, purchase_date}, ...]} مرتبة بالسعر.
+    """
+    if not names:
+        return {}
+    prices = {}
+    for price, supplier in _supplier_prices(list(names)):
+        prices.setdefault(price.product_name, []).append({
+            'supplier_id': price.supplier_id or None,
+            'supplier': supplier or "غير معروف",
+            'price': price.price,
+            'purchase_date': price.purchase_date.isoformat() if price.purchase_date else None,
+        })
+    return prices
+
+
+def compare_suppliers(product_name, recent=RECENT_PRICES):
+    """مقارنة الموردين لمنتج: أفضل سعر حالي، وآخر الأسعار والاتجاه لكل مورد"""
+    recent = max(1, min(recent, RECENT_PRICES))
+    suppliers = []
+    for price, supplier in _supplier_prices([product_name]):
+        history = list(price.recent_prices or [])
+        suppliers.append({
+            'supplier_id': price.supplier_id or None,
+            'supplier': supplier or "غير معروف",
+            'price': price.price,
+            'purchase_date': price.purchase_date.isoformat() if price.purchase_date else None,
+            'min_price': price.min_price,
+            'max_price': price.max_price,
+            'price_count': price.price_count,
+            'recent_prices': [{'price': entry['price'], 'date': entry['date']} for entry in history[:recent]],
+            **_trend(history),
+        })
+
+    best = suppliers[0] if suppliers else None
+    for item in suppliers:
+        item['above_best_percent'] = (round((item['price'] - best['price']) / best['price'] * 100, 1)
+                                      if best['price'] else None)
+    return {'product_name': product_name, 'best': best, 'suppliers': suppliers}
+
+
+# ========================
+# 🔧 إعادة البناء والتحقق
+# ========================
+
+def _expected_rows(connection):
+    """صفوف supplier_price كما تُحسب من سجل الأسعار كاملاً (استعلامان)"""
+    history = ProductPriceHistory.__table__
+    supplier_id = func.coalesce(history.c.supplier_id, 0)
+    stats = connection.execute(
+        select(history.c.product_name, supplier_id, func.count(), func.min(history.c.price), func.max(history.c.price))
+        .where(history.c.product_name != '')
+        .group_by(history.c.product_name, supplier_id)
+    ).all()
+
+    position = func.row_number().over(
+        partition_by=(history.c.product_name, history.c.supplier_id),
+        order_by=(history.c.purchase_date.desc(), history.c.id.desc())
+    ).label('position')
+    ranked = select(history.c.id, history.c.product_name, supplier_id.label('supplier_id'),
+                    history.c.price, history.c.purchase_date, position).where(history.c.product_name != '').subquery()
+    recent = {}
+    for row in connection.execute(
+        select(ranked).where(ranked.c.position <= RECENT_PRICES)
+        .order_by(ranked.c.product_name, ranked.c.supplier_id, ranked.c.position)
+    ):
+        recent.setdefault((row.product_name, row.supplier_id), []).append(_entry(row.id, row.price, row.purchase_date))
+
+    return [_row(product_name, supplier, recent[(product_name, supplier)], min_price, max_price, price_count)
+            for product_name, supplier, price_count, min_price, max_price in stats]
+
+
+def rebuild_supplier_prices(connection=None):
+    """إعادة بناء supplier_price من سجل الأسعار، ويرجع عدد الصفوف"""
+    connection = connection or db.session.connection()
+    table = SupplierPrice.__table__
+    rows = _expected_rows(connection)
+    connection.execute(delete(table))
+    if rows:
+        connection.execute(insert(table), rows)
+    return len(rows)
+
+
+def verify_supplier_prices(tolerance=0.01):
+    """مقارنة الصفوف المخزنة بإعادة الحساب، ويرجع قائمة (المفتاح، المحسوب، المخزن)"""
+    def summary(row):
+        return (round(row['price'], 2), _date(row['purchase_date']), row['price_count'],
+                round(row['min_price'], 2), round(row['max_price'], 2),
+                tuple(entry['id'] for entry in row['recent_prices'] or []))
+
+    connection = db.session.connection()
+    expected = {(row['product_name'], row['supplier_id']): summary(row) for row in _expected_rows(connection)}
+    stored = {(row.product_name, row.supplier_id): summary(row._mapping)
+              for row in connection.execute(select(SupplierPrice.__table__))}
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        exp, got = expected.get(key), stored.get(key)
+        if exp is None or got is None or exp[1:] != got[1:] or abs(exp[0] - got[0]) > tolerance:
+            mismatches.append((key, exp, got))
+    return mismatches
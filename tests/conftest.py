@@ -0,0 +1,50 @@
+# tests/conftest.py
+"""تطبيق الاختبار على قاعدة SQLite مؤقتة
+
+رابط القاعدة يُضبط قبل استيراد app.py لأن التطبيق يُهيأ عند الاستيراد.
+القاعدة واحدة لكل الجلسة: كل اختبار ينشئ بياناته بأسماء خاصة به، ودوال
+التحقق (verify_*) تفحص ثوابت يجب أن تبقى صحيحة بعد أي تسلسل من العمليات.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TMP = tempfile.mkdtemp(prefix='manger-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_TMP, 'test.db')}"
+os.environ['METRICS_SLOW_QUERY_LOG'] = os.path.join(_TMP, 'slow_queries.log')
+
+from app import app as flask_app  # noqa: E402
+from bootstrap import init_db, seed_defaults  # noqa: E402
+from models import db  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    flask_app.config['TESTING'] = True
+    # القوالب في جذر المستودع، كما في benchmarks/bench_routes.py
+    flask_app.template_folder = ROOT
+    flask_app.config['UPLOAD_FOLDER'] = os.path.join(_TMP, 'receipts')
+    with flask_app.app_context():
+        init_db()
+        seed_defaults()
+    return flask_app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = 'admin'
+    return client
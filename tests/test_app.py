@@ -0,0 +1,90 @@
+# tests/test_app.py
+from app import create_app, lazyload_guard, receipt_pool, request_metrics, write_queue
+
+
+def _hooks(app):
+    return (len(app.before_request_funcs.get(None, [])), len(app.after_request_funcs.get(None, [])),
+            len(list(app.url_map.iter_rules())))
+
+
+def test_create_app_is_idempotent(app):
+    before = _hooks(app)
+
+    assert create_app() is app
+    for extension in (receipt_pool, write_queue, request_metrics, lazyload_guard):
+        extension.init_app(app)
+
+    assert _hooks(app) == before
+
+
+def test_invalid_listing_filters_are_ignored(client):
+    for url in ('/orders?status=abc&date_from=bad', '/orders?date_to=2024-13-40',
+                '/expenses?category=abc&date_from=bad', '/transport?type=all&category=x&date_to=bad',
+                '/export/orders?status=abc', '/export/transport?date_from=bad'):
+        response = client.get(url)
+        response.get_data()
+        response.close()
+        assert response.status_code == 200, url
+
+
+def _legacy_receipt(data):
+    from models import db, Expense, ExpenseReceipt
+
+    expense = Expense(description='فاتورة اختبار', total_amount=100, recorded_by='admin')
+    db.session.add(expense)
+    db.session.flush()
+    receipt = ExpenseReceipt(expense_id=expense.id, filename='r.jpg', original_filename='r.jpg',
+                             mime_type='image/jpeg', image_data=data, captured_by='admin')
+    db.session.add(receipt)
+    db.session.commit()
+    return receipt.id
+
+
+def _get(client, url, **headers):
+    response = client.get(url, headers=headers)
+    body = response.get_data()
+    response.close()
+    return response, body
+
+
+def test_receipt_conditional_and_range_requests(client, app_context):
+    from attachments import blob_path, migrate_receipt_blobs, receipt_version
+    from models import db, ExpenseReceipt
+
+    data = b'\xff\xd8\xff' + bytes(range(256)) * 4
+    receipt_id = _legacy_receipt(data)
+    url = f'/receipts/{receipt_id}'
+
+    # فاتورة قديمة داخل قاعدة البيانات
+    response, body = _get(client, url)
+    assert response.status_code == 200 and body == data
+    etag = response.headers['ETag']
+    assert 'no-cache' in response.headers['Cache-Control']
+    assert _get(client, url, **{'If-None-Match': etag})[0].status_code == 304
+    response, body = _get(client, url, Range='bytes=0-2')
+    assert response.status_code == 206 and body == data[:3]
+
+    assert migrate_receipt_blobs(batch_size=1)['expense_receipt'] >= 1
+    db.session.expire_all()
+    receipt = db.session.get(ExpenseReceipt, receipt_id)
+    assert receipt.image_data is None and receipt.file_size == len(data)
+    with open(blob_path(receipt.content_hash), 'rb') as blob:
+        assert blob.read() == data
+
+    # من المخزن: ETag هو البصمة، ورابط ?v= الصحيح فقط يُخزَّن كثابت
+    response, body = _get(client, url)
+    assert response.status_code == 200 and body == data
+    assert response.headers['ETag'] == f'"{receipt.content_hash}"'
+    assert 'no-cache' in response.headers['Cache-Control']
+    assert _get(client, url, **{'If-None-Match': response.headers['ETag']})[0].status_code == 304
+
+    response, _ = _get(client, f'{url}?v={receipt_version(receipt)}')
+    assert 'immutable' in response.headers['Cache-Control']
+    response, _ = _get(client, f'{url}?v=0000000000000000')
+    assert 'immutable' not in response.headers['Cache-Control']
+    assert 'no-cache' in response.headers['Cache-Control']
+
+    response, body = _get(client, url, Range='bytes=3-10')
+    assert response.status_code == 206
+    assert body == data[3:11]
+    assert response.headers['Content-Range'] == f'bytes 3-10/{len(data)}'
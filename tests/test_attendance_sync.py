@@ -0,0 +1,44 @@
+# tests/test_attendance_sync.py
+from datetime import date
+
+from models import db, Worker, WorkerAttendance
+
+HEADERS = {'Authorization': 'Bearer worker_app'}
+
+
+def _worker(name):
+    worker = Worker(name=name, phone='0550000001', start_date=date(2024, 1, 1), monthly_salary=30000)
+    db.session.add(worker)
+    db.session.commit()
+    return worker.id
+
+
+def _upload(client, worker_id, punches):
+    response = client.post(f'/api/workers/{worker_id}/attendance/batch', json={'punches': punches}, headers=HEADERS)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_same_key_for_two_workers(client, app_context):
+    first, second = _worker('عامل أول'), _worker('عامل ثان')
+    punch = {'idempotency_key': 'device-1-0001', 'date': '2024-03-01', 'check_in_morning': '08:00'}
+
+    first_result = _upload(client, first, [punch])
+    second_result = _upload(client, second, [punch])
+
+    assert first_result['created'] == 1
+    assert second_result['created'] == 1
+    assert second_result['results'][0]['attendance_id'] != first_result['results'][0]['attendance_id']
+    assert WorkerAttendance.query.filter_by(worker_id=second, date=date(2024, 3, 1)).count() == 1
+
+
+def test_resent_batch_is_duplicate(client, app_context):
+    worker_id = _worker('عامل إعادة الإرسال')
+    punches = [{'idempotency_key': 'device-2-0001', 'date': '2024-03-02', 'check_in_morning': '08:00'},
+               {'idempotency_key': 'device-2-0002', 'date': '2024-03-02', 'check_out_morning': '12:00'}]
+
+    assert _upload(client, worker_id, punches)['created'] == 1
+    resent = _upload(client, worker_id, punches)
+
+    assert resent['duplicate'] == 2
+    assert WorkerAttendance.query.filter_by(worker_id=worker_id).count() == 1
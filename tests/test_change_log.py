@@ -0,0 +1,44 @@
+# tests/test_change_log.py
+from datetime import date
+
+from change_log import changes_since, latest_seq
+from models import db, ChangeLog, Order, PhoneNumber, Worker
+
+
+def _assigned_order(phones):
+    worker = Worker(name='عامل المزامنة', phone='0557654321', start_date=date(2024, 1, 1), monthly_salary=30000)
+    db.session.add(worker)
+    db.session.flush()
+    order = Order(name='زبون الهواتف', wilaya='سطيف', product='نافذة', total=5000, paid=1000,
+                  assigned_worker_id=worker.id, phones=[PhoneNumber(number=number) for number in phones])
+    db.session.add(order)
+    db.session.commit()
+    return worker.id, order.id
+
+
+def _edit(client, order_id, phones):
+    order = db.session.get(Order, order_id)
+    form = {'name': order.name, 'wilaya': order.wilaya, 'product': order.product, 'paid': order.paid,
+            'total': order.total, 'note': order.note or '', 'status': order.status_id or '', 'phones': phones}
+    db.session.remove()
+    response = client.post(f'/orders/edit/{order_id}', data=form)
+    assert response.status_code == 302
+
+
+def test_phone_only_edit_logs_order_update(client, app_context):
+    worker_id, order_id = _assigned_order(['0550000001'])
+    since = latest_seq(worker_id)
+
+    _edit(client, order_id, '0550000001, 0660000002')
+
+    assert changes_since(worker_id, since)['order']['upsert'] == {order_id}
+    assert [phone.number for phone in db.session.get(Order, order_id).phones] == ['0550000001', '0660000002']
+
+
+def test_unchanged_edit_logs_nothing(client, app_context):
+    worker_id, order_id = _assigned_order(['0550000003'])
+    since = latest_seq(worker_id)
+
+    _edit(client, order_id, '0550000003')
+
+    assert ChangeLog.query.filter(ChangeLog.worker_id == worker_id, ChangeLog.id > since).count() == 0
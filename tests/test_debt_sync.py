@@ -0,0 +1,39 @@
+# tests/test_debt_sync.py
+from models import db, Debt, Expense, ExpenseCategory
+
+
+def _category():
+    category = ExpenseCategory(name='ديون المصاريف')
+    db.session.add(category)
+    db.session.commit()
+    return category.id
+
+
+def _source_debt(description):
+    expense = Expense.query.filter_by(description=description).one()
+    return expense, Debt.query.filter_by(source_type='expense', source_id=expense.id).first()
+
+
+def test_partial_expense_debt_records_paid_amount(client, app_context):
+    form = {'category_id': _category(), 'description': 'دين جزئي', 'quantity': 2, 'unit_price': 500,
+            'purchase_date': '2024-04-01', 'payment_status': 'partial', 'paid_amount': 300}
+    assert client.post('/expenses/add', data=form).status_code == 302
+
+    expense, debt = _source_debt('دين جزئي')
+    assert debt.debt_amount == 1000
+    assert debt.paid_amount == 300
+    assert not hasattr(expense, 'paid_amount')
+
+
+def test_quick_expense_and_later_unpaid_edit(client, app_context):
+    form = {'category_id': _category(), 'description': 'سريع مدفوع', 'amount': 250, 'quantity': 1,
+            'payment_status': 'paid'}
+    assert client.post('/expenses/quick_add', data=form).status_code == 302
+    expense, debt = _source_debt('سريع مدفوع')
+    assert debt is None
+
+    expense.payment_status = 'unpaid'
+    db.session.commit()
+
+    _, debt = _source_debt('سريع مدفوع')
+    assert (debt.debt_amount, debt.paid_amount) == (250, 0)
@@ -0,0 +1,31 @@
+# tests/test_expense_rollup.py
+from datetime import date
+
+from expense_rollup import verify_rollups
+from models import db, Expense, ExpenseCategory, Supplier
+
+
+def test_rollups_follow_insert_update_delete(app_context):
+    category, other_category = ExpenseCategory(name='مجاميع أ'), ExpenseCategory(name='مجاميع ب')
+    supplier = Supplier(name='مورد المجاميع')
+    db.session.add_all([category, other_category, supplier])
+    db.session.flush()
+    expenses = [Expense(description=f'مصروف {index}', category_id=category.id, supplier_id=supplier.id,
+                        total_amount=100.5 * (index + 1), purchase_date=date(2024, index % 3 + 1, 5),
+                        recorded_by='admin')
+                for index in range(6)]
+    expenses.append(Expense(description='بدون تصنيف', total_amount=40, purchase_date=None, recorded_by='admin'))
+    db.session.add_all(expenses)
+    db.session.commit()
+    assert verify_rollups() == []
+
+    # القيم القديمة غير محمّلة بعد commit، فالنقل بين الصفوف يعتمد على active_history
+    moved, removed = expenses[0], expenses[1]
+    moved.category_id = other_category.id
+    moved.purchase_date = date(2024, 6, 1)
+    moved.total_amount = 999
+    expenses[2].supplier_id = None
+    db.session.delete(removed)
+    db.session.commit()
+
+    assert verify_rollups() == []
@@ -0,0 +1,16 @@
+# tests/test_metrics.py
+from metrics import request_metrics
+
+
+def test_streamed_export_bytes_are_counted(client):
+    key = ('export_listing', 'GET')
+    before = request_metrics.response_bytes[key]
+
+    response = client.get('/export/expenses?format=csv')
+    body = response.get_data()
+    response.close()
+
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'text/csv; charset=utf-8'
+    assert body
+    assert request_metrics.response_bytes[key] - before == len(body)
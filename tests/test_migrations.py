@@ -0,0 +1,70 @@
+# tests/test_migrations.py
+from sqlalchemy import create_engine, text
+
+from migrations import _unique_worker_attendance
+
+
+def test_duplicate_attendance_is_merged_before_delete():
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE worker_attendance (id INTEGER PRIMARY KEY, worker_id INTEGER, date DATE, "
+            "check_in_morning DATETIME, check_out_morning DATETIME, check_in_afternoon DATETIME, "
+            "check_out_afternoon DATETIME, total_hours FLOAT, absence_hours FLOAT, "
+            "location_verified BOOLEAN, notes TEXT, created_at DATETIME)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE attendance_upload_key (worker_id INTEGER NOT NULL, key VARCHAR(64) NOT NULL, "
+            "attendance_id INTEGER, created_at DATETIME, PRIMARY KEY (worker_id, key))"
+        ))
+        conn.execute(text(
+            "INSERT INTO worker_attendance (id, worker_id, date, check_in_morning, check_out_morning, "
+            "check_in_afternoon, check_out_afternoon, notes) VALUES "
+            "(1, 7, '2024-03-01', '2024-03-01 08:00:00', NULL, NULL, NULL, 'وصل مبكراً'), "
+            "(2, 7, '2024-03-01', '2024-03-01 08:30:00', '2024-03-01 12:00:00', NULL, NULL, NULL), "
+            "(3, 7, '2024-03-01', NULL, '2024-03-01 11:00:00', NULL, '2024-03-01 17:00:00', NULL), "
+            "(4, 8, '2024-03-01', '2024-03-01 09:00:00', NULL, NULL, NULL, NULL)"
+        ))
+        conn.execute(text("INSERT INTO attendance_upload_key VALUES (7, 'a', 1, NULL), (7, 'b', 3, NULL)"))
+
+        _unique_worker_attendance(conn)
+
+        rows = conn.execute(text(
+            "SELECT id, check_in_morning, check_out_morning, check_out_afternoon, notes "
+            "FROM worker_attendance ORDER BY id"
+        )).all()
+        keys = conn.execute(text("SELECT key, attendance_id FROM attendance_upload_key ORDER BY key")).all()
+
+    assert [tuple(row) for row in rows] == [
+        (3, '2024-03-01 08:00:00', '2024-03-01 12:00:00', '2024-03-01 17:00:00', 'وصل مبكراً'),
+        (4, '2024-03-01 09:00:00', None, None, None),
+    ]
+    assert [tuple(row) for row in keys] == [('a', 3), ('b', 3)]
+
+
+
+def test_unfiltered_transport_listing_uses_index(app):
+    from migrations import _listing_queries, explain
+    from models import db
+
+    name, index, statement = next(query for query in _listing_queries() if query[0] == "transport (الكل)")
+    with app.app_context(), db.engine.connect() as conn:
+        plan = explain(conn, statement)
+    assert any(index in line for line in plan), plan
+    assert not any('TEMP B-TREE' in line for line in plan), plan
+
+
+def test_listing_queries_use_their_indexes(app):
+    from datetime import date
+    from migrations import check_query_plans
+    from models import db, Expense, Order, PhoneNumber, ProductPriceHistory
+
+    with app.app_context():
+        db.session.add(Order(name='زبون الخطط', wilaya='سطيف', phones=[PhoneNumber(number='0550000009')]))
+        db.session.add(Expense(description='اسمنت', total_amount=900, purchase_date=date(2024, 1, 5),
+                               recorded_by='admin'))
+        db.session.add(ProductPriceHistory(product_name='اسمنت', supplier_id=None, price=900,
+                                           purchase_date=date(2024, 1, 5), recorded_by='admin'))
+        db.session.commit()
+        failed = [(name, index, plan) for name, index, ok, plan in check_query_plans(min_rows=0) if not ok]
+    assert failed == []
@@ -0,0 +1,47 @@
+# tests/test_payroll.py
+from datetime import date, timedelta
+
+from models import db, Worker, WorkerBalance, WorkerHistory
+from payroll import run_payroll, verify_balances
+
+
+def _worker(name, **values):
+    worker = Worker(name=name, phone='0550000000', start_date=date.today() - timedelta(days=20),
+                    monthly_salary=30000, **values)
+    db.session.add(worker)
+    db.session.commit()
+    return worker.id
+
+
+def test_delete_worker_with_balance(client, app_context):
+    worker_id = _worker('عامل للحذف')
+    assert db.session.get(WorkerBalance, worker_id) is not None
+    db.session.remove()
+
+    response = client.get(f'/workers/delete/{worker_id}')
+
+    assert response.status_code == 302
+    assert db.session.get(Worker, worker_id) is None
+    assert db.session.get(WorkerBalance, worker_id) is None
+
+
+def test_delete_worker_after_payroll(client, app_context):
+    worker_id = _worker('عامل بعد الدفع', incentives=1000)
+    run_payroll(db.session, date.today(), worker_ids=[worker_id])
+    db.session.commit()
+    assert WorkerHistory.query.filter_by(worker_id=worker_id).count() == 1
+    db.session.remove()
+
+    response = client.get(f'/workers/delete/{worker_id}')
+
+    assert response.status_code == 302
+    assert db.session.get(Worker, worker_id) is None
+    assert db.session.get(WorkerBalance, worker_id) is None
+
+
+def test_balances_match_history(app_context):
+    worker_id = _worker('عامل للتحقق', incentives=500, advances=2000)
+    run_payroll(db.session, date.today(), worker_ids=[worker_id])
+    db.session.commit()
+
+    assert verify_balances() == []
@@ -0,0 +1,88 @@
+# tests/test_product_search.py
+from datetime import date
+
+from sqlalchemy import select
+
+from models import db, ExpenseCategory, Product, ProductName, ProductPriceHistory
+from product_search import rebuild_search_index, search_names
+
+
+def _categories(*names):
+    categories = [ExpenseCategory(name=name) for name in names]
+    db.session.add_all(categories)
+    db.session.flush()
+    return [category.id for category in categories]
+
+
+def _price(name, price=100):
+    return ProductPriceHistory(product_name=name, price=price, purchase_date=date(2024, 5, 1), recorded_by='admin')
+
+
+def _name_row(name):
+    return db.session.execute(select(ProductName).where(ProductName.name == name)).scalar_one_or_none()
+
+
+def test_prefix_per_word_matching(app_context):
+    db.session.add(Product(name='اسمنت CPJ 42.5'))
+    db.session.add(_price('اسمنت أبيض'))
+    db.session.commit()
+
+    names = [result['name'] for result in search_names('اسم 42')]
+    assert 'اسمنت CPJ 42.5' in names
+    assert 'اسمنت أبيض' not in names
+    assert 'اسمنت أبيض' in [result['name'] for result in search_names('اسمن')]
+
+
+def test_selected_category_ranks_first(app_context):
+    pine, beech = _categories('خشب صنوبر', 'خشب زان')
+    db.session.add_all([Product(name='لوح خشبي مصقول', category_id=pine),
+                        Product(name='لوح خشبي خام', category_id=beech)])
+    db.session.commit()
+
+    assert search_names('خشبي', category_id=pine)[0]['name'] == 'لوح خشبي مصقول'
+    assert search_names('خشبي', category_id=beech)[0]['name'] == 'لوح خشبي خام'
+    # الاسم الذي يبدأ بالنص يسبق التصنيف
+    db.session.add(_price('خشبي مقطع'))
+    db.session.commit()
+    assert search_names('خشبي', category_id=pine)[0]['name'] == 'خشبي مقطع'
+
+
+def test_price_count_follows_delete_and_rename(app_context):
+    first, second = _price('طلاء تجريبي', 50), _price('طلاء تجريبي', 60)
+    db.session.add_all([first, second])
+    db.session.commit()
+    assert _name_row('طلاء تجريبي').price_count == 2
+
+    db.session.delete(first)
+    db.session.commit()
+    assert _name_row('طلاء تجريبي').price_count == 1
+
+    second.product_name = 'طلاء معدل'
+    db.session.commit()
+    assert _name_row('طلاء تجريبي') is None
+    assert _name_row('طلاء معدل').price_count == 1
+    assert search_names('طلاء تجر') == []
+
+    db.session.delete(second)
+    db.session.commit()
+    assert _name_row('طلاء معدل') is None
+
+
+def test_rebuild_matches_incremental_index(app_context):
+    db.session.add_all([Product(name='برغي 8 مم'), _price('برغي 8 مم'), _price('برغي 10 مم')])
+    db.session.commit()
+
+    def snapshot():
+        rows = db.session.execute(select(ProductName.name, ProductName.product_id,
+                                         ProductName.category_id, ProductName.price_count))
+        return sorted(tuple(row) for row in rows)
+
+    def searches():
+        return [search_names(query) for query in ('برغي', 'برغي 8', 'اسم 42', 'لوح')]
+
+    incremental, incremental_searches = snapshot(), searches()
+    rebuild_search_index()
+    db.session.commit()
+
+    assert snapshot() == incremental
+    assert searches() == incremental_searches
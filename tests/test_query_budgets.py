@@ -0,0 +1,86 @@
+# tests/test_query_budgets.py
+"""حدود استعلامات SQL لصفحات العرض مع lazyload_guard في وضع raise
+
+الحدود نفسها المعلنة في benchmarks/bench_routes.py، على قاعدة صغيرة فيها
+علاقات لكل صفحة (هواتف، عامل معين، تصنيف ومورد، فواتير) حتى يظهر أي N+1.
+"""
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import app as app_module
+from benchmarks.bench_routes import build_routes
+from models import (db, Order, PhoneNumber, Worker, Expense, ExpenseCategory, Supplier, ProductPriceHistory,
+                    Transport, TransportCategory, TransportSubType, Debt)
+
+
+def _seed():
+    worker = Worker(name='عامل الحدود', phone='0551234567', start_date=date(2024, 1, 1), monthly_salary=30000)
+    supplier = Supplier(name='مورد الحدود')
+    category = ExpenseCategory(name='مواد الحدود')
+    transport_category = TransportCategory(name='نقل الحدود')
+    db.session.add_all([worker, supplier, category, transport_category])
+    db.session.flush()
+    sub_type = TransportSubType(name='شاحنة', category_id=transport_category.id)
+    db.session.add(sub_type)
+    db.session.flush()
+
+    for index in range(6):
+        order = Order(name=f'زبون {index}', wilaya='سطيف', product='باب', total=1000 + index,
+                      paid=500 if index % 2 else 1000 + index, is_paid=not index % 2,
+                      assigned_worker_id=worker.id)
+        order.phones = [PhoneNumber(number=f'05500000{index}0', is_primary=True),
+                        PhoneNumber(number=f'05500000{index}1')]
+        db.session.add(order)
+        day = date(2024, 1, 10) + timedelta(days=index * 7)
+        db.session.add(Expense(description='ديسك تقطاع صغير مجلفن', category_id=category.id, supplier_id=supplier.id,
+                               quantity=2, unit_price=150 + index, total_amount=300 + index * 2,
+                               payment_status='unpaid' if index % 2 else 'paid', purchase_date=day,
+                               recorded_by='admin'))
+        db.session.add(ProductPriceHistory(product_name='ديسك تقطاع صغير مجلفن', supplier_id=supplier.id,
+                                           price=150 + index, purchase_date=day, recorded_by='admin'))
+        db.session.add(ProductPriceHistory(product_name='أسمنت', price=900 + index, purchase_date=day,
+                                           recorded_by='admin'))
+        db.session.add(Transport(name=f'نقل {index}', transport_amount=2000, paid_amount=500 * index,
+                                 category_id=transport_category.id, sub_type_id=sub_type.id,
+                                 type='inside' if index % 2 else 'outside', recorded_by='admin'))
+        db.session.add(Debt(name=f'دائن {index}', debt_amount=700, paid_amount=100 * index,
+                            status='unpaid' if index % 3 else 'paid', source_type='manual',
+                            description='دين يدوي'))
+    db.session.commit()
+
+
+@pytest.fixture(scope='module')
+def routes(app):
+    with app.app_context():
+        _seed()
+    return build_routes(app_module)
+
+
+@pytest.fixture
+def counter(app):
+    count = [0]
+
+    def _count(*args):
+        count[0] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _count)
+    yield count
+    event.remove(engine, 'before_cursor_execute', _count)
+
+
+def test_listing_routes_stay_within_budget(app, client, routes, counter, monkeypatch):
+    monkeypatch.setitem(app.config, 'LAZYLOAD_GUARD', 'raise')
+    over_budget = []
+    for name, method, url, budget, kwargs in routes:
+        counter[0] = 0
+        response = client.open(url, method=method, **kwargs)
+        response.get_data()
+        response.close()
+        assert response.status_code < 400, (name, response.status_code)
+        if budget is not None and counter[0] > budget:
+            over_budget.append((name, counter[0], budget))
+    assert over_budget == []
@@ -0,0 +1,25 @@
+# tests/test_stats.py
+from datetime import date
+
+from models import db, Order, Worker, Debt, Expense, Purchase
+from stats_engine import dashboard_stats, stats_context, verify_stats
+
+
+def test_stats_match_legacy_calculation(app_context):
+    db.session.add_all([
+        Order(name='زبون مدفوع', wilaya='الجزائر', product='طاولة', total=12000.5, paid=12000.5, is_paid=True),
+        Order(name='زبون معلق', wilaya='وهران', product='كرسي', total=4500, paid=1000, is_paid=False),
+        Worker(name='عامل إحصائيات', phone='0550000002', start_date=date(2024, 1, 1), monthly_salary=31000,
+               absences=1.5, incentives=700, advances=250, outside_work_days=2),
+        Debt(name='دين غير مدفوع', debt_amount=3000, paid_amount=1250.25, status='unpaid'),
+        Debt(name='دين مدفوع', debt_amount=800, paid_amount=800, status='paid'),
+        Expense(description='خشب', quantity=3, unit_price=1500, total_amount=4500, recorded_by='admin'),
+        Purchase(price=200, quantity=2, total_price=400, status='paid', type='variable'),
+        Purchase(price=50, total_price=50, status='unpaid', type='fixed'),
+    ])
+    db.session.commit()
+
+    assert verify_stats() == []
+    context = stats_context()
+    assert context['total_orders'] == Order.query.count()
+    assert dashboard_stats().total_debts == Debt.query.filter_by(status='unpaid').count()
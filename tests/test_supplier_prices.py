@@ -0,0 +1,40 @@
+# tests/test_supplier_prices.py
+from datetime import date
+
+from models import db, ProductPriceHistory, Supplier
+from supplier_prices import compare_suppliers, verify_supplier_prices
+
+PRODUCT = 'حديد مقارنة الموردين'
+
+
+def _price(supplier, price, day):
+    return ProductPriceHistory(product_name=PRODUCT, supplier_id=supplier.id if supplier else None,
+                               price=price, purchase_date=day, recorded_by='admin')
+
+
+def test_supplier_prices_follow_price_history(app_context):
+    cheap, expensive = Supplier(name='مورد رخيص'), Supplier(name='مورد غال')
+    db.session.add_all([cheap, expensive])
+    db.session.flush()
+    prices = [_price(cheap, 100, date(2024, 1, 1)), _price(cheap, 95, date(2024, 2, 1)),
+              _price(expensive, 120, date(2024, 1, 15)), _price(None, 110, date(2024, 1, 20))]
+    db.session.add_all(prices)
+    # سعر بتاريخ سابق لا يغير آخر سعر
+    db.session.add(_price(expensive, 90, date(2023, 12, 1)))
+    db.session.commit()
+    assert verify_supplier_prices() == []
+
+    comparison = compare_suppliers(PRODUCT)
+    assert comparison['best']['supplier'] == 'مورد رخيص'
+    assert comparison['best']['price'] == 95
+    assert comparison['best']['trend'] == 'down'
+
+    prices[1].supplier_id = expensive.id
+    prices[2].price = 80
+    db.session.delete(prices[3])
+    db.session.commit()
+
+    assert verify_supplier_prices() == []
+    # آخر سعر للمورد الغالي صار 95 (المنقول إليه) وللرخيص 100
+    suppliers = compare_suppliers(PRODUCT)['suppliers']
+    assert [(item['supplier'], item['price']) for item in suppliers] == [('مورد غال', 95), ('مورد رخيص', 100)]
@@ -1,27 +1,41 @@
 # update_database.py
+"""تطبيق ترحيلات قاعدة البيانات
+
+الاستخدام:
+    python update_database.py           # تطبيق الترحيلات المعلقة
+    python update_database.py --check   # التحقق من استخدام الفهارس في استعلامات العرض
+"""
+import sys
+
 from app import app, db
-from models import Order
+from bootstrap import init_db
+from migrations import check_query_plans, current_version
+
+
+def main(argv):
+    with app.app_context():
+        applied = init_db()
+        with db.engine.connect() as conn:
+            version = current_version(conn)
+        if applied:
+            print(f"✅ تم تطبيق {len(applied)} ترحيل، الإصدار الحالي: {version}")
+        else:
+            print(f"ℹ️ قاعدة البيانات محدثة، الإصدار الحالي: {version}")
+
+        if '--check' in argv:
+            failed = 0
+            for name, index, ok, plan in check_query_plans():
+                mark = "✅" if ok else "❌"
+                print(f"{mark} {name} → {index}")
+                for line in plan:
+                    print(f"      {line}")
+                if not ok:
+                    failed += 1
+            if failed:
+                print(f"❌ {failed} استعلام لا يستخدم الفهرس المتوقع")
+                return 1
+    return 0
+
 
-with app.app_context():
-    try:
-        # محاولة إضافة العمود الجديد
-        db.engine.execute('ALTER TABLE "order" ADD COLUMN is_paid BOOLEAN DEFAULT FALSE')
-        print("✅ تم إضافة العمود is_paid بنجاح")
-        
-        # تحديث القيم الحالية بناءً على paid و total
-        orders = Order.query.all()
-        for order in orders:
-            order.is_paid = (order.paid >= order.total)
-        
-        db.session.commit()
-        print("✅ تم تحديث بيانات الطلبيات الحالية")
-        
-    except Exception as e:
-        print(f"❌ خطأ في تحديث قاعدة البيانات: {e}")
-        # إذا فشل التحديث، حاول إعادة إنشاء الجداول
-        try:
-            db.drop_all()
-            db.create_all()
-            print("✅ تم إعادة إنشاء الجداول بنجاح")
-        except Exception as e2:
-            print(f"❌ خطأ في إعادة إنشاء الجداول: {e2}")
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
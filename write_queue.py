@@ -0,0 +1,152 @@
+# write_queue.py
+"""وضع الكاتب الواحد (group commit) لكتابات SQLite
+
+عند تفعيل WRITE_QUEUE_ENABLED لا تكتب المسارات بنفسها، بل ترسل "وحدة عمل"
+(دالة تستقبل الجلسة) إلى خيط كاتب واحد. الخيط يجمع الوحدات التي تصل خلال
+بضع ملي ثوانٍ في معاملة واحدة (commit واحد و fsync واحد)، وكل وحدة داخل
+نقطة حفظ (SAVEPOINT) حتى لا يُفشل خطأ وحدة واحدة بقية الدفعة. كل مسار ينتظر
+نتيجة وحدته عبر Future.
+
+بدون التفعيل تُنفذ الوحدة مباشرة في جلسة الطلب مع commit واحد، فيبقى
+السلوك كما هو في التطوير.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy import text
+
+from models import db
+
+_STOP = object()
+
+
+class WriteQueueFull(Exception):
+    """قائمة الكتابة ممتلئة"""
+
+
+class WriteQueue:
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.extensions.get('write_queue') is self:
+            return
+        enabled = os.environ.get('WRITE_QUEUE_ENABLED', '').lower() in ('1', 'true', 'yes')
+        app.config.setdefault('WRITE_QUEUE_ENABLED', enabled)
+        app.config.setdefault('WRITE_QUEUE_MAX_BATCH', 64)
+        app.config.setdefault('WRITE_QUEUE_MAX_DELAY', 0.002)   # ثوانٍ انتظار بقية الدفعة
+        app.config.setdefault('WRITE_QUEUE_MAX_PENDING', 1024)
+        app.config.setdefault('WRITE_QUEUE_TIMEOUT', 30.0)
+        self.app = app
+        app.extensions['write_queue'] = self
+        atexit.register(self.shutdown)
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config['WRITE_QUEUE_ENABLED']
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._queue = queue.Queue(maxsize=self.app.config['WRITE_QUEUE_MAX_PENDING'])
+                self._thread = threading.Thread(target=self._loop, name='write-queue', daemon=True)
+                self._thread.start()
+
+    def submit(self, unit):
+        """إرسال وحدة عمل للخيط الكاتب، ويرجع Future بنتيجتها"""
+        self._ensure_thread()
+        future = Future()
+        try:
+            self._queue.put((unit, future), timeout=self.app.config['WRITE_QUEUE_TIMEOUT'])
+        except queue.Full:
+            raise WriteQueueFull()
+        return future
+
+    def run(self, unit):
+        """تنفيذ وحدة عمل unit(session) وحفظها، ويرجع ما ترجعه الوحدة
+
+        يجب أن ترجع الوحدة قيماً عادية (أرقام، نصوص) لا كائنات من الجلسة،
+        لأن جلسة الخيط الكاتب تُغلق بعد كل دفعة.
+        """
+        if not self.enabled:
+            try:
+                result = unit(db.session)
+                db.session.commit()
+                return result
+            except Exception:
+                db.session.rollback()
+                raise
+        return self.submit(unit).result(timeout=self.app.config['WRITE_QUEUE_TIMEOUT'])
+
+    def _loop(self):
+        max_batch = self.app.config['WRITE_QUEUE_MAX_BATCH']
+        max_delay = self.app.config['WRITE_QUEUE_MAX_DELAY']
+        with self.app.app_context():
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                batch = [item]
+                deadline = time.monotonic() + max_delay
+                while len(batch) < max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        session = db.session
+        completed = []
+        try:
+            if session.get_bind().dialect.name == 'sqlite':
+                # حجز قفل الكتابة من البداية بدلاً من ترقيته لاحقاً
+                session.execute(text("BEGIN IMMEDIATE"))
+            for unit, future in batch:
+                savepoint = session.begin_nested()
+                try:
+                    result = unit(session)
+                    savepoint.commit()
+                except Exception as e:
+                    savepoint.rollback()
+                    future.set_exception(e)
+                else:
+                    completed.append((future, result))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"❌ خطأ في حفظ دفعة الكتابة ({len(batch)} عملية): {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for future, result in completed:
+                future.set_result(result)
+        finally:
+            db.session.remove()
+
+    def shutdown(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._thread = None
+
+
+write_queue = WriteQueue()